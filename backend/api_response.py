@@ -0,0 +1,220 @@
+import os
+import time
+import zlib
+import inspect
+import datetime
+import functools
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from fastapi.datastructures import DefaultPlaceholder
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.concurrency import run_in_threadpool
+from .metrics_mod import observe_serialized, row_count
+from .utils import oracle_action
+from .tracing_mod import span
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fast JSON responses and response compression.
+# Route results are encoded with orjson; values orjson does not know natively
+# (Decimal, LOBs, RAW bytes, timedelta) go through encode_default. Responses
+# larger than COMPRESS_MIN_BYTES are compressed with brotli or gzip, whichever the
+# client accepts (brotli preferred when the module is installed). Chunks of at
+# least COMPRESS_THREAD_BYTES are compressed in the threadpool so a large grid does
+# not hold up the event loop.
+COMPRESS_MIN_BYTES = int(os.getenv("ROCKDB_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_THREAD_BYTES = int(os.getenv("ROCKDB_COMPRESS_THREAD_BYTES", "65536"))
+GZIP_LEVEL = int(os.getenv("ROCKDB_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("ROCKDB_BROTLI_QUALITY", "4"))
+# Live feeds must reach the client frame by frame: never buffered for compression
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def _bytes_value(value):
+    try:
+        return value.decode('utf-8')
+    except UnicodeDecodeError:
+        return value.hex().upper()
+
+def encode_default(value):
+    """orjson fallback for the Oracle driver types it does not serialize itself."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _bytes_value(bytes(value))
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, 'model_dump'):
+        return value.model_dump()
+    if hasattr(value, 'dict') and hasattr(value, '__fields__'):
+        return value.dict()
+    if hasattr(value, 'read'):
+        # CLOB/BLOB/NCLOB read after the cursor was consumed
+        data = value.read()
+        return _bytes_value(data) if isinstance(data, bytes) else data
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def encode_json(content):
+    return orjson.dumps(content, default=encode_default, option=JSON_OPTIONS)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return encode_json(content)
+
+def _encode_directly(endpoint, status_code):
+    # Returning a Response skips FastAPI's jsonable_encoder walk over every cell
+    status_code = status_code or 200
+    name = endpoint.__name__
+
+    def respond(result):
+        if isinstance(result, Response):
+            return result
+        rows = row_count(result)
+        with span("serialize", {"rockdb.endpoint": name}) as serialize_span:
+            start = time.perf_counter()
+            response = FastJSONResponse(result, status_code=status_code)
+            observe_serialized(name, rows, response.body, time.perf_counter() - start)
+            serialize_span.set_attributes({"rockdb.rows": rows, "rockdb.bytes": len(response.body)})
+        return response
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            return respond(await endpoint(*args, **kwargs))
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            return respond(endpoint(*args, **kwargs))
+    return wrapper
+
+class FastJSONRoute(APIRoute):
+    """
+    Route whose plain (dict/list) results are encoded straight by orjson.
+    Routes with a response_model (or a return annotation) keep FastAPI's validation.
+    Oracle sessions borrowed while serving a route are tagged with its name (ACTION).
+    """
+    def __init__(self, path, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if isinstance(response_model, DefaultPlaceholder):
+            response_model = response_model.value
+        if response_model is None and inspect.signature(endpoint).return_annotation is inspect.Signature.empty:
+            endpoint = _encode_directly(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        action = self.name
+
+        async def tagged_handler(request):
+            # Sessions borrowed for this request carry the endpoint as their Oracle ACTION.
+            # Not reset afterwards: each request has its own context, and streamed bodies
+            # still borrow sessions once the handler has returned.
+            oracle_action.set(action)
+            return await handler(request)
+        return tagged_handler
+
+def choose_encoding(accept_encoding):
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+class _Compressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data, final):
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._gz.compress(data)
+        # Sync flush keeps streamed (NDJSON) frames flowing to the client
+        return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies of at least minimum_size bytes."""
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES, thread_size=COMPRESS_THREAD_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_size = thread_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size, self.thread_size))
+
+class _CompressingSend:
+    def __init__(self, send, encoding, minimum_size, thread_size):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.thread_size = thread_size
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def _compress(self, body, final):
+        if len(body) >= self.thread_size:
+            return await run_in_threadpool(self.compressor.compress, body, final)
+        return self.compressor.compress(body, final)
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk tells whether to compress
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if ("content-encoding" in headers
+                    or headers.get("content-type", "").startswith(UNCOMPRESSED_TYPES)):
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            # The body depends on Accept-Encoding whether or not this one is compressed,
+            # so caches must not hand a compressed copy to a client that cannot read it
+            headers.add_vary_header("Accept-Encoding")
+            if self.encoding is None or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            body = await self._compress(body, final=not more_body)
+            headers["Content-Encoding"] = self.encoding
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self.send(self.start)
+        else:
+            body = await self._compress(body, final=not more_body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -1,7 +1,10 @@
 import oracledb
-from .utils import get_oracle_connection
+from .utils import get_oracle_connection, fetch_rows
+from .single_flight_mod import coalesced
+from .catalog_cache_mod import catalog_cached
 
-def get_backup_jobs(conn_info):
+@coalesced
+def get_backup_jobs(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -36,8 +39,7 @@ def get_backup_jobs(conn_info):
                 ORDER BY start_time DESC
             ) WHERE rownum <= 50
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt, convert=None)
     except Exception as e:
         print(f"Error fetching backup jobs: {e}")
         raise e
@@ -45,6 +47,7 @@ def get_backup_jobs(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_backup_summary(conn_info, days=30):
     try:
         return execute_rman_sql_report(
@@ -55,6 +58,7 @@ def get_backup_summary(conn_info, days=30):
     except Exception as e:
         print(f"Error fetching backup summary from script: {e}")
         raise e
+@coalesced
 def get_backup_info(conn_info, days=30):
     try:
         return execute_rman_sql_report(
@@ -66,7 +70,8 @@ def get_backup_info(conn_info, days=30):
         print(f"Error fetching backup info from script: {e}")
         raise e
 
-def get_backup_sets(conn_info, session_key):
+@coalesced
+def get_backup_sets(conn_info, session_key, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -83,8 +88,7 @@ def get_backup_sets(conn_info, session_key):
             WHERE session_key = :sk
             ORDER BY bs_key
         """, {"sk": session_key})
-        columns = [col[0].lower() for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt, convert=None)
     except Exception as e:
         print(f"Error fetching backup sets: {e}")
         raise e
@@ -92,7 +96,8 @@ def get_backup_sets(conn_info, session_key):
         if connection:
             connection.close()
 
-def get_backup_datafiles(conn_info, bs_key):
+@coalesced
+def get_backup_datafiles(conn_info, bs_key, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -107,14 +112,14 @@ def get_backup_datafiles(conn_info, bs_key):
             WHERE bs_key = :bk
             ORDER BY file#
         """, {"bk": bs_key})
-        columns = [col[0].lower() for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt, convert=None)
     except Exception as e:
         print(f"Error fetching backup datafiles: {e}")
         raise e
     finally:
         if connection:
             connection.close()
+@coalesced
 def get_nls_parameters(conn_info):
     connection = None
     try:
@@ -147,7 +152,8 @@ def get_nls_parameters(conn_info):
     finally:
         if connection:
             connection.close()
-def get_backup_images(conn_info):
+@coalesced
+def get_backup_images(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -166,8 +172,7 @@ def get_backup_images(conn_info):
                 ORDER BY creation_time DESC
             ) WHERE rownum <= 50
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt, convert=None)
     except Exception as e:
         print(f"Error fetching backup images: {e}")
         raise e
@@ -175,6 +180,7 @@ def get_backup_images(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_recovery_summary(conn_info):
     connection = None
     try:
@@ -201,7 +207,9 @@ def get_recovery_summary(conn_info):
         if connection:
             connection.close()
 
-def get_incarnations(conn_info):
+@catalog_cached
+@coalesced
+def get_incarnations(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -217,8 +225,7 @@ def get_incarnations(conn_info):
             FROM v$database_incarnation
             ORDER BY incarnation# DESC
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt, convert=None)
     except Exception as e:
         print(f"Error fetching incarnations: {e}")
         raise e
@@ -226,7 +233,8 @@ def get_incarnations(conn_info):
         if connection:
             connection.close()
 
-def get_datafiles_detailed(conn_info):
+@coalesced
+def get_datafiles_detailed(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -243,8 +251,7 @@ def get_datafiles_detailed(conn_info):
             FROM v$datafile
             ORDER BY file#
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt, convert=None)
     except Exception as e:
         print(f"Error fetching detailed datafiles: {e}")
         raise e
@@ -252,7 +259,8 @@ def get_datafiles_detailed(conn_info):
         if connection:
             connection.close()
 
-def execute_rman_sql_report(conn_info, rel_path, variables=None):
+@coalesced
+def execute_rman_sql_report(conn_info, rel_path, variables=None, fmt=None):
     from .sql_central_mod import get_sql_content, execute_generic_sql
     try:
         # 1. Get and parse the SQL
@@ -261,7 +269,7 @@ def execute_rman_sql_report(conn_info, rel_path, variables=None):
         print(f"DEBUG: Processed SQL:\n{sql_text}")
         
         # 2. Execute via generic executor
-        results = execute_generic_sql(conn_info, sql_text, auto_commit=False, bind_vars=variables)
+        results = execute_generic_sql(conn_info, sql_text, auto_commit=False, bind_vars=variables, fmt=fmt, pooled=True)
         
         # 3. Process results: look for grids or errors
         for res in results:
@@ -274,6 +282,7 @@ def execute_rman_sql_report(conn_info, rel_path, variables=None):
         print(f"Error executing RMAN report {rel_path}: {e}")
         raise e
 
+@coalesced
 def get_rman_progress(conn_info):
     """Specific function for RMAN progress in long ops."""
     return execute_rman_sql_report(conn_info, 'oracle_internal/rman/rman_backup_progress.sql')
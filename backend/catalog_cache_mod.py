@@ -0,0 +1,188 @@
+import os
+import re
+import time
+import inspect
+import functools
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .utils import register_pool_close_hook
+from .metrics_mod import register_gauge, row_count
+from .sql_template_mod import compile_sql_script, PROTECTED_RE
+
+# Result cache for slow catalog reads (dba_segments, dba_extents, dba_free_space,
+# v$parameter, ...), per connection.
+# A result is served as is for its TTL. Up to STALE_SECONDS past the TTL it is
+# still served immediately while one background refresh runs (stale-while-
+# revalidate). Past that the caller recomputes it. Our own mutating calls and
+# DDL run through SQL Central drop every cached result of the connection.
+CATALOG_TTLS = {
+    "get_segments": 300,
+    "get_extents": 300,
+    "get_tablespace_map": 300,
+    "get_storage_charts_data": 120,
+    "get_db_parameters": 600,
+    "get_incarnations": 3600,
+}
+for _name in CATALOG_TTLS:
+    CATALOG_TTLS[_name] = float(os.getenv(f"ROCKDB_CACHE_TTL_{_name[4:].upper()}", str(CATALOG_TTLS[_name])))
+STALE_SECONDS = float(os.getenv("ROCKDB_CACHE_STALE_SECONDS", "900"))
+# Bounds: least recently used results are dropped beyond either limit
+MAX_ENTRIES = int(os.getenv("ROCKDB_CACHE_MAX_ENTRIES", "256"))
+MAX_ROWS = int(os.getenv("ROCKDB_CACHE_MAX_ROWS", "500000"))
+
+# Statements after which cached catalog results may be wrong
+DDL_RE = re.compile(
+    r"^\s*(CREATE|ALTER|DROP|TRUNCATE|RENAME|PURGE|FLASHBACK|ANALYZE|BEGIN|DECLARE|EXEC|CALL)\b", re.I
+)
+
+# Least recently used first
+_entries = OrderedDict()
+_cached_rows = {"total": 0}
+# Bumped on invalidation: a refresh started before it does not store its result
+_generations = {}
+_lock = threading.Lock()
+REFRESH_WORKERS = 2
+_refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="catalog-refresh")
+# Refreshes submitted and not finished yet (running ones included)
+_pending_refreshes = {"count": 0}
+_pending_lock = threading.Lock()
+_stats = {}
+
+def _count(name, outcome):
+    entry = _stats.setdefault(name, {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0})
+    entry[outcome] += 1
+
+def _drop(key):
+    entry = _entries.pop(key, None)
+    if entry:
+        _cached_rows["total"] -= entry["rows"]
+
+def _evict(now):
+    """Drops results past their stale window, then the least recently used ones beyond the bounds (lock held)."""
+    for key in [k for k, e in _entries.items() if now - e["time"] >= e["ttl"] + STALE_SECONDS]:
+        _drop(key)
+    while _entries and (len(_entries) > MAX_ENTRIES or _cached_rows["total"] > MAX_ROWS):
+        _drop(next(iter(_entries)))
+
+def _store(key, generation, ttl, fn, args, kwargs):
+    result = fn(*args, **kwargs)
+    rows = row_count(result)
+    with _lock:
+        if _generations.get(key[0], 0) == generation and rows <= MAX_ROWS:
+            _drop(key)
+            now = time.monotonic()
+            _entries[key] = {"time": now, "ttl": ttl, "rows": rows, "result": result, "refreshing": False}
+            _cached_rows["total"] += rows
+            _evict(now)
+    return result
+
+def _refresh(key, generation, ttl, name, fn, args, kwargs):
+    try:
+        _store(key, generation, ttl, fn, args, kwargs)
+        _count(name, "refreshes")
+    except Exception as e:
+        print(f"Catalog cache: background refresh of {name} failed: {e}")
+        with _lock:
+            entry = _entries.get(key)
+            if entry:
+                entry["refreshing"] = False
+
+def _refresh_done(future):
+    with _pending_lock:
+        _pending_refreshes["count"] -= 1
+
+def catalog_cached(fn, ttl=None):
+    """Caches fn(conn_info, ...) per connection id and arguments for ttl seconds (CATALOG_TTLS by default)."""
+    name = fn.__name__
+    ttl = CATALOG_TTLS.get(name, 300) if ttl is None else ttl
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        conn_id = args[0].get('id') if args and isinstance(args[0], dict) else None
+        if not conn_id:
+            return fn(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (conn_id, name, tuple(list(bound.arguments.items())[1:]))
+        try:
+            hash(key)
+        except TypeError:
+            return fn(*args, **kwargs)
+
+        with _lock:
+            generation = _generations.get(conn_id, 0)
+            entry = _entries.get(key)
+            age = time.monotonic() - entry["time"] if entry else None
+            if entry and age < ttl:
+                _count(name, "hits")
+                _entries.move_to_end(key)
+                return entry["result"]
+            if entry and age < ttl + STALE_SECONDS:
+                _count(name, "stale")
+                _entries.move_to_end(key)
+                if not entry["refreshing"]:
+                    entry["refreshing"] = True
+                    with _pending_lock:
+                        _pending_refreshes["count"] += 1
+                    # Run in the caller's context so the refresh keeps its Oracle ACTION tag
+                    _refresh_executor.submit(
+                        contextvars.copy_context().run, _refresh, key, generation, ttl, name, fn, args, kwargs
+                    ).add_done_callback(_refresh_done)
+                return entry["result"]
+            _count(name, "misses")
+        return _store(key, generation, ttl, fn, args, kwargs)
+    return wrapper
+
+def invalidate_catalog(conn_id):
+    """Drops every cached catalog result of a connection."""
+    with _lock:
+        _generations[conn_id] = _generations.get(conn_id, 0) + 1
+        for key in [k for k in _entries if k[0] == conn_id]:
+            _drop(key)
+
+register_pool_close_hook(invalidate_catalog)
+register_gauge("rockdb_catalog_refresh_queue_depth", "Background catalog refreshes waiting for a worker",
+               lambda: max(_pending_refreshes["count"] - REFRESH_WORKERS, 0))
+register_gauge("rockdb_catalog_cache_entries", "Cached catalog results", lambda: len(_entries))
+
+def invalidates_catalog(fn):
+    """Wraps a mutating fn(conn_info, ...): the connection's cached catalog results are dropped once it ran."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if args and isinstance(args[0], dict) and args[0].get('id'):
+                invalidate_catalog(args[0]['id'])
+    return wrapper
+
+def _skip_leading_comments(text):
+    """Statement text from its first token (scripts often open with a -- or /* */ header)."""
+    position = 0
+    while True:
+        while position < len(text) and text[position].isspace():
+            position += 1
+        match = PROTECTED_RE.match(text, position)
+        if not match or not match.group(0).startswith(("--", "/*")):
+            return text[position:]
+        position = match.end()
+
+def changes_catalog(sql_text):
+    """True when a script has DDL or PL/SQL that may change what the catalog reads return."""
+    return any(
+        DDL_RE.match(_skip_leading_comments(template["text"])) for template in compile_sql_script(sql_text or "")
+    )
+
+def get_catalog_cache_stats():
+    now = time.monotonic()
+    entries = [
+        {"connection_id": key[0], "function": key[1], "age_s": round(now - entry["time"], 1)}
+        for key, entry in list(_entries.items())
+    ]
+    return {
+        "ttls": CATALOG_TTLS, "stale_s": STALE_SECONDS, "max_entries": MAX_ENTRIES, "max_rows": MAX_ROWS,
+        "cached_rows": _cached_rows["total"], "functions": _stats, "entries": entries
+    }
@@ -1,106 +1,113 @@
 import oracledb
 from .utils import get_oracle_connection
+from .single_flight_mod import coalesced
 
-def get_dashboard_metrics(conn_info):
+def build_dashboard_metrics(results):
+    """Maps the per-statement results of dashboard_metrics.sql to the dashboard payload."""
+    # 0: Total Sessions, 1: Active Sessions, 2: SGA, 3: Objects, 4: Invalid Objects Count, 5: Cursors, 6: Triggers
+    total_sessions = results[0][0][0] if results[0] else 0
+    active_sessions = results[1][0][0] if results[1] else 0
+    
+    # Normalize SGA Info keys (v$sgainfo)
+    sga_info = {}
+    if results[2]:
+        for row in results[2]:
+            sga_info[row[0]] = row[1]
+            # Fallback for different capitalizations
+            if row[0].lower() == 'total sga size':
+                sga_info['Total SGA Size'] = row[1]
+    
+    objects = {row[0]: row[1] for row in results[3]} if results[3] else {}
+    invalid_objects_count = results[4][0][0] if len(results) > 4 and results[4] else 0
+    
+    open_cursors_val = 0
+    if len(results) > 5 and results[5]:
+        open_cursors_val = results[5][0][0]
+
+    triggers = {row[0]: row[1] for row in results[6]} if len(results) > 6 and results[6] else {}
+    long_ops_count = results[7][0][0] if len(results) > 7 and results[7] else 0
+    sysaux_count = results[8][0][0] if len(results) > 8 and results[8] else 0
+    is_rac = results[9][0][0] == 'TRUE' if len(results) > 9 and results[9] else False
+    instance_count = results[10][0][0] if len(results) > 10 and results[10] else 1
+    
+    db_name = results[11][0][0] if len(results) > 11 and results[11] else "Unknown"
+    is_cdb = results[11][0][1] == 1 if len(results) > 11 and results[11] else False
+    con_name = results[12][0][0] if len(results) > 12 and results[12] else None
+    
+    arch_type = "STANDALONE"
+    if is_rac:
+        arch_type = "RAC" if instance_count > 1 else "RAC ONE NODE"
+        
+    if is_cdb:
+        if con_name and con_name != 'CDB$ROOT':
+            db_arch = f"PDB: {con_name} ({arch_type})"
+        else:
+            db_arch = f"CDB Root: {db_name} ({arch_type})"
+    else:
+        db_arch = f"NON-CDB: {db_name} ({arch_type})"
+
+    top_segments = []
+    if len(results) > 13 and results[13]:
+        for row in results[13]:
+            top_segments.append({
+                'owner': row[0],
+                'object_name': row[1],
+                'object_type': row[2],
+                'blocks': row[3]
+            })
+
+    return {
+        "sessions": {
+            "total": total_sessions,
+            "active": active_sessions
+        },
+        "sga": sga_info,
+        "health": {
+            "objects": objects,
+            "invalid_objects_count": invalid_objects_count,
+            "cursors": open_cursors_val,
+            "triggers": triggers,
+            "long_ops": long_ops_count,
+            "sysaux_count": sysaux_count,
+            "db_arch": db_arch
+        }
+    }
+
+@coalesced
+async def get_dashboard_metrics_async(conn_info):
     from .sql_central_mod import get_sql_content
-    connection = None
+    from .oracle_async import get_async_oracle_connection, fetch_dicts_async
     try:
-        connection = get_oracle_connection(conn_info)
-        cursor = connection.cursor()
-
-        # Load version-aware SQL
         version = conn_info.get('version')
         sql_text = get_sql_content("dashboard_metrics.sql", version, is_internal=True)
-        
-        # Split by semicolon and execute
         statements = [s.strip() for s in sql_text.split(';') if s.strip()]
-        
-        results = []
-        for stmt in statements:
-            cursor.execute(stmt)
-            if cursor.description:
-                results.append(cursor.fetchall())
-            else:
-                results.append(None)
 
-        # 0: Total Sessions, 1: Active Sessions, 2: SGA, 3: Objects, 4: Invalid Objects Count, 5: Cursors, 6: Triggers
-        total_sessions = results[0][0][0] if results[0] else 0
-        active_sessions = results[1][0][0] if results[1] else 0
-        
-        # Normalize SGA Info keys (v$sgainfo)
-        sga_info = {}
-        if results[2]:
-            for row in results[2]:
-                sga_info[row[0]] = row[1]
-                # Fallback for different capitalizations
-                if row[0].lower() == 'total sga size':
-                    sga_info['Total SGA Size'] = row[1]
-        
-        objects = {row[0]: row[1] for row in results[3]} if results[3] else {}
-        invalid_objects_count = results[4][0][0] if len(results) > 4 and results[4] else 0
-        
-        open_cursors_val = 0
-        if len(results) > 5 and results[5]:
-            open_cursors_val = results[5][0][0]
+        # One pooled session per request (the "dashboard" concurrency limit counts sessions),
+        # every statement timed and traced by fetch_dicts_async
+        async with get_async_oracle_connection(conn_info) as connection:
+            results = []
+            for stmt in statements:
+                result = await fetch_dicts_async(connection, stmt, fmt="columnar")
+                results.append(result["rows"] if result["columns"] else None)
+            top_queries = await fetch_dicts_async(
+                connection, get_sql_content("top_queries.sql", version, is_internal=True), {"owner_filter": "%"}
+            )
+            wait_events = await fetch_dicts_async(
+                connection, get_sql_content("wait_events.sql", version, is_internal=True),
+                {"owner_filter": "%", "event_filter": "%"}
+            )
+            schemas = await fetch_dicts_async(connection, get_sql_content("active_schemas.sql", version, is_internal=True))
 
-        triggers = {row[0]: row[1] for row in results[6]} if len(results) > 6 and results[6] else {}
-        long_ops_count = results[7][0][0] if len(results) > 7 and results[7] else 0
-        sysaux_count = results[8][0][0] if len(results) > 8 and results[8] else 0
-        is_rac = results[9][0][0] == 'TRUE' if len(results) > 9 and results[9] else False
-        instance_count = results[10][0][0] if len(results) > 10 and results[10] else 1
-        
-        db_name = results[11][0][0] if len(results) > 11 and results[11] else "Unknown"
-        is_cdb = results[11][0][1] == 1 if len(results) > 11 and results[11] else False
-        con_name = results[12][0][0] if len(results) > 12 and results[12] else None
-        
-        arch_type = "STANDALONE"
-        if is_rac:
-            arch_type = "RAC" if instance_count > 1 else "RAC ONE NODE"
-            
-        if is_cdb:
-            if con_name and con_name != 'CDB$ROOT':
-                db_arch = f"PDB: {con_name} ({arch_type})"
-            else:
-                db_arch = f"CDB Root: {db_name} ({arch_type})"
-        else:
-            db_arch = f"NON-CDB: {db_name} ({arch_type})"
-
-        top_segments = []
-        if len(results) > 13 and results[13]:
-            for row in results[13]:
-                top_segments.append({
-                    'owner': row[0],
-                    'object_name': row[1],
-                    'object_type': row[2],
-                    'blocks': row[3]
-                })
-
-        return {
-            "sessions": {
-                "total": total_sessions,
-                "active": active_sessions
-            },
-            "sga": sga_info,
-            "health": {
-                "objects": objects,
-                "invalid_objects_count": invalid_objects_count,
-                "cursors": open_cursors_val,
-                "triggers": triggers,
-                "long_ops": long_ops_count,
-                "sysaux_count": sysaux_count,
-                "db_arch": db_arch
-            },
-            "top_queries": get_top_queries(conn_info),
-            "wait_events": get_top_wait_events(conn_info),
-            "active_schemas": get_active_schemas(conn_info)
-        }
+        metrics = build_dashboard_metrics(results)
+        metrics["top_queries"] = top_queries
+        metrics["wait_events"] = wait_events
+        metrics["active_schemas"] = [next(iter(row.values())) for row in schemas]
+        return metrics
     except Exception as e:
         print(f"Error fetching dashboard metrics: {e}")
         raise e
-    finally:
-        if connection:
-            connection.close()
 
+@coalesced
 def get_top_queries(conn_info, owner_filter="%"):
     from .sql_central_mod import get_sql_content
     connection = None
@@ -121,6 +128,7 @@ def get_top_queries(conn_info, owner_filter="%"):
         if connection:
             connection.close()
 
+@coalesced
 def get_top_wait_events(conn_info, owner_filter="%", event_filter="%"):
     from .sql_central_mod import get_sql_content
     connection = None
@@ -140,10 +148,12 @@ def get_top_wait_events(conn_info, owner_filter="%", event_filter="%"):
         if connection:
             connection.close()
 
+@coalesced
 def get_long_operations(conn_info):
     from .sessions_mod import get_long_ops
     return get_long_ops(conn_info)
 
+@coalesced
 def get_invalid_triggers(conn_info, owner_filter="%"):
     from .sql_central_mod import get_sql_content
     connection = None
@@ -163,6 +173,7 @@ def get_invalid_triggers(conn_info, owner_filter="%"):
         if connection:
             connection.close()
 
+@coalesced
 def get_valid_objects(conn_info, owner_filter="%"):
     from .sql_central_mod import get_sql_content
     connection = None
@@ -182,6 +193,7 @@ def get_valid_objects(conn_info, owner_filter="%"):
         if connection:
             connection.close()
 
+@coalesced
 def get_open_cursors(conn_info, owner_filter="%"):
     from .sql_central_mod import get_sql_content
     connection = None
@@ -201,6 +213,7 @@ def get_open_cursors(conn_info, owner_filter="%"):
         if connection:
             connection.close()
 
+@coalesced
 def get_dashboard_sysaux_occupants(conn_info):
     from .sql_central_mod import get_sql_content
     connection = None
@@ -220,6 +233,7 @@ def get_dashboard_sysaux_occupants(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_active_schemas(conn_info):
     from .sql_central_mod import get_sql_content
     connection = None
@@ -238,6 +252,7 @@ def get_active_schemas(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_tablespace_summary(conn_info):
     from .sql_central_mod import get_sql_content
     connection = None
@@ -1,5 +1,6 @@
-from .utils import get_db_connection, encrypt_password, decrypt_password
+from .utils import get_db_connection, encrypt_password, decrypt_password, close_oracle_pool, invalidate_connect_params
 from .exporter_sync_mod import sync_exporter_config
+from .tracing_mod import span
 
 def get_all_connections():
     conn = get_db_connection()
@@ -16,12 +17,26 @@ def get_all_connections():
     return connections
 
 def get_active_connection():
+    with span("sqlite.get_active_connection", {"db.system": "sqlite"}) as sqlite_span:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM connections WHERE is_active = 1")
+        row = cursor.fetchone()
+        conn.close()
+        sqlite_span.set_attribute("db.rows", 1 if row else 0)
+    return dict(row) if row else None
+
+def get_timemachine_connections(active_only=False):
+    """Connections the time machine should snapshot (opted in, or only the active one)."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM connections WHERE is_active = 1")
-    row = cursor.fetchone()
+    if active_only:
+        cursor.execute("SELECT * FROM connections WHERE is_active = 1")
+    else:
+        cursor.execute("SELECT * FROM connections WHERE COALESCE(timemachine_enabled, 1) = 1")
+    rows = cursor.fetchall()
     conn.close()
-    return dict(row) if row else None
+    return [dict(row) for row in rows]
 
 def save_connection(data):
     conn = get_db_connection()
@@ -29,12 +44,14 @@ def save_connection(data):
     
     password = encrypt_password(data['password'])
     
-    sql = """INSERT INTO connections (name, host, port, service, username, password, type, connection_mode, connection_role, connect_string, wallet_path, tns_admin) 
-             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+    timemachine_enabled = data.get('timemachine_enabled')
+    sql = """INSERT INTO connections (name, host, port, service, username, password, type, connection_mode, connection_role, connect_string, wallet_path, tns_admin, timemachine_enabled, timemachine_interval) 
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
     params = (data['name'], data.get('host', ''), data.get('port', ''), data.get('service', ''), 
               data['username'], password, data['type'], 
               data.get('connection_mode', 'BASIC'), data.get('connection_role', 'NORMAL'), 
-              data.get('connect_string'), data.get('wallet_path'), data.get('tns_admin'))
+              data.get('connect_string'), data.get('wallet_path'), data.get('tns_admin'),
+              1 if timemachine_enabled is None else int(timemachine_enabled), data.get('timemachine_interval'))
     
     cursor.execute(sql, params)
     last_id = cursor.lastrowid
@@ -52,6 +69,12 @@ def update_connection(conn_id, data):
     fields = ["name", "host", "port", "service", "username", "type", "connection_mode", "connection_role", "connect_string", "wallet_path", "tns_admin"]
     params = [data.get(f) for f in fields]
     
+    # Time machine settings are only changed when sent explicitly
+    for f in ["timemachine_enabled", "timemachine_interval"]:
+        if data.get(f) is not None:
+            fields.append(f)
+            params.append(data[f])
+    
     sql = "UPDATE connections SET " + ", ".join([f"{f}=?" for f in fields])
     
     if 'password' in data and data['password'] != '••••••••':
@@ -65,6 +88,10 @@ def update_connection(conn_id, data):
     conn.commit()
     conn.close()
     
+    # Drop cached connect parameters and pooled sessions built from the previous settings
+    invalidate_connect_params(conn_id)
+    close_oracle_pool(conn_id)
+    
     # Sync exporter configuration
     sync_exporter_config()
 
@@ -75,6 +102,9 @@ def delete_connection(conn_id):
     conn.commit()
     conn.close()
     
+    invalidate_connect_params(conn_id)
+    close_oracle_pool(conn_id)
+    
     # Sync exporter configuration
     sync_exporter_config()
 
@@ -1,6 +1,8 @@
 import oracledb
 from .utils import get_oracle_connection
+from .single_flight_mod import coalesced
 
+@coalesced
 def get_duplicate_source_info(conn_info):
     connection = None
     try:
@@ -1,5 +1,7 @@
 from .utils import get_oracle_connection
+from .single_flight_mod import coalesced
 
+@coalesced
 def run_healthcheck(conn_info):
     connection = None
     try:
@@ -97,6 +99,7 @@ def run_healthcheck(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_advisor_data(conn_info):
     connection = None
     try:
@@ -1,6 +1,8 @@
 import oracledb
 from .utils import get_oracle_connection
+from .single_flight_mod import coalesced
 
+@coalesced
 def get_legacy_jobs(conn_info):
     connection = None
     try:
@@ -28,6 +30,7 @@ def get_legacy_jobs(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_running_jobs(conn_info):
     connection = None
     try:
@@ -0,0 +1,235 @@
+import os
+import time
+import asyncio
+from starlette.concurrency import run_in_threadpool
+from .utils import register_pool_close_hook, oracle_action, oracle_logger
+from .api_response import encode_json
+from .oracle_async import endpoint_limit
+from .sample_cache_mod import read_sample
+from .sessions_mod import get_sessions_async, get_blocking_sessions_async, sample_blocking_sessions, get_long_ops
+from .dashboard_mod import get_dashboard_metrics_async
+from .metrics_mod import register_gauge
+
+# Live feeds (server-sent events).
+# One poller task per (connection, feed) fetches the feed on its interval and fans
+# the result out to every subscriber. A subscriber first gets a full snapshot, then
+# only diffs: rows added, updated or removed by key (the changed keys for the
+# dashboard metrics). Frames are encoded once per poll, not once per client, so
+# Oracle load and encoding work do not grow with the number of viewers.
+# The session feeds reuse the shared sample (sample_cache_mod) when it is fresh.
+
+# interval: seconds between polls (ROCKDB_FEED_<NAME>_SECONDS);
+# key: columns identifying a row for the diffs (None: the feed is a dict)
+FEEDS = {
+    "sessions": {"interval": 5, "key": ("inst_id", "sid", "serial#")},
+    "blocking": {"interval": 5, "key": ("inst_id", "sid")},
+    "longops": {"interval": 3, "key": ("inst_id", "sid", "qcsid", "message", "inicio")},
+    "dashboard": {"interval": 5, "key": None},
+}
+for _name, _spec in FEEDS.items():
+    _spec["interval"] = float(os.getenv(f"ROCKDB_FEED_{_name.upper()}_SECONDS", str(_spec["interval"])))
+
+# Poll failures are logged on rockdb.oracle.live_feed; clients only get a generic
+# poll_error (the details stay in the log and in get_feed_stats)
+logger = oracle_logger.getChild("live_feed")
+POLL_ERROR_MESSAGE = "Feed update failed, retrying"
+
+HEARTBEAT_SECONDS = 15
+MAX_BACKOFF = 60
+# Frames buffered per subscriber; a client that falls further behind is resent a snapshot
+SUBSCRIBER_QUEUE = 16
+
+_feeds = {}
+
+async def _fetch(feed, conn_info, interval):
+    if feed == "sessions":
+        sample = read_sample(conn_info['id'], "sessions", interval)
+        if sample:
+            return sample[0]
+        async with endpoint_limit("sessions"):
+            return await get_sessions_async(conn_info)
+    if feed == "blocking":
+        sampled = sample_blocking_sessions(conn_info, max_age=interval)
+        if sampled:
+            return sampled[0]
+        async with endpoint_limit("sessions"):
+            return await get_blocking_sessions_async(conn_info)
+    if feed == "longops":
+        sample = read_sample(conn_info['id'], "long_ops", interval)
+        if sample:
+            return sample[0]
+        async with endpoint_limit("longops"):
+            return await run_in_threadpool(get_long_ops, conn_info)
+    async with endpoint_limit("dashboard"):
+        return await get_dashboard_metrics_async(conn_info)
+
+def _event(frame):
+    return b"event: " + frame["type"].encode() + b"\ndata: " + encode_json(frame) + b"\n\n"
+
+def _index(rows, key_fields):
+    index = {tuple(row.get(f) for f in key_fields): row for row in rows}
+    # Duplicate keys cannot be diffed: such results are sent as snapshots
+    return index if len(index) == len(rows) else None
+
+def _diff(feed, old, new, key_fields):
+    """Diff frame from old to new, None when nothing changed, or False when only a snapshot can describe it."""
+    if key_fields is None:
+        changed = {k: v for k, v in new.items() if k not in old or old[k] != v}
+        removed = [k for k in old if k not in new]
+        if not changed and not removed:
+            return None
+        return {"type": "diff", "feed": feed, "changed": changed, "removed": removed}
+
+    old_index, new_index = _index(old, key_fields), _index(new, key_fields)
+    if old_index is None or new_index is None:
+        return None if old == new else False
+    added = [k for k in new_index if k not in old_index]
+    updated = [k for k in new_index if k in old_index and old_index[k] != new_index[k]]
+    removed = [k for k in old_index if k not in new_index]
+    kept_order = [k for k in old_index if k in new_index] + added
+    if not added and not updated and not removed and kept_order == list(new_index):
+        return None
+    frame = {
+        "type": "diff", "feed": feed,
+        "added": [new_index[k] for k in added],
+        "updated": [new_index[k] for k in updated],
+        "removed": [list(k) for k in removed]
+    }
+    if kept_order != list(new_index):
+        frame["order"] = [list(k) for k in new_index]
+    return frame
+
+def _snapshot(state):
+    if state["snapshot"] is None:
+        state["snapshot"] = _event({
+            "type": "snapshot", "feed": state["feed"], "seq": state["seq"], "time": state["time"],
+            "key": FEEDS[state["feed"]]["key"], "data": state["data"]
+        })
+    return state["snapshot"]
+
+def _send(queue, message, state):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # Too far behind for diffs to apply: start this client over from a snapshot
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_snapshot(state) if message is not None else None)
+
+def _broadcast(state, message):
+    for queue in list(state["subscribers"]):
+        _send(queue, message, state)
+
+def _publish(state, data):
+    feed = state["feed"]
+    first = state["data"] is None
+    frame = None if first else _diff(feed, state["data"], data, FEEDS[feed]["key"])
+    if frame is None and not first:
+        return
+    state["seq"] += 1
+    state["time"] = time.time()
+    state["data"] = data
+    state["snapshot"] = None
+    if frame:
+        frame["seq"] = state["seq"]
+        frame["time"] = state["time"]
+        state["diffs"] += 1
+        _broadcast(state, _event(frame))
+    else:
+        _broadcast(state, _snapshot(state))
+
+async def _poll(state):
+    feed = state["feed"]
+    interval = FEEDS[feed]["interval"]
+    failures = 0
+    # The poller serves every subscriber: its queries are tagged with the feed, not the first request
+    oracle_action.set(f"live_feed_{feed}")
+    while state["subscribers"]:
+        started = time.monotonic()
+        try:
+            data = await _fetch(feed, state["conn_info"], interval)
+            failures = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failures += 1
+            state["errors"] += 1
+            state["last_error"] = str(e)
+            logger.warning("Live feed %s failed for connection %s: %s", feed, state['conn_info'].get('name'), e)
+            _broadcast(state, _event({"type": "poll_error", "feed": feed, "message": POLL_ERROR_MESSAGE}))
+            await asyncio.sleep(min(interval * 2 ** failures, MAX_BACKOFF))
+            continue
+        state["polls"] += 1
+        state["last_poll_ms"] = round((time.monotonic() - started) * 1000, 2)
+        _publish(state, data)
+        await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
+
+def _close_feed(key, state):
+    _broadcast(state, None)
+    if state["task"]:
+        state["task"].cancel()
+    if _feeds.get(key) is state:
+        del _feeds[key]
+
+def close_feeds(conn_id):
+    """Ends the feeds of a connection whose settings changed; EventSource clients reconnect."""
+    for key, state in list(_feeds.items()):
+        if key[0] == conn_id:
+            # Pool close hooks run in worker threads: hand over to the feed's loop
+            state["loop"].call_soon_threadsafe(_close_feed, key, state)
+
+register_pool_close_hook(close_feeds)
+
+async def subscribe(conn_info, feed):
+    """Server-sent event stream of a feed for one client (snapshot, then diff, poll_error and keepalive events)."""
+    key = (conn_info['id'], feed)
+    state = _feeds.get(key)
+    if state is None:
+        state = _feeds[key] = {
+            "feed": feed, "conn_info": conn_info, "loop": asyncio.get_running_loop(),
+            "subscribers": set(), "task": None, "data": None, "snapshot": None,
+            "seq": 0, "time": None, "polls": 0, "diffs": 0, "errors": 0,
+            "last_poll_ms": None, "last_error": None
+        }
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+    state["subscribers"].add(queue)
+    if state["data"] is not None:
+        queue.put_nowait(_snapshot(state))
+    if state["task"] is None or state["task"].done():
+        state["task"] = asyncio.create_task(_poll(state))
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            yield message
+    finally:
+        state["subscribers"].discard(queue)
+        if not state["subscribers"]:
+            if state["task"]:
+                state["task"].cancel()
+            if _feeds.get(key) is state:
+                del _feeds[key]
+
+def _subscriber_counts():
+    for (conn_id, feed), state in list(_feeds.items()):
+        yield (conn_id, feed), len(state["subscribers"])
+
+register_gauge("rockdb_live_feed_subscribers", "Clients subscribed to a live feed",
+               _subscriber_counts, labels=("connection_id", "feed"))
+
+def get_feed_stats():
+    return [
+        {
+            "connection_id": conn_id, "feed": feed, "interval_s": FEEDS[feed]["interval"],
+            "subscribers": len(state["subscribers"]), "seq": state["seq"], "polls": state["polls"],
+            "diffs": state["diffs"], "errors": state["errors"], "last_poll_ms": state["last_poll_ms"],
+            "last_error": state["last_error"]
+        }
+        for (conn_id, feed), state in list(_feeds.items())
+    ]
@@ -1,6 +1,9 @@
 import oracledb
 from .utils import get_oracle_connection
+from .single_flight_mod import coalesced
+from .catalog_cache_mod import catalog_cached
 
+@coalesced
 def get_alert_logs(conn_info, limit=100):
     connection = None
     try:
@@ -40,6 +43,8 @@ def get_alert_logs(conn_info, limit=100):
         if connection:
             connection.close()
 
+@catalog_cached
+@coalesced
 def get_db_parameters(conn_info):
     connection = None
     try:
@@ -62,6 +67,7 @@ def get_db_parameters(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_outstanding_alerts(conn_info):
     connection = None
     try:
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from .metrics_mod import register_gauge
+
+# Event loop watchdog.
+# A heartbeat task measures how late the loop wakes it up (loop lag). A separate
+# thread watches the heartbeat: when the loop has not ticked for LAG_WARN_MS it
+# records the stall together with the loop thread's current stack, which names
+# the synchronous call that is blocking every async route.
+HEARTBEAT_INTERVAL = float(os.getenv("ROCKDB_LOOP_HEARTBEAT_SECONDS", "0.5"))
+LAG_WARN_MS = float(os.getenv("ROCKDB_LOOP_LAG_WARN_MS", "250"))
+HISTORY = 120
+
+_lag_samples = deque(maxlen=HISTORY)
+_stalls = deque(maxlen=20)
+_state = {"last_beat": None, "loop_thread": None, "stalled": False, "watcher": None}
+
+def _stack_of(thread_id):
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return []
+    return [line.strip() for line in traceback.format_stack(frame, limit=8)]
+
+def _watch():
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        last_beat = _state["last_beat"]
+        if last_beat is None:
+            continue
+        # Beats are HEARTBEAT_INTERVAL apart: only the time past the expected beat is lag
+        blocked_ms = (time.monotonic() - last_beat - HEARTBEAT_INTERVAL) * 1000
+        if blocked_ms >= LAG_WARN_MS and not _state["stalled"]:
+            _state["stalled"] = True
+            stack = _stack_of(_state["loop_thread"])
+            _stalls.append({"time": time.time(), "blocked_ms": round(blocked_ms, 1), "stack": stack})
+            print(f"Event loop blocked for {blocked_ms:.0f} ms, currently in: {stack[-1] if stack else 'unknown'}")
+
+async def loop_watchdog():
+    """Heartbeat task recording loop lag; starts the stall watcher thread on first run."""
+    loop = asyncio.get_running_loop()
+    _state["loop_thread"] = threading.get_ident()
+    _state["last_beat"] = time.monotonic()
+    watcher = _state.get("watcher")
+    if watcher is None or not watcher.is_alive():
+        watcher = _state["watcher"] = threading.Thread(target=_watch, name="loop-watchdog", daemon=True)
+        watcher.start()
+    try:
+        while True:
+            expected = loop.time() + HEARTBEAT_INTERVAL
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            lag_ms = max(loop.time() - expected, 0) * 1000
+            _lag_samples.append(lag_ms)
+            _state["last_beat"] = time.monotonic()
+            if _state["stalled"] and _stalls:
+                _stalls[-1]["blocked_ms"] = round(max(_stalls[-1]["blocked_ms"], lag_ms), 1)
+            _state["stalled"] = False
+    except asyncio.CancelledError:
+        pass
+    finally:
+        # No heartbeat anymore: the watcher must not report the stopped loop as blocked
+        _state["last_beat"] = None
+        _state["stalled"] = False
+
+register_gauge("rockdb_event_loop_lag_seconds", "Latest event loop lag measured by the watchdog",
+               lambda: _lag_samples[-1] / 1000 if _lag_samples else 0)
+
+def get_loop_stats():
+    """Recent loop lag (ms) and the last stalls with the stack that caused them."""
+    samples = list(_lag_samples)
+    return {
+        "heartbeat_s": HEARTBEAT_INTERVAL,
+        "warn_ms": LAG_WARN_MS,
+        "current_lag_ms": round(samples[-1], 2) if samples else None,
+        "avg_lag_ms": round(sum(samples) / len(samples), 2) if samples else None,
+        "max_lag_ms": round(max(samples), 2) if samples else None,
+        "stalls": list(_stalls)
+    }
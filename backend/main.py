@@ -1,14 +1,17 @@
 from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 import os
+import time
+import threading
 import oracledb
 import traceback
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Literal
 
-from .utils import init_db, get_db_connection
+from .utils import init_db, get_db_connection, close_all_oracle_pools
 from .db_connections import (
     get_all_connections, get_active_connection, save_connection, 
     update_connection, delete_connection, activate_connection
@@ -17,17 +20,22 @@ from .servers_mod import (
     get_all_servers, save_server, update_server, delete_server
 )
 from .oracle_connectivity import discover_database_info
+from .oracle_async import endpoint_limit, close_all_async_pools
 from .dashboard_mod import (
-    get_dashboard_metrics, get_tablespace_summary, get_top_queries, 
+    get_tablespace_summary, get_top_queries, 
     get_top_wait_events, get_long_operations, get_invalid_triggers,
     get_valid_objects, get_open_cursors, get_active_schemas,
-    get_dashboard_sysaux_occupants
+    get_dashboard_sysaux_occupants, get_dashboard_metrics_async
 )
 from .sessions_mod import (
-    get_sessions, kill_session, get_session_sql, get_blocking_sessions, 
+    kill_session, get_session_sql,
     get_long_ops, get_blocker_details, get_object_ddl, get_instances,
-    simulate_long_op, get_long_ops_stats, get_sql_statistics, get_detailed_locks
+    simulate_long_op, get_long_ops_stats, get_sql_statistics, get_detailed_locks,
+    get_sessions_async, get_blocking_sessions_async, get_zombie_count, get_session_cursors, get_cursor_plan,
+    sample_sessions, sample_long_ops, sample_blocking_sessions
 )
+from .sample_cache_mod import sample_response, get_sample_stats
+from .live_feed_mod import subscribe as subscribe_feed, get_feed_stats
 from .storage_mod import (
     get_tablespaces_detailed, get_data_files, get_segments, get_extents, get_tablespace_map,
     get_control_files, get_sysaux_occupants, get_undo_stats, get_temp_usage,
@@ -43,19 +51,27 @@ from .redo_logs_mod import (
 )
 from .logs_mod import get_alert_logs, get_db_parameters, get_outstanding_alerts
 from .healthcheck_mod import run_healthcheck, get_advisor_data
-from .timemachine_mod import store_snapshot, get_history_range, get_snapshot_at_time
+from .timemachine_mod import (
+    get_history_range, get_snapshot_at_time, get_session_history,
+    get_sql_activity, get_wait_class_history, get_writer_stats, shutdown_writer
+)
+from .timemachine_collector_mod import timemachine_scheduler, get_collector_stats
+from .loop_monitor_mod import loop_watchdog, get_loop_stats
+from .api_response import FastJSONResponse, FastJSONRoute, CompressionMiddleware, encode_json
 import asyncio
 from .backups_mod import (
     get_backup_jobs, get_backup_summary, get_backup_sets, 
     get_backup_info, get_backup_datafiles, get_nls_parameters,
     get_recovery_summary, get_incarnations, get_datafiles_detailed,
-    execute_rman_sql_report, get_rman_progress
+    execute_rman_sql_report, get_rman_progress, get_backup_images
 )
 from .duplicate_mod import get_duplicate_source_info
 from .sql_central_mod import (
     get_sql_registry, get_sql_content, execute_generic_sql, 
     seed_sql_scripts, delete_sql_script, execute_external_tool,
-    search_sql_content, save_sql_content
+    search_sql_content, save_sql_content, get_sql_template_stats,
+    get_seed_status, sql_scripts_watcher, WATCH_ENABLED as SQL_WATCH_ENABLED,
+    stream_generic_sql, STREAM_FORMATS
 )
 from .jobs_mod import (
     get_legacy_jobs, get_running_jobs, run_legacy_job, 
@@ -66,46 +82,40 @@ from .statistics_mod import (
     flush_monitoring
 )
 from .tools_mod import start_tool_execution, get_tool_execution_status, list_executions
+from .single_flight_mod import get_coalescing_stats
+from .metrics_mod import MetricsMiddleware, render_metrics, observe_serialized
+from .selfload_mod import get_selfload
+from .tracing_mod import TracingMiddleware
+from .catalog_cache_mod import invalidate_catalog, changes_catalog, get_catalog_cache_stats
 
 init_db()
-seed_sql_scripts()
 
-# --- Time Machine Background Task ---
-async def timemachine_worker():
-    """Background loop to collect performance snapshots every 10 seconds."""
-    print("Time Machine worker starting...")
-    while True:
-        try:
-            active_conn = get_active_connection()
-            if active_conn:
-                # 1. Fetch data from Oracle
-                # Using existing modules but wrapping in try/except for resilience
-                try:
-                    sessions = get_sessions(active_conn)
-                    long_ops = get_long_ops(active_conn)
-                    blocking = get_blocking_sessions(active_conn)
-                    
-                    # 2. Store in VictoriaMetrics (Time Machine)
-                    store_snapshot(sessions, long_ops, blocking)
-                    # print(f"Time Machine: Captured snapshot for {active_conn['name']}")
-                except Exception as db_err:
-                    print(f"Time Machine Worker DB Error: {db_err}")
-            
-            # Wait 10 seconds
-            await asyncio.sleep(10)
-        except asyncio.CancelledError:
-            print("Time Machine worker stopping...")
-            break
-        except Exception as e:
-            print(f"Time Machine Worker Error: {e}")
-            await asyncio.sleep(10)
+app = FastAPI(title="RockDB Python Backend", default_response_class=FastJSONResponse)
+# Plain dict/list results are encoded by orjson directly (no jsonable_encoder pass)
+app.router.route_class = FastJSONRoute
 
-app = FastAPI(title="RockDB Python Backend")
+async def sync_sql_scripts_in_background():
+    try:
+        await run_in_threadpool(seed_sql_scripts)
+    except Exception as e:
+        print(f"Background SQL script sync failed: {e}", flush=True)
 
 @app.on_event("startup")
 async def startup_event():
-    # Start the worker task
-    asyncio.create_task(timemachine_worker())
+    # Sync the script library without holding up readiness (incremental via sql_manifest)
+    asyncio.create_task(sync_sql_scripts_in_background())
+    if SQL_WATCH_ENABLED:
+        asyncio.create_task(sql_scripts_watcher())
+    # Start the time machine scheduler (one collection cycle per registered database)
+    asyncio.create_task(timemachine_scheduler())
+    # Report event loop lag (and the call blocking it) while snapshots are collected
+    asyncio.create_task(loop_watchdog())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_all_async_pools()
+    close_all_oracle_pools()
+    await run_in_threadpool(shutdown_writer)
 
 # CORS setup
 app.add_middleware(
@@ -115,7 +125,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip/brotli by Accept-Encoding for bodies above ROCKDB_COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
+# Outermost: request latency per route template for /metrics, and the request span
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
 
+# ?format= of grid endpoints (see utils.shape_rows): default list of row objects,
+# "columnar" = column names once + row arrays, "columns" = one value array per column
+ResponseFormat = Literal["json", "columnar", "columns"]
 
 class ConnectionBase(BaseModel):
     id: Optional[int] = None
@@ -131,6 +150,8 @@ class ConnectionBase(BaseModel):
     connect_string: Optional[str] = None
     wallet_path: Optional[str] = None
     tns_admin: Optional[str] = None
+    timemachine_enabled: Optional[bool] = None
+    timemachine_interval: Optional[int] = None
 
 class ConnectionResponse(ConnectionBase):
     id: int
@@ -213,6 +234,70 @@ class LockStatsRequest(BaseModel):
 def health_check():
     return {"status": "ok", "message": "Backend is ready"}
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Backend self-metrics in the Prometheus text format (scraped by docker_rockdb/prometheus)."""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+@app.get("/api/health/loop")
+async def read_loop_health():
+    """Event loop lag measured by the watchdog, with recent stalls."""
+    return get_loop_stats()
+
+@app.get("/api/health/samples")
+async def read_sample_cache():
+    """Latest shared samples per connection, with hit/miss counts per kind."""
+    return get_sample_stats()
+
+@app.get("/api/health/coalescing")
+async def read_coalescing_stats():
+    """How many calls shared an in-flight execution instead of querying Oracle again."""
+    return get_coalescing_stats()
+
+@app.get("/api/health/catalog-cache")
+async def read_catalog_cache_stats():
+    return get_catalog_cache_stats()
+
+@app.delete("/api/cache/catalog")
+def clear_catalog_cache():
+    """Forgets the cached catalog results of the active connection (next reads query Oracle)."""
+    active = get_active_connection()
+    if not active:
+        raise HTTPException(status_code=404, detail="No active connection")
+    invalidate_catalog(active['id'])
+    return {"message": "Catalog cache cleared"}
+
+@app.get("/api/selfload")
+def read_selfload(top: int = 20):
+    """Load RockDB's own (MODULE-tagged) SQL puts on the active database, per feature, from gv$sqlstats."""
+    active = get_active_connection()
+    if not active:
+        raise HTTPException(status_code=404, detail="No active connection")
+    try:
+        return get_selfload(active, top)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Server-sent live feeds: one poller per (connection, feed) shared by every subscriber
+LiveFeed = Literal["sessions", "blocking", "longops", "dashboard"]
+
+@app.get("/api/live/stats")
+async def read_live_feed_stats():
+    return get_feed_stats()
+
+@app.get("/api/live/{feed}")
+async def read_live_feed(feed: LiveFeed):
+    """Event stream of the feed: a snapshot event, then diff events (see live_feed_mod)."""
+    active = await run_in_threadpool(get_active_connection)
+    if not active:
+        raise HTTPException(status_code=404, detail="No active connection")
+    return StreamingResponse(
+        subscribe_feed(active, feed),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/connections", response_model=List[ConnectionResponse])
 def read_connections():
     return get_all_connections()
@@ -267,7 +352,8 @@ def test_connection_endpoint(conn: ConnectionBase):
                 # Use the stored (encrypted) password - get_oracle_connection will decrypt it
                 conn_dict['password'] = row['password']
         
-        discovery_data = discover_database_info(conn_dict)
+        # Use a standalone connection: the form may hold unsaved settings
+        discovery_data = discover_database_info(conn_dict, pooled=False)
         return {"message": "Success", "discovery": discovery_data}
     except Exception as e:
         print(f"Test connection failed: {e}")
@@ -354,12 +440,13 @@ def activate_existing_connection(conn_id: int):
 # Feature Routes
 
 @app.get("/api/dashboard/metrics")
-def read_dashboard_metrics():
-    active = get_active_connection()
+async def read_dashboard_metrics():
+    active = await run_in_threadpool(get_active_connection)
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_dashboard_metrics(active)
+        async with endpoint_limit("dashboard"):
+            return await get_dashboard_metrics_async(active)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -453,13 +540,20 @@ def read_dashboard_schemas():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# max_age (seconds) of /api/sessions, /api/sessions/blocking and /api/sessions/longops:
+# serve the latest shared sample when it is at most that old (default
+# ROCKDB_SAMPLE_MAX_AGE_SECONDS, 0 = always query Oracle)
 @app.get("/api/sessions")
-def read_sessions(inst_id: Optional[int] = None):
-    active = get_active_connection()
+async def read_sessions(inst_id: Optional[int] = None, format: Optional[ResponseFormat] = None, max_age: Optional[float] = None):
+    active = await run_in_threadpool(get_active_connection)
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
+    sampled = sample_sessions(active, inst_id, fmt=format, max_age=max_age)
+    if sampled:
+        return sample_response(*sampled)
     try:
-        return get_sessions(active, inst_id)
+        async with endpoint_limit("sessions"):
+            return await get_sessions_async(active, inst_id, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -469,7 +563,6 @@ def read_zombie_count(inst_id: Optional[int] = None):
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        from .sessions_mod import get_zombie_count
         return {"count": get_zombie_count(active, inst_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -515,22 +608,31 @@ def read_sql_statistics(sql_id: str, inst_id: int = 1):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sessions/blocking")
-def read_blocking_sessions(inst_id: Optional[int] = None):
-    active = get_active_connection()
+async def read_blocking_sessions(inst_id: Optional[int] = None, format: Optional[ResponseFormat] = None, max_age: Optional[float] = None):
+    active = await run_in_threadpool(get_active_connection)
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
+    sampled = sample_blocking_sessions(active, inst_id, fmt=format, max_age=max_age)
+    if sampled:
+        return sample_response(*sampled)
     try:
-        return get_blocking_sessions(active, inst_id)
+        async with endpoint_limit("sessions"):
+            return await get_blocking_sessions_async(active, inst_id, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sessions/longops")
-def read_long_ops(inst_id: Optional[int] = None, sid: Optional[str] = '%'):
-    active = get_active_connection()
+async def read_long_ops(inst_id: Optional[int] = None, sid: Optional[str] = '%', format: Optional[ResponseFormat] = None, max_age: Optional[float] = None):
+    active = await run_in_threadpool(get_active_connection)
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
+    sampled = sample_long_ops(active, inst_id, sid, fmt=format, max_age=max_age)
+    if sampled:
+        return sample_response(*sampled)
     try:
-        return get_long_ops(active, inst_id, sid)
+        # Slow gv$session_longops scans: cap how many worker threads they can hold
+        async with endpoint_limit("longops"):
+            return await run_in_threadpool(get_long_ops, active, inst_id, sid, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -578,24 +680,22 @@ def read_blocker_details(sid: int, inst_id: Optional[int] = 1):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sessions/cursors/{sid}")
-def read_session_cursors(sid: int, inst_id: int = 1):
+def read_session_cursors(sid: int, inst_id: int = 1, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        from .sessions_mod import get_session_cursors
-        return get_session_cursors(active, sid, inst_id)
+        return get_session_cursors(active, sid, inst_id, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sessions/cursor_plan/{sql_id}")
-def read_cursor_plan(sql_id: str, inst_id: int = 1):
+def read_cursor_plan(sql_id: str, inst_id: int = 1, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        from .sessions_mod import get_cursor_plan
-        return get_cursor_plan(active, sql_id, inst_id)
+        return get_cursor_plan(active, sql_id, inst_id, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -611,23 +711,23 @@ def read_object_ddl(obj_type: str, owner: str, name: str):
 
 
 @app.get("/api/storage/tablespaces")
-def read_storage_tablespaces(inst_id: Optional[int] = None):
+def read_storage_tablespaces(inst_id: Optional[int] = None, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_tablespaces_detailed(active, inst_id=inst_id)
+        return get_tablespaces_detailed(active, inst_id=inst_id, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/files")
 @app.get("/api/storage/datafiles")
-def read_storage_files(inst_id: Optional[int] = None):
+def read_storage_files(inst_id: Optional[int] = None, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_data_files(active, inst_id=inst_id)
+        return get_data_files(active, inst_id=inst_id, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -642,12 +742,12 @@ def read_storage_charts():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/redo/members")
-def read_redo_members():
+def read_redo_members(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_redo_members(active)
+        return get_redo_members(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -682,12 +782,12 @@ def read_db_parameters():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/jobs")
-def read_backup_jobs():
+def read_backup_jobs(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_backup_jobs(active)
+        return get_backup_jobs(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -711,33 +811,32 @@ def read_backup_info(days: int = 30):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/sets/{session_key}")
-def read_backup_sets(session_key: int):
+def read_backup_sets(session_key: int, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_backup_sets(active, session_key)
+        return get_backup_sets(active, session_key, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/files/{bs_key}")
-def read_backup_datafiles(bs_key: int):
+def read_backup_datafiles(bs_key: int, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_backup_datafiles(active, bs_key)
+        return get_backup_datafiles(active, bs_key, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/images")
-def read_backup_images():
+def read_backup_images(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        from .backups_mod import get_backup_images
-        return get_backup_images(active)
+        return get_backup_images(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -752,22 +851,22 @@ def read_recovery_summary():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/recovery/incarnations")
-def read_incarnations():
+def read_incarnations(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_incarnations(active)
+        return get_incarnations(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/recovery/datafiles")
-def read_recovery_datafiles():
+def read_recovery_datafiles(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_datafiles_detailed(active)
+        return get_datafiles_detailed(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -784,86 +883,82 @@ def read_duplicate_source_info():
 
 # --- NEW RMAN REPORTS ---
 @app.get("/api/backups/rman/summary")
-def read_rman_summary(days: int = 7):
+def read_rman_summary(days: int = 7, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_days.sql', variables={"days": days})
+        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_days.sql', variables={"days": days}, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/rman/config")
-def read_rman_config():
+def read_rman_config(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_configuration.sql')
+        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_configuration.sql', fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/rman/size")
-def read_rman_size(days: int = 30):
+def read_rman_size(days: int = 30, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        from .backups_mod import execute_rman_sql_report
-        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_size.sql', variables={"days": days})
+        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_size.sql', variables={"days": days}, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/rman/files")
-def read_rman_files(days: int = 30):
+def read_rman_files(days: int = 30, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        from .backups_mod import execute_rman_sql_report
-        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_list_backup_files.sql', variables={"days": days})
+        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_list_backup_files.sql', variables={"days": days}, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/rman/datafiles")
-def read_rman_datafiles():
+def read_rman_datafiles(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_datafiles.sql')
+        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_datafiles.sql', fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/rman/pieces")
-def read_rman_pieces(days: int = 30):
+def read_rman_pieces(days: int = 30, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        from .backups_mod import execute_rman_sql_report
-        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_pieces.sql', variables={"days": days})
+        return execute_rman_sql_report(active, 'oracle_internal/rman/rman_backup_pieces.sql', variables={"days": days}, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/rman/status")
-def read_rman_status(days: int = 30):
+def read_rman_status(days: int = 30, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        from .backups_mod import execute_rman_sql_report
-        return execute_rman_sql_report(active, "oracle_internal/rman/rman_backup_status.sql", variables={"days": days})
+        return execute_rman_sql_report(active, "oracle_internal/rman/rman_backup_status.sql", variables={"days": days}, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/backups/rman/configuration")
-def read_rman_configuration():
+def read_rman_configuration(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return execute_rman_sql_report(active, "oracle_internal/rman/rman_backup_configuration.sql")
+        return execute_rman_sql_report(active, "oracle_internal/rman/rman_backup_configuration.sql", fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -889,6 +984,11 @@ def read_health_advisor():
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- SQL SYNC ---
+@app.get("/api/sql/sync")
+def read_sql_sync_status():
+    """Result of the last script library sync (startup, watcher or manual)."""
+    return get_seed_status()
+
 @app.post("/api/sql/sync")
 def trigger_sql_sync():
     try:
@@ -908,55 +1008,57 @@ def read_backups_nls():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/segments")
-def read_storage_segments(ts_name: Optional[str] = None, search: Optional[str] = None):
+def read_storage_segments(ts_name: Optional[str] = None, search: Optional[str] = None, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_segments(active, tablespace_name=ts_name, search_query=search)
+        return get_segments(active, tablespace_name=ts_name, search_query=search, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/extents")
-def read_storage_extents(owner: str, segment_name: str):
-    active = get_active_connection()
+async def read_storage_extents(owner: str, segment_name: str, format: Optional[ResponseFormat] = None):
+    active = await run_in_threadpool(get_active_connection)
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        data = get_extents(active, owner, segment_name)
+        # dba_extents can take minutes on large segments: cap how many worker threads it can hold
+        async with endpoint_limit("storage"):
+            data = await run_in_threadpool(get_extents, active, owner, segment_name, fmt=format)
         return data
     except Exception as e:
         print(f"API Error in read_storage_extents: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/tablespace-map")
-def read_storage_tablespace_map(ts_name: str, file_id: Optional[int] = None):
+def read_storage_tablespace_map(ts_name: str, file_id: Optional[int] = None, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_tablespace_map(active, ts_name, file_id)
+        return get_tablespace_map(active, ts_name, file_id, fmt=format)
     except Exception as e:
         print(f"API Error in read_storage_tablespace_map: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/redo")
-def read_redo_groups():
+def read_redo_groups(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_redo_groups(active)
+        return get_redo_groups(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/redo/history")
-def read_redo_history(days: int = 7, inst_id: Optional[int] = None):
+def read_redo_history(days: int = 7, inst_id: Optional[int] = None, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_redo_switch_history(active, days=days, inst_id=inst_id)
+        return get_redo_switch_history(active, days=days, inst_id=inst_id, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -971,12 +1073,12 @@ def read_redo_threads():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/control")
-def read_control_files():
+def read_control_files(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_control_files(active)
+        return get_control_files(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1001,12 +1103,12 @@ def read_undo_stats():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/temp")
-def read_temp_usage():
+def read_temp_usage(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_temp_usage(active)
+        return get_temp_usage(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1035,22 +1137,22 @@ def force_ckpt():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/redo/standby")
-def read_standby_redo():
+def read_standby_redo(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_standby_redo_groups(active)
+        return get_standby_redo_groups(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/storage/redo/archives")
-def read_redo_archives():
+def read_redo_archives(format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
     try:
-        return get_archived_logs(active)
+        return get_archived_logs(active, fmt=format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1228,6 +1330,11 @@ def read_sql_registry():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/sql/cache")
+def read_sql_cache_stats():
+    """Hit/miss counters of the SQL template registry."""
+    return get_sql_template_stats()
+
 @app.get("/api/sql/content")
 def read_sql_content(request: Request, path: str, vars: Optional[str] = None):
     try:
@@ -1260,9 +1367,11 @@ def read_sql_content(request: Request, path: str, vars: Optional[str] = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sql/search")
-def run_sql_search(query: str):
+def run_sql_search(query: str, regex: bool = False, detailed: bool = False, limit: Optional[int] = None):
     try:
-        return search_sql_content(query)
+        return search_sql_content(query, regex=regex, limit=limit, detailed=detailed)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1272,7 +1381,7 @@ class SqlExecuteRequest(BaseModel):
     bind_vars: Optional[dict] = None
 
 @app.post("/api/sql/execute")
-def run_sql(req: SqlExecuteRequest):
+def run_sql(req: SqlExecuteRequest, format: Optional[ResponseFormat] = None):
     active = get_active_connection()
     if not active:
         raise HTTPException(status_code=404, detail="No active connection")
@@ -1281,10 +1390,88 @@ def run_sql(req: SqlExecuteRequest):
             active, 
             req.sql_text, 
             auto_commit=req.auto_commit, 
-            bind_vars=req.bind_vars
+            bind_vars=req.bind_vars,
+            fmt=format
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if changes_catalog(req.sql_text):
+            invalidate_catalog(active['id'])
+
+class SqlStreamRequest(SqlExecuteRequest):
+    format: str = "ndjson"
+    max_rows: Optional[int] = None
+
+@app.post("/api/sql/execute/stream")
+async def run_sql_stream(req: SqlStreamRequest):
+    """
+    Streams results as NDJSON frames while rows are fetched (see stream_generic_sql).
+    Disconnecting stops the fetch, cancels the running call and closes the cursor.
+    """
+    active = await run_in_threadpool(get_active_connection)
+    if not active:
+        raise HTTPException(status_code=404, detail="No active connection")
+    if req.format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(STREAM_FORMATS)}")
+
+    cancel_event = threading.Event()
+    state = {}
+    chunks = stream_generic_sql(
+        active, req.sql_text, auto_commit=req.auto_commit, bind_vars=req.bind_vars,
+        fmt=req.format, max_rows=req.max_rows, cancel_event=cancel_event, state=state
+    )
+    # The generator runs in worker threads: a close must wait for a fetch in progress
+    chunks_lock = threading.Lock()
+
+    def next_chunk():
+        with chunks_lock:
+            return next(chunks, None)
+
+    def close_chunks():
+        # Closing the generator closes the cursor and the connection
+        try:
+            with chunks_lock:
+                chunks.close()
+        except Exception as e:
+            print(f"Error closing SQL stream: {e}")
+        finally:
+            if changes_catalog(req.sql_text):
+                invalidate_catalog(active['id'])
+
+    async def body():
+        finished = False
+        try:
+            while True:
+                try:
+                    chunk = await run_in_threadpool(next_chunk)
+                except Exception as e:
+                    yield encode_json({"type": "error", "message": str(e)}) + b"\n"
+                    break
+                if chunk is None:
+                    break
+                start = time.perf_counter()
+                data = b"".join(encode_json(frame) + b"\n" for frame in chunk)
+                rows = sum(len(f["rows"]) if f["type"] == "rows" else f["type"] == "row" for f in chunk)
+                observe_serialized("run_sql_stream", rows, data, time.perf_counter() - start)
+                yield data
+            finished = True
+        finally:
+            if not finished:
+                # Client went away: stop between batches and abort a call in progress
+                cancel_event.set()
+                connection = state.get("connection")
+                if connection is not None:
+                    try:
+                        connection.cancel()
+                    except Exception:
+                        pass
+                # A fetch may still be running in a worker thread: close once it returns
+                asyncio.get_running_loop().run_in_executor(None, close_chunks)
+            else:
+                close_chunks()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 class SqlSaveRequest(BaseModel):
     rel_path: str
@@ -1557,25 +1744,71 @@ def read_schema_tables(owner: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def resolve_timemachine_connection(connection_id):
+    """Time machine reads default to the active connection."""
+    if connection_id is not None:
+        return connection_id
+    active = get_active_connection()
+    return active['id'] if active else None
+
 @app.get("/api/timemachine/history")
-def read_timemachine_history(start: str, end: str):
+def read_timemachine_history(start: str, end: str, connection_id: Optional[int] = None):
     """Fetch historical high-level metrics."""
     try:
-        return get_history_range(start, end)
+        return get_history_range(start, end, resolve_timemachine_connection(connection_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/timemachine/snapshot")
-def read_timemachine_snapshot(target: str):
-    """Fetch a complete point-in-time snapshot."""
+def read_timemachine_snapshot(target: str, connection_id: Optional[int] = None, format: Optional[str] = None):
+    """Fetch a complete point-in-time snapshot (format=compact returns columns + row arrays)."""
     try:
-        snapshot = get_snapshot_at_time(target)
+        snapshot = get_snapshot_at_time(target, resolve_timemachine_connection(connection_id), compact=(format == "compact"))
         if not snapshot:
             raise HTTPException(status_code=404, detail="No snapshot found for this time")
         return snapshot
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/timemachine/sessions")
+def read_timemachine_sessions(start: str, end: str, connection_id: Optional[int] = None,
+                              username: Optional[str] = None, event: Optional[str] = None,
+                              wait_class: Optional[str] = None, sql_id: Optional[str] = None,
+                              status: Optional[str] = None, limit: int = 5000):
+    """Historical session rows filtered server-side (user, event, wait class, sql_id, status)."""
+    try:
+        return get_session_history(start, end, resolve_timemachine_connection(connection_id),
+                                   username=username, event=event, wait_class=wait_class,
+                                   sql_id=sql_id, status=status, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/timemachine/sql")
+def read_timemachine_sql(start: str, end: str, connection_id: Optional[int] = None, sql_id: Optional[str] = None):
+    """Per-sql_id session aggregates over a time range."""
+    try:
+        return get_sql_activity(start, end, resolve_timemachine_connection(connection_id), sql_id=sql_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/timemachine/waits")
+def read_timemachine_waits(start: str, end: str, connection_id: Optional[int] = None):
+    """Active sessions per wait class over a time range."""
+    try:
+        return get_wait_class_history(start, end, resolve_timemachine_connection(connection_id))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/timemachine/collector")
+def read_timemachine_collector_stats():
+    """Per-connection timing of the snapshot collection cycles."""
+    return get_collector_stats()
+
+@app.get("/api/timemachine/writer")
+def read_timemachine_writer_stats():
+    """Queue depth, disk spool and counters of the time machine batch writer."""
+    return get_writer_stats()
+
 # --- Serving Static Files (Frontend) ---
 
 # Path to the 'dist' directory (where React build lives)
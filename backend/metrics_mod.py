@@ -0,0 +1,205 @@
+import sys
+import time
+import oracledb
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+from .tracing_mod import query_span
+
+# Backend self-metrics (Prometheus text format on GET /metrics).
+# Request latency per route template, Oracle connect time, per-query execute and
+# fetch time with row counts, rows serialized per endpoint and time machine cycle
+# timing. Queue depths and other point-in-time values are read on each scrape
+# from the callbacks the owning modules register with register_gauge().
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "rockdb_http_request_duration_seconds",
+    "Time until the response starts, per route template",
+    ("method", "route", "status"), buckets=LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge("rockdb_http_requests_in_progress", "Requests being handled")
+
+ORACLE_CONNECT_SECONDS = Histogram(
+    "rockdb_oracle_connect_seconds",
+    "Time to borrow a pooled session or open a standalone connection",
+    ("mode",), buckets=QUERY_BUCKETS
+)
+ORACLE_CONNECT_ERRORS = Counter("rockdb_oracle_connect_errors_total", "Failed connection attempts", ("mode",))
+ORACLE_EXECUTE_SECONDS = Histogram(
+    "rockdb_oracle_execute_seconds", "cursor.execute() time per query (calling function)",
+    ("query",), buckets=QUERY_BUCKETS
+)
+ORACLE_FETCH_SECONDS = Histogram(
+    "rockdb_oracle_fetch_seconds", "Fetch time per query (calling function)",
+    ("query",), buckets=QUERY_BUCKETS
+)
+ORACLE_ROWS_FETCHED = Counter("rockdb_oracle_rows_fetched_total", "Rows fetched per query", ("query",))
+
+ROWS_SERIALIZED = Counter("rockdb_rows_serialized_total", "Rows encoded to JSON per endpoint", ("endpoint",))
+BYTES_SERIALIZED = Counter("rockdb_response_bytes_total", "JSON bytes encoded per endpoint (before compression)", ("endpoint",))
+ENCODE_SECONDS = Histogram(
+    "rockdb_json_encode_seconds", "JSON encoding time per endpoint",
+    ("endpoint",), buckets=QUERY_BUCKETS
+)
+
+TIMEMACHINE_CYCLE_SECONDS = Histogram(
+    "rockdb_timemachine_cycle_seconds", "Time machine collection cycle (collect and store) per database",
+    ("connection",), buckets=LATENCY_BUCKETS
+)
+TIMEMACHINE_PHASE_SECONDS = Histogram(
+    "rockdb_timemachine_phase_seconds", "Time machine cycle phases (acquire, query, store)",
+    ("connection", "phase"), buckets=LATENCY_BUCKETS
+)
+
+# --- Scrape-time gauges ---
+_gauges = {}
+
+def register_gauge(name, documentation, fn, labels=()):
+    """
+    Exposes a value read on each scrape. fn returns a number, or with labels an
+    iterable of (label values, number) pairs.
+    """
+    _gauges[name] = (documentation, fn, tuple(labels))
+
+class _GaugeCollector:
+    def collect(self):
+        for name, (documentation, fn, labels) in list(_gauges.items()):
+            family = GaugeMetricFamily(name, documentation, labels=labels or None)
+            try:
+                if labels:
+                    for label_values, value in fn():
+                        family.add_metric([str(v) for v in label_values], value)
+                else:
+                    family.add_metric([], fn())
+            except Exception as e:
+                print(f"Metrics: gauge {name} failed: {e}")
+                continue
+            yield family
+
+REGISTRY.register(_GaugeCollector())
+
+def render_metrics():
+    """(body, content type) of the current metrics in the Prometheus text format."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+# --- Per-query timing ---
+# Sessions handed out by get_oracle_connection are MeteredConnections: their
+# cursors time execute and fetch calls and count the rows (and trace them, see
+# tracing_mod). The query label is the *_mod function that ran the cursor (e.g.
+# storage_mod.get_segments), found by skipping the shared fetch helpers on the stack.
+_HELPER_MODULES = {__name__, "backend.utils", "backend.oracle_async"}
+
+def query_name(depth=2):
+    frame = sys._getframe(depth)
+    while frame is not None and frame.f_globals.get("__name__") in _HELPER_MODULES:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    return f"{frame.f_globals.get('__name__', '').rsplit('.', 1)[-1]}.{frame.f_code.co_name}"
+
+def _fetched(query, start, count):
+    ORACLE_FETCH_SECONDS.labels(query).observe(time.perf_counter() - start)
+    ORACLE_ROWS_FETCHED.labels(query).inc(count)
+
+class MeteredCursor(oracledb.Cursor):
+    def execute(self, statement, *args, **kwargs):
+        query = query_name()
+        with query_span("oracle.execute", query, statement):
+            start = time.perf_counter()
+            try:
+                return super().execute(statement, *args, **kwargs)
+            finally:
+                ORACLE_EXECUTE_SECONDS.labels(query).observe(time.perf_counter() - start)
+
+    def fetchall(self):
+        query = query_name()
+        with query_span("oracle.fetch", query) as fetch_span:
+            start = time.perf_counter()
+            rows = super().fetchall()
+            _fetched(query, start, len(rows))
+            fetch_span.set_attribute("db.rows", len(rows))
+        return rows
+
+    def fetchmany(self, *args, **kwargs):
+        query = query_name()
+        with query_span("oracle.fetch", query) as fetch_span:
+            start = time.perf_counter()
+            rows = super().fetchmany(*args, **kwargs)
+            _fetched(query, start, len(rows))
+            fetch_span.set_attribute("db.rows", len(rows))
+        return rows
+
+    def fetchone(self):
+        # Not traced: row-by-row loops would emit a span per row
+        query = query_name()
+        start = time.perf_counter()
+        row = super().fetchone()
+        _fetched(query, start, 0 if row is None else 1)
+        return row
+
+class MeteredConnection(oracledb.Connection):
+    def cursor(self, scrollable=False):
+        return MeteredCursor(self, scrollable)
+
+def observe_query(query, execute_seconds, fetch_seconds, rows):
+    """Records a query timed by the caller (the asyncio path)."""
+    ORACLE_EXECUTE_SECONDS.labels(query).observe(execute_seconds)
+    ORACLE_FETCH_SECONDS.labels(query).observe(fetch_seconds)
+    ORACLE_ROWS_FETCHED.labels(query).inc(rows)
+
+# --- Serialized rows ---
+def row_count(content):
+    """Rows in a route result: list length, or the rows of a columnar result; 1 for other objects."""
+    if isinstance(content, list):
+        return len(content)
+    if isinstance(content, dict) and isinstance(content.get("columns"), list):
+        if isinstance(content.get("rows"), list):
+            return len(content["rows"])
+        if isinstance(content.get("data"), list):
+            return len(content["data"][0]) if content["data"] else 0
+    return 1
+
+def observe_serialized(endpoint, rows, body, seconds):
+    ROWS_SERIALIZED.labels(endpoint).inc(rows)
+    BYTES_SERIALIZED.labels(endpoint).inc(len(body))
+    ENCODE_SECONDS.labels(endpoint).observe(seconds)
+
+# --- Request latency ---
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request until its response starts (for
+    streamed NDJSON and live feeds: until the first chunk), labelled with the
+    route template so /api/sessions/{sid} is one series, not one per sid.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        state = {"observed": False}
+
+        def observe(status):
+            if state["observed"]:
+                return
+            state["observed"] = True
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", None) or "unmatched", str(status)
+            ).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                observe(message["status"])
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # No response started: the request failed (or the client went away)
+            observe(500)
+            HTTP_IN_PROGRESS.dec()
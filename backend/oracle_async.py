@@ -0,0 +1,130 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+import oracledb
+from .utils import (
+    shape_rows, output_type_handler, get_connect_params, pool_signature, register_pool_close_hook, tag_connection,
+    oracle_logger,
+    POOL_MIN, POOL_MAX, POOL_INCREMENT, POOL_PING_INTERVAL, POOL_WAIT_TIMEOUT_MS
+)
+from .metrics_mod import query_name, observe_query, ORACLE_CONNECT_SECONDS, ORACLE_CONNECT_ERRORS
+from .tracing_mod import span, query_span
+
+# asyncio-native Oracle access (python-oracledb thin mode only).
+# One AsyncConnectionPool per saved connection id, owned by the event loop
+# that created it.
+_async_pools = {}
+
+# Concurrency limits per endpoint group, e.g. ROCKDB_CONCURRENCY_SESSIONS=4.
+# Groups without an explicit setting fall back to ROCKDB_CONCURRENCY_DEFAULT.
+DEFAULT_CONCURRENCY = int(os.getenv("ROCKDB_CONCURRENCY_DEFAULT", "8"))
+
+_group_limits = {}
+_group_semaphores = {}
+
+def get_group_limit(group):
+    if group not in _group_limits:
+        _group_limits[group] = int(os.getenv(f"ROCKDB_CONCURRENCY_{group.upper()}", str(DEFAULT_CONCURRENCY)))
+    return _group_limits[group]
+
+@asynccontextmanager
+async def endpoint_limit(group):
+    """Bounds how many requests of an endpoint group run against Oracle at once."""
+    semaphore = _group_semaphores.get(group)
+    if semaphore is None:
+        semaphore = _group_semaphores[group] = asyncio.Semaphore(get_group_limit(group))
+    async with semaphore:
+        yield
+
+def get_async_pool(conn_info):
+    conn_id = conn_info['id']
+    signature = pool_signature(conn_info)
+    entry = _async_pools.get(conn_id)
+    if entry and entry[1] == signature:
+        return entry[0]
+    if entry:
+        _schedule_close(conn_id, entry)
+
+    oracle_logger.info("Creating async Oracle session pool for connection %s (%s): min=%s max=%s increment=%s",
+                       conn_id, conn_info.get('name'), POOL_MIN, POOL_MAX, POOL_INCREMENT)
+    pool = oracledb.create_pool_async(
+        min=POOL_MIN,
+        max=POOL_MAX,
+        increment=POOL_INCREMENT,
+        ping_interval=POOL_PING_INTERVAL,
+        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+        wait_timeout=POOL_WAIT_TIMEOUT_MS,
+        **get_connect_params(conn_info)
+    )
+    _async_pools[conn_id] = (pool, signature, asyncio.get_running_loop())
+    return pool
+
+def _schedule_close(conn_id, entry):
+    pool, _, loop = entry
+    if _async_pools.get(conn_id) is entry:
+        del _async_pools[conn_id]
+    try:
+        # Pools are bound to their loop; update/delete run in worker threads
+        asyncio.run_coroutine_threadsafe(pool.close(force=True), loop)
+        oracle_logger.info("Draining async Oracle session pool for connection %s", conn_id)
+    except Exception as e:
+        oracle_logger.error("Error draining async Oracle session pool for connection %s: %s", conn_id, e)
+
+def close_async_pool(conn_id):
+    entry = _async_pools.get(conn_id)
+    if entry:
+        _schedule_close(conn_id, entry)
+
+register_pool_close_hook(close_async_pool)
+
+async def close_all_async_pools():
+    entries = list(_async_pools.items())
+    _async_pools.clear()
+    for conn_id, (pool, _, _) in entries:
+        try:
+            await pool.close(force=True)
+            oracle_logger.info("Drained async Oracle session pool for connection %s", conn_id)
+        except Exception as e:
+            oracle_logger.error("Error draining async Oracle session pool for connection %s: %s", conn_id, e)
+
+@asynccontextmanager
+async def get_async_oracle_connection(conn_info, action=None):
+    """Borrows a session from the connection's async pool (or connects directly for unsaved profiles)."""
+    mode = "async_pool" if conn_info.get('id') else "async_direct"
+    start = time.perf_counter()
+    try:
+        with span("oracle.connect", {"db.system": "oracle", "rockdb.connect_mode": mode,
+                                     "rockdb.connection": conn_info.get('name')}):
+            if conn_info.get('id'):
+                connection = await get_async_pool(conn_info).acquire()
+            else:
+                connection = await oracledb.connect_async(**get_connect_params(conn_info))
+    except Exception:
+        ORACLE_CONNECT_ERRORS.labels(mode).inc()
+        raise
+    ORACLE_CONNECT_SECONDS.labels(mode).observe(time.perf_counter() - start)
+    # LOBs inline: AsyncLOB.read() would need an extra awaited round-trip per cell
+    connection.outputtypehandler = output_type_handler
+    tag_connection(connection, action)
+    try:
+        yield connection
+    finally:
+        await connection.close()
+
+async def fetch_dicts_async(connection, sql_text, params=None, fmt=None):
+    """Runs a query and returns rows as [{column: value}] with lower-case column names (or shaped by fmt)."""
+    query = query_name()
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        with query_span("oracle.execute", query, sql_text):
+            await cursor.execute(sql_text, params or {})
+        executed = time.perf_counter()
+        if cursor.description is None:
+            return shape_rows([], [], fmt)
+        columns = [col[0].lower() for col in cursor.description]
+        with query_span("oracle.fetch", query) as fetch_span:
+            rows = await cursor.fetchall()
+            fetch_span.set_attribute("db.rows", len(rows))
+    observe_query(query, executed - start, time.perf_counter() - executed, len(rows))
+    return shape_rows(columns, rows, fmt)
@@ -2,10 +2,10 @@ from .utils import get_oracle_connection
 import traceback
 import sys
 
-def discover_database_info(conn_info):
+def discover_database_info(conn_info, pooled=True):
     connection = None
     try:
-        connection = get_oracle_connection(conn_info)
+        connection = get_oracle_connection(conn_info, pooled=pooled)
         cursor = connection.cursor()
         
         # 1. Basic Info & CDB status (CDB column only exists in 12c+)
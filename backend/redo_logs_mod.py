@@ -1,6 +1,9 @@
-from .utils import get_oracle_connection, safe_value
+from .utils import get_oracle_connection, fetch_rows, fetch_dict
+from .single_flight_mod import coalesced
+from .catalog_cache_mod import invalidates_catalog
 
-def get_redo_groups(conn_info):
+@coalesced
+def get_redo_groups(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -12,8 +15,7 @@ def get_redo_groups(conn_info):
             FROM gv$log
             ORDER BY thread#, group#
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching redo groups: {e}")
         raise e
@@ -21,7 +23,8 @@ def get_redo_groups(conn_info):
         if connection:
             connection.close()
 
-def get_redo_switch_history(conn_info, days=7, inst_id=None):
+@coalesced
+def get_redo_switch_history(conn_info, days=7, inst_id=None, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -63,8 +66,7 @@ def get_redo_switch_history(conn_info, days=7, inst_id=None):
             ORDER BY TRUNC(FIRST_TIME) DESC
         """
         cursor.execute(sql)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching redo switch history: {e}")
         raise e
@@ -72,6 +74,7 @@ def get_redo_switch_history(conn_info, days=7, inst_id=None):
         if connection:
             connection.close()
 
+@coalesced
 def get_redo_threads(conn_info):
     connection = None
     try:
@@ -87,6 +90,7 @@ def get_redo_threads(conn_info):
         if connection:
             connection.close()
 
+@invalidates_catalog
 def add_redo_group(conn_info, thread, size_mb, member_path=None):
     connection = None
     try:
@@ -103,6 +107,7 @@ def add_redo_group(conn_info, thread, size_mb, member_path=None):
         if connection:
             connection.close()
 
+@invalidates_catalog
 def drop_redo_group(conn_info, group_id):
     connection = None
     try:
@@ -116,6 +121,7 @@ def drop_redo_group(conn_info, group_id):
         if connection:
             connection.close()
 
+@invalidates_catalog
 def add_redo_member(conn_info, group_id, member_path):
     connection = None
     try:
@@ -129,6 +135,7 @@ def add_redo_member(conn_info, group_id, member_path):
         if connection:
             connection.close()
 
+@invalidates_catalog
 def drop_redo_member(conn_info, member_path):
     connection = None
     try:
@@ -160,7 +167,8 @@ def switch_logfile(conn_info):
         if connection:
             connection.close()
 
-def get_standby_redo_groups(conn_info):
+@coalesced
+def get_standby_redo_groups(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -172,8 +180,7 @@ def get_standby_redo_groups(conn_info):
             FROM v$standby_log
             ORDER BY thread#, group#
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching standby redo groups: {e}")
         return []
@@ -181,7 +188,8 @@ def get_standby_redo_groups(conn_info):
         if connection:
             connection.close()
 
-def get_archived_logs(conn_info, limit=50):
+@coalesced
+def get_archived_logs(conn_info, limit=50, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -195,8 +203,7 @@ def get_archived_logs(conn_info, limit=50):
               AND first_time > sysdate - 1
             ORDER BY first_time DESC
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching archived logs: {e}")
         return []
@@ -204,6 +211,7 @@ def get_archived_logs(conn_info, limit=50):
         if connection:
             connection.close()
 
+@coalesced
 def get_log_buffer_stats(conn_info):
     connection = None
     try:
@@ -224,7 +232,7 @@ def get_log_buffer_stats(conn_info):
         if row:
             stats['log_buffer_size'] = round(int(row[0]) / 1024 / 1024, 2)
             
-        return {k: safe_value(v) for k, v in stats.items()}
+        return stats
     except Exception as e:
         print(f"Error fetching log buffer stats: {e}")
         return {}
@@ -232,6 +240,7 @@ def get_log_buffer_stats(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_redo_management_info(conn_info):
     connection = None
     try:
@@ -253,25 +262,23 @@ def get_redo_management_info(conn_info):
                 (SELECT sequence# FROM v$log WHERE status = 'CURRENT') AS current_seq
             FROM dual
         """)
-        row = cursor.fetchone()
-        columns = [col[0].lower() for col in cursor.description]
-        status_info = dict(zip(columns, row)) if row else {}
+        status_info = fetch_dict(cursor) or {}
         
-        return {k: safe_value(v) for k, v in {**params, **status_info}.items()}
+        return {**params, **status_info}
     except Exception as e:
         print(f"Error fetching redo management info: {e}")
         raise e
     finally:
         if connection:
             connection.close()
-def get_redo_members(conn_info):
+@coalesced
+def get_redo_members(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
         cursor = connection.cursor()
         cursor.execute("SELECT group#, member, type, is_recovery_dest_file FROM v$logfile ORDER BY group#")
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching redo members: {e}")
         return []
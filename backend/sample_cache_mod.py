@@ -0,0 +1,71 @@
+import os
+import time
+import threading
+from .utils import register_pool_close_hook
+from .api_response import FastJSONResponse
+
+# Latest-sample cache.
+# Whoever fetches a full (all instances, unfiltered) session list, long ops list or
+# raw blocking rows for a connection publishes it here: the time machine collector
+# every cycle, and the interactive endpoints on a live fetch. Endpoints serve the
+# sample while it is younger than the requested max_age, so every open tab polling
+# the same database shares one set of gv$ queries.
+# drop_samples advances the connection's generation; a fetch that started before
+# (e.g. a collector cycle that still saw a killed session) publishes nothing.
+SAMPLE_KINDS = ("sessions", "long_ops", "blocking")
+DEFAULT_MAX_AGE = float(os.getenv("ROCKDB_SAMPLE_MAX_AGE_SECONDS", "10"))
+
+_samples = {}
+_samples_lock = threading.Lock()
+_generations = {}
+_stats = {kind: {"hits": 0, "misses": 0, "published": 0, "discarded": 0} for kind in SAMPLE_KINDS}
+
+def sample_generation(conn_id):
+    """Taken before a fetch and handed to publish_sample with its rows."""
+    return _generations.get(conn_id, 0)
+
+def publish_sample(conn_id, kind, rows, generation):
+    if not conn_id:
+        return
+    with _samples_lock:
+        if generation != _generations.get(conn_id, 0):
+            # Fetched before the samples were dropped
+            _stats[kind]["discarded"] += 1
+            return
+        _samples[(conn_id, kind)] = (time.monotonic(), time.time(), rows)
+        _stats[kind]["published"] += 1
+
+def read_sample(conn_id, kind, max_age=None):
+    """(rows, age_s) of the latest sample when it is at most max_age seconds old, else None."""
+    if max_age is None:
+        max_age = DEFAULT_MAX_AGE
+    entry = _samples.get((conn_id, kind)) if conn_id else None
+    if entry is not None:
+        age = time.monotonic() - entry[0]
+        if age <= max_age:
+            _stats[kind]["hits"] += 1
+            return entry[2], age
+    _stats[kind]["misses"] += 1
+    return None
+
+def drop_samples(conn_id, kinds=SAMPLE_KINDS):
+    """Forgets the samples of a connection (settings changed, or a session was killed)."""
+    with _samples_lock:
+        _generations[conn_id] = _generations.get(conn_id, 0) + 1
+        for kind in kinds:
+            _samples.pop((conn_id, kind), None)
+
+register_pool_close_hook(drop_samples)
+
+def sample_response(content, age):
+    """Response for data served from a sample; X-Sample-Age tells the client how old it is."""
+    return FastJSONResponse(content, headers={"X-Sample-Age": f"{age:.1f}"})
+
+def get_sample_stats():
+    now = time.monotonic()
+    samples = [
+        {"connection_id": conn_id, "kind": kind, "age_s": round(now - entry[0], 1),
+         "sampled_at": entry[1], "rows": len(entry[2])}
+        for (conn_id, kind), entry in list(_samples.items())
+    ]
+    return {"default_max_age_s": DEFAULT_MAX_AGE, "kinds": _stats, "samples": samples}
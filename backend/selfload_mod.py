@@ -0,0 +1,115 @@
+from .utils import get_oracle_connection, fetch_rows, fetch_dict, ORACLE_MODULE, ORACLE_CLIENT_IDENTIFIER
+from .single_flight_mod import coalesced
+
+# Load RockDB itself puts on a database.
+# Sessions are tagged MODULE=ORACLE_MODULE and ACTION=<endpoint or background task>
+# (utils.tag_connection). gv$sqlstats carries the cursor statistics but not the
+# module, so the statements are picked from gv$sql by module and their figures
+# read from gv$sqlstats. Figures are cumulative since each cursor was loaded in
+# the shared pool; the share is relative to every cursor in gv$sqlstats.
+OURS_SQL = """
+    WITH ours AS (
+        SELECT inst_id, sql_id, MAX(action) AS action
+        FROM gv$sql
+        WHERE module = :module
+        GROUP BY inst_id, sql_id
+    )
+"""
+
+FEATURES_SQL = OURS_SQL + """
+    SELECT NVL(o.action, '(none)') AS feature,
+           COUNT(*) AS statements,
+           SUM(s.executions) AS executions,
+           ROUND(SUM(s.cpu_time) / 1e6, 3) AS cpu_s,
+           ROUND(SUM(s.elapsed_time) / 1e6, 3) AS elapsed_s,
+           SUM(s.buffer_gets) AS buffer_gets,
+           SUM(s.disk_reads) AS disk_reads,
+           SUM(s.rows_processed) AS rows_processed
+    FROM ours o
+    JOIN gv$sqlstats s ON s.inst_id = o.inst_id AND s.sql_id = o.sql_id
+    GROUP BY o.action
+    ORDER BY cpu_s DESC
+"""
+
+STATEMENTS_SQL = """
+    SELECT * FROM (
+""" + OURS_SQL + """
+        SELECT NVL(o.action, '(none)') AS feature, s.inst_id, s.sql_id,
+               s.executions,
+               ROUND(s.cpu_time / 1e6, 3) AS cpu_s,
+               ROUND(s.elapsed_time / 1e6, 3) AS elapsed_s,
+               s.buffer_gets,
+               ROUND(s.cpu_time / NULLIF(s.executions, 0) / 1e3, 3) AS cpu_ms_per_exec,
+               ROUND(s.buffer_gets / NULLIF(s.executions, 0)) AS gets_per_exec,
+               s.last_active_time,
+               SUBSTR(s.sql_text, 1, 200) AS sql_text
+        FROM ours o
+        JOIN gv$sqlstats s ON s.inst_id = o.inst_id AND s.sql_id = o.sql_id
+        ORDER BY s.cpu_time DESC
+    ) WHERE ROWNUM <= :top
+"""
+
+TOTALS_SQL = """
+    SELECT ROUND(SUM(cpu_time) / 1e6, 3) AS cpu_s,
+           ROUND(SUM(elapsed_time) / 1e6, 3) AS elapsed_s,
+           SUM(buffer_gets) AS buffer_gets
+    FROM gv$sqlstats
+"""
+
+SESSIONS_SQL = """
+    SELECT inst_id, action, status, client_identifier, COUNT(*) AS sessions
+    FROM gv$session
+    WHERE module = :module
+    GROUP BY inst_id, action, status, client_identifier
+    ORDER BY inst_id, action
+"""
+
+def _share(part, total):
+    return round(part / total * 100, 3) if part and total else 0
+
+@coalesced
+def get_selfload(conn_info, top=20):
+    """CPU, elapsed time and buffer gets of RockDB's own SQL per feature (ACTION), with its share of the database's."""
+    connection = None
+    try:
+        connection = get_oracle_connection(conn_info)
+        cursor = connection.cursor()
+
+        cursor.execute(FEATURES_SQL, {"module": ORACLE_MODULE})
+        features = fetch_rows(cursor)
+
+        cursor.execute(STATEMENTS_SQL, {"module": ORACLE_MODULE, "top": top})
+        statements = fetch_rows(cursor)
+
+        cursor.execute(TOTALS_SQL)
+        database = fetch_dict(cursor) or {}
+
+        cursor.execute(SESSIONS_SQL, {"module": ORACLE_MODULE})
+        sessions = fetch_rows(cursor)
+
+        ours = {
+            "cpu_s": round(sum(f["cpu_s"] or 0 for f in features), 3),
+            "elapsed_s": round(sum(f["elapsed_s"] or 0 for f in features), 3),
+            "buffer_gets": sum(f["buffer_gets"] or 0 for f in features),
+            "executions": sum(f["executions"] or 0 for f in features),
+        }
+        return {
+            "module": ORACLE_MODULE,
+            "client_identifier": ORACLE_CLIENT_IDENTIFIER,
+            "totals": {
+                **ours,
+                "cpu_pct": _share(ours["cpu_s"], database.get("cpu_s")),
+                "elapsed_pct": _share(ours["elapsed_s"], database.get("elapsed_s")),
+                "buffer_gets_pct": _share(ours["buffer_gets"], database.get("buffer_gets")),
+            },
+            "database": database,
+            "features": features,
+            "statements": statements,
+            "sessions": sessions
+        }
+    except Exception as e:
+        print(f"Error fetching RockDB self load: {e}")
+        raise e
+    finally:
+        if connection:
+            connection.close()
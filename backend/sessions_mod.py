@@ -1,8 +1,11 @@
 import oracledb
-from .utils import get_oracle_connection, safe_value
+from .utils import get_oracle_connection, fetch_rows, fetch_dict, to_columnar, COLUMNAR_FORMATS
+from .sample_cache_mod import publish_sample, read_sample, drop_samples, sample_generation
+from .single_flight_mod import coalesced
 
 
 
+@coalesced
 def get_instances(conn_info):
     connection = None
     try:
@@ -18,35 +21,46 @@ def get_instances(conn_info):
         if connection:
             connection.close()
 
-def get_sessions(conn_info, inst_id=None):
-    connection = None
-    try:
-        connection = get_oracle_connection(conn_info)
-        cursor = connection.cursor()
-        
-        where_clause = "WHERE s.type != 'BACKGROUND'"
-        params = []
-        if inst_id:
-            where_clause += " AND s.inst_id = :inst_id"
-            params.append(inst_id)
+def get_sessions_query(conn_info, inst_id=None):
+    """Returns (sql_text, params) for the version-aware session list."""
+    where_clause = "WHERE s.type != 'BACKGROUND'"
+    params = []
+    if inst_id:
+        where_clause += " AND s.inst_id = :inst_id"
+        params.append(inst_id)
 
-        # Load version-aware SQL
-        from .sql_central_mod import get_sql_content
-        version = conn_info.get('version')
-        sql_template = get_sql_content("sessions.sql", version, is_internal=True)
-        
-        # Inject where_clause
-        sql_text = sql_template.format(where_clause=where_clause)
-        
-        cursor.execute(sql_text, params)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+    # Load version-aware SQL
+    from .sql_central_mod import get_sql_content
+    version = conn_info.get('version')
+    sql_template = get_sql_content("sessions.sql", version, is_internal=True)
+    
+    # Inject where_clause
+    return sql_template.format(where_clause=where_clause), params
+
+@coalesced
+async def get_sessions_async(conn_info, inst_id=None, fmt=None):
+    from .oracle_async import get_async_oracle_connection, fetch_dicts_async
+    generation = sample_generation(conn_info.get('id'))
+    try:
+        sql_text, params = get_sessions_query(conn_info, inst_id)
+        async with get_async_oracle_connection(conn_info) as connection:
+            rows = await fetch_dicts_async(connection, sql_text, params, fmt=fmt)
+        if not inst_id and fmt not in COLUMNAR_FORMATS:
+            publish_sample(conn_info.get('id'), "sessions", rows, generation)
+        return rows
     except Exception as e:
         print(f"Error fetching sessions: {e}")
         raise e
-    finally:
-        if connection:
-            connection.close()
+
+def sample_sessions(conn_info, inst_id=None, fmt=None, max_age=None):
+    """(session list, age_s) from the latest shared sample, or None when none is fresh enough."""
+    sample = read_sample(conn_info.get('id'), "sessions", max_age)
+    if sample is None:
+        return None
+    rows, age = sample
+    if inst_id:
+        rows = [r for r in rows if r.get('inst_id') == inst_id]
+    return to_columnar(rows, fmt), age
 
 def kill_session(conn_info, sid, serial, inst_id=1):
     connection = None
@@ -55,6 +69,8 @@ def kill_session(conn_info, sid, serial, inst_id=1):
         cursor = connection.cursor()
         # In RAC, we specify the instance
         cursor.execute(f"ALTER SYSTEM KILL SESSION '{sid},{serial},@{inst_id}' IMMEDIATE")
+        # The next poll must not show the killed session from a sample
+        drop_samples(conn_info.get('id'))
         return {"success": True, "message": f"Session {sid},{serial} on instance {inst_id} killed"}
     except Exception as e:
         print(f"Error killing session: {e}")
@@ -63,6 +79,7 @@ def kill_session(conn_info, sid, serial, inst_id=1):
         if connection:
             connection.close()
 
+@coalesced
 def get_session_sql(conn_info, sql_id, inst_id=None):
     connection = None
     try:
@@ -77,7 +94,7 @@ def get_session_sql(conn_info, sql_id, inst_id=None):
         cursor.execute(query, params)
         row = cursor.fetchone()
         if row:
-            return {"sql_id": sql_id, "sql_text": safe_value(row[0])}
+            return {"sql_id": sql_id, "sql_text": row[0]}
         return {"sql_id": sql_id, "sql_text": "SQL not found in cursor cache"}
     except Exception as e:
         print(f"Error fetching session SQL: {e}")
@@ -86,60 +103,65 @@ def get_session_sql(conn_info, sql_id, inst_id=None):
         if connection:
             connection.close()
 
-def get_blocking_sessions(conn_info, inst_id=None):
-    connection = None
-    try:
-        connection = get_oracle_connection(conn_info)
-        cursor = connection.cursor()
-        
-        from .sql_central_mod import get_sql_content
-        version = conn_info.get('version')
-        sql_text = get_sql_content("blocking_sessions.sql", version, is_internal=True)
-        
-        cursor.execute(sql_text)
-        columns = [col[0].lower() for col in cursor.description]
-        # Use safe_value for blocking sessions too
-        sessions = [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
-        
-        # Build hierarchy
-        session_map = {f"{s['inst_id']}-{s['sid']}": s for s in sessions}
-        results = []
+def build_blocking_tree(sessions, inst_id=None):
+    """Orders blocking_sessions.sql rows as a blocker -> blocked hierarchy with a level per entry."""
+    session_map = {f"{s['inst_id']}-{s['sid']}": s for s in sessions}
+    results = []
+    
+    def add_with_children(sess_key, level, processed_keys):
+        if sess_key in processed_keys: return 
+        processed_keys.add(sess_key)
+        
+        s = session_map[sess_key]
+        entry = s.copy()
+        entry['type'] = 'blocker' if not s['blocking_session'] else 'blocked'
+        entry['level'] = level
+        results.append(entry)
+        
+        for k, other in session_map.items():
+            if other['blocking_instance'] == s['inst_id'] and other['blocking_session'] == s['sid']:
+                add_with_children(k, level + 1, processed_keys)
+
+    processed = set()
+    roots = [f"{s['inst_id']}-{s['sid']}" for s in sessions if not s['blocking_session']]
+    for r in roots:
+        add_with_children(r, 0, processed)
+        
+    for k in session_map:
+        if k not in processed:
+            add_with_children(k, 0, processed)
+
+    if inst_id:
+        return [r for r in results if r['inst_id'] == inst_id or r.get('blocking_instance') == inst_id]
         
-        def add_with_children(sess_key, level, processed_keys):
-            if sess_key in processed_keys: return 
-            processed_keys.add(sess_key)
-            
-            s = session_map[sess_key]
-            entry = s.copy()
-            entry['type'] = 'blocker' if not s['blocking_session'] else 'blocked'
-            entry['level'] = level
-            results.append(entry)
-            
-            for k, other in session_map.items():
-                if other['blocking_instance'] == s['inst_id'] and other['blocking_session'] == s['sid']:
-                    add_with_children(k, level + 1, processed_keys)
-
-        processed = set()
-        roots = [f"{s['inst_id']}-{s['sid']}" for s in sessions if not s['blocking_session']]
-        for r in roots:
-            add_with_children(r, 0, processed)
-            
-        for k in session_map:
-            if k not in processed:
-                add_with_children(k, 0, processed)
+    return results
 
-        if inst_id:
-            return [r for r in results if r['inst_id'] == inst_id or r.get('blocking_instance') == inst_id]
-            
-        return results
+@coalesced
+async def get_blocking_sessions_async(conn_info, inst_id=None, fmt=None):
+    from .oracle_async import get_async_oracle_connection, fetch_dicts_async
+    from .sql_central_mod import get_sql_content
+    generation = sample_generation(conn_info.get('id'))
+    try:
+        sql_text = get_sql_content("blocking_sessions.sql", conn_info.get('version'), is_internal=True)
+        async with get_async_oracle_connection(conn_info) as connection:
+            sessions = await fetch_dicts_async(connection, sql_text)
+        publish_sample(conn_info.get('id'), "blocking", sessions, generation)
+        return to_columnar(build_blocking_tree(sessions, inst_id), fmt)
     except Exception as e:
         print(f"Error fetching blocking sessions: {e}")
         raise e
-    finally:
-        if connection:
-            connection.close()
 
-def get_long_ops(conn_info, inst_id=None, sid='%'):
+def sample_blocking_sessions(conn_info, inst_id=None, fmt=None, max_age=None):
+    """(blocking tree, age_s) built from the latest shared sample of blocking rows, or None."""
+    sample = read_sample(conn_info.get('id'), "blocking", max_age)
+    if sample is None:
+        return None
+    rows, age = sample
+    return to_columnar(build_blocking_tree(rows, inst_id), fmt), age
+
+@coalesced
+def get_long_ops(conn_info, inst_id=None, sid='%', fmt=None):
+    generation = sample_generation(conn_info.get('id'))
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -161,8 +183,10 @@ def get_long_ops(conn_info, inst_id=None, sid='%'):
 
         cursor.execute(sql_text, {"sid": str(sid), "inst_id": inst_val})
         
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        rows = fetch_rows(cursor, fmt)
+        if inst_val == 0 and str(sid) == '%' and fmt not in COLUMNAR_FORMATS:
+            publish_sample(conn_info.get('id'), "long_ops", rows, generation)
+        return rows
     except Exception as e:
         print(f"Error fetching long operations: {e}")
         raise e
@@ -170,6 +194,19 @@ def get_long_ops(conn_info, inst_id=None, sid='%'):
         if connection:
             connection.close()
 
+def sample_long_ops(conn_info, inst_id=None, sid='%', fmt=None, max_age=None):
+    """(long operations, age_s) from the latest shared sample, or None. Only unfiltered SIDs are sampled."""
+    if sid not in (None, '%'):
+        return None
+    sample = read_sample(conn_info.get('id'), "long_ops", max_age)
+    if sample is None:
+        return None
+    rows, age = sample
+    if inst_id:
+        rows = [r for r in rows if r.get('inst_id') == inst_id]
+    return to_columnar(rows, fmt), age
+
+@coalesced
 def get_blocker_details(conn_info, sid, inst_id=1):
     connection = None
     try:
@@ -181,19 +218,16 @@ def get_blocker_details(conn_info, sid, inst_id=1):
         sql_basic = get_sql_content("blocker_details_basic.sql", version, is_internal=True)
         
         cursor.execute(sql_basic, {"sid": sid, "inst_id": inst_id})
-        row = cursor.fetchone()
-        if not row:
+        details = fetch_dict(cursor)
+        if not details:
             return None
         
-        columns = [col[0].lower() for col in cursor.description]
-        details = {k: safe_value(v) for k, v in zip(columns, row)}
-        
         sql_id = details.get('sql_id') or details.get('prev_sql_id')
         if sql_id:
             cursor.execute("SELECT sql_fulltext FROM gv$sql WHERE sql_id = :sql_id AND inst_id = :inst_id AND ROWNUM = 1", 
                            {"sql_id": sql_id, "inst_id": inst_id})
             sql_row = cursor.fetchone()
-            details['sql_text'] = safe_value(sql_row[0]) if sql_row else "SQL text not found"
+            details['sql_text'] = sql_row[0] if sql_row else "SQL text not found"
         else:
             details['sql_text'] = "No active SQL"
 
@@ -208,8 +242,7 @@ def get_blocker_details(conn_info, sid, inst_id=1):
         if sql_id:
             sql_plan = get_sql_content("blocker_details_plan.sql", version, is_internal=True)
             cursor.execute(sql_plan, {"sql_id": sql_id, "inst_id": inst_id})
-            cols_plan = [col[0].lower() for col in cursor.description]
-            details['plan'] = [{k: safe_value(v) for k, v in zip(cols_plan, r)} for r in cursor.fetchall()]
+            details['plan'] = fetch_rows(cursor)
         else:
             details['plan'] = []
 
@@ -219,8 +252,7 @@ def get_blocker_details(conn_info, sid, inst_id=1):
             WHERE l.object_id = o.object_id
             AND l.session_id = :sid AND l.inst_id = :inst_id
         """, {"sid": sid, "inst_id": inst_id})
-        cols_obj = [col[0].lower() for col in cursor.description]
-        details['objects'] = [{k: safe_value(v) for k, v in zip(cols_obj, r)} for r in cursor.fetchall()]
+        details['objects'] = fetch_rows(cursor)
 
         return details
     except Exception as e:
@@ -230,6 +262,7 @@ def get_blocker_details(conn_info, sid, inst_id=1):
         if connection:
             connection.close()
 
+@coalesced
 def get_object_ddl(conn_info, owner, name, obj_type):
     connection = None
     try:
@@ -239,14 +272,15 @@ def get_object_ddl(conn_info, owner, name, obj_type):
         cursor.execute("SELECT dbms_metadata.get_ddl(:obj_type, :name, :owner) FROM dual", 
                        {"obj_type": obj_type, "name": name, "owner": owner})
         row = cursor.fetchone()
-        return safe_value(row[0]) if row else "DDL not found"
+        return row[0] if row else "DDL not found"
     except Exception as e:
         print(f"Error fetching DDL: {e}")
         return f"-- Error fetching DDL: {str(e)}"
     finally:
         if connection:
             connection.close()
-def get_session_cursors(conn_info, sid, inst_id=1):
+@coalesced
+def get_session_cursors(conn_info, sid, inst_id=1, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -260,8 +294,7 @@ def get_session_cursors(conn_info, sid, inst_id=1):
             ORDER BY last_sql_active_time DESC NULLS LAST
         """
         cursor.execute(query, {"sid": sid, "inst_id": inst_id})
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching session cursors: {e}")
         raise e
@@ -269,7 +302,8 @@ def get_session_cursors(conn_info, sid, inst_id=1):
         if connection:
             connection.close()
 
-def get_cursor_plan(conn_info, sql_id, inst_id=1):
+@coalesced
+def get_cursor_plan(conn_info, sql_id, inst_id=1, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -280,8 +314,7 @@ def get_cursor_plan(conn_info, sql_id, inst_id=1):
         sql_plan = get_sql_content("blocker_details_plan.sql", version, is_internal=True)
         
         cursor.execute(sql_plan, {"sql_id": sql_id, "inst_id": inst_id})
-        cols_plan = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(cols_plan, r)} for r in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching cursor plan: {e}")
         raise e
@@ -289,6 +322,7 @@ def get_cursor_plan(conn_info, sql_id, inst_id=1):
         if connection:
             connection.close()
 
+@coalesced
 def get_zombie_count(conn_info, inst_id=None):
     connection = None
     try:
@@ -364,6 +398,7 @@ def simulate_long_op(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_long_ops_stats(conn_info):
     """Gathers statistics for long-running operations based on requested queries."""
     connection = None
@@ -411,6 +446,7 @@ def get_long_ops_stats(conn_info):
     finally:
         if connection:
             connection.close()
+@coalesced
 def get_sql_statistics(conn_info, sql_id, inst_id=1):
     connection = None
     try:
@@ -436,15 +472,14 @@ def get_sql_statistics(conn_info, sql_id, inst_id=1):
             sql_stats_template = get_sql_content(rel_stats_path, version, is_internal=True)
             print(f"DEBUG: Processing stats from {rel_stats_path}")
             cursor.execute(sql_stats_template, {"sql_id": sql_id, "inst_id": inst_id})
-            row = cursor.fetchone()
+            row = fetch_dict(cursor)
             if not row:
                 print(f"Warning: No stats for sql_id={sql_id}. Trying fallback.")
                 fallback_sql = sql_stats_template.replace("rownum = 1", "rownum = 1") 
                 cursor.execute(fallback_sql, {"sql_id": sql_id, "inst_id": inst_id})
-                row = cursor.fetchone()
+                row = fetch_dict(cursor)
             if row:
-                columns = [col[0].lower() for col in cursor.description]
-                stats_data = {k: safe_value(v) for k, v in zip(columns, row)}
+                stats_data = row
         except Exception as e:
             print(f"Error fetching main stats: {e}")
             stats_data = {"error": str(e)}
@@ -493,7 +528,7 @@ def get_sql_statistics(conn_info, sql_id, inst_id=1):
                            {"sql_id": sql_id, "inst_id": inst_id})
             sql_text_row = cursor.fetchone()
             if sql_text_row:
-                sql_text = safe_value(sql_text_row[0])
+                sql_text = sql_text_row[0]
         except Exception as e:
             print(f"Error fetching SQL text: {e}")
 
@@ -545,6 +580,7 @@ def get_sql_statistics(conn_info, sql_id, inst_id=1):
     finally:
         if connection:
             connection.close()
+@coalesced
 def get_detailed_locks(conn_info, sid=None, inst_id=None):
     connection = None
     try:
@@ -575,8 +611,7 @@ def get_detailed_locks(conn_info, sid=None, inst_id=None):
             sql_blocking = get_sql_content("locks_blocking_j.sql", version, variables, is_internal=True)
             sql_blocking = clean_sql(sql_blocking)
             cursor.execute(sql_blocking)
-            cols = [col[0].lower() for col in cursor.description]
-            results['blocking_j'] = [{k: safe_value(v) for k, v in zip(cols, row)} for row in cursor.fetchall()]
+            results['blocking_j'] = fetch_rows(cursor)
         except Exception as e:
             print(f"Error in locks_blocking_j: {e}")
             results['blocking_j'] = []
@@ -586,8 +621,7 @@ def get_detailed_locks(conn_info, sid=None, inst_id=None):
             sql_dml_ddl = get_sql_content("locks_dml_ddl_10g.sql", version, variables, is_internal=True)
             sql_dml_ddl = clean_sql(sql_dml_ddl)
             cursor.execute(sql_dml_ddl)
-            cols = [col[0].lower() for col in cursor.description]
-            results['dml_ddl'] = [{k: safe_value(v) for k, v in zip(cols, row)} for row in cursor.fetchall()]
+            results['dml_ddl'] = fetch_rows(cursor)
         except Exception as e:
             print(f"Error in locks_dml_ddl: {e}")
             results['dml_ddl'] = []
@@ -597,8 +631,7 @@ def get_detailed_locks(conn_info, sid=None, inst_id=None):
             sql_lock_time = get_sql_content("locks_dml_lock_time.sql", version, variables, is_internal=True)
             sql_lock_time = clean_sql(sql_lock_time)
             cursor.execute(sql_lock_time)
-            cols = [col[0].lower() for col in cursor.description]
-            results['lock_time'] = [{k: safe_value(v) for k, v in zip(cols, row)} for row in cursor.fetchall()]
+            results['lock_time'] = fetch_rows(cursor)
         except Exception as e:
             print(f"Error in locks_dml_lock_time: {e}")
             results['lock_time'] = []
@@ -0,0 +1,116 @@
+import asyncio
+import inspect
+import functools
+import threading
+from .metrics_mod import register_gauge
+
+# Request coalescing (single-flight).
+# coalesced(fn) wraps a *_mod read function taking conn_info first. Calls that
+# arrive while an identical one is running, same connection id, function and
+# arguments (defaults applied, so positional and keyword spellings match), wait
+# for that execution and get its result instead of running the query again.
+# Followers share the leader's result object: callers must not mutate it.
+_inflight = {}
+_inflight_lock = threading.Lock()
+_async_inflight = {}
+_stats = {}
+
+def _record(name, coalesced):
+    entry = _stats.get(name)
+    if entry is None:
+        entry = _stats.setdefault(name, {"calls": 0, "executions": 0, "coalesced": 0})
+    entry["calls"] += 1
+    entry["coalesced" if coalesced else "executions"] += 1
+
+def _key(name, signature, args, kwargs):
+    if not args or not isinstance(args[0], dict) or not args[0].get('id'):
+        return None
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError:
+        return None
+    bound.apply_defaults()
+    params = tuple(list(bound.arguments.items())[1:])
+    key = (args[0]['id'], name, params)
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable arguments (e.g. bind dicts): not coalesced
+        return None
+    return key
+
+def _call(key, name, fn, args, kwargs):
+    with _inflight_lock:
+        entry = _inflight.get(key)
+        leader = entry is None
+        if leader:
+            entry = _inflight[key] = {"done": threading.Event(), "result": None, "error": None}
+        _record(name, not leader)
+    if not leader:
+        entry["done"].wait()
+        if entry["error"] is not None:
+            raise entry["error"]
+        return entry["result"]
+    try:
+        entry["result"] = fn(*args, **kwargs)
+        return entry["result"]
+    except BaseException as e:
+        entry["error"] = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        entry["done"].set()
+
+def _forget(key, task):
+    if _async_inflight.get(key) is task:
+        del _async_inflight[key]
+    if not task.cancelled():
+        # Retrieved here so an error nobody awaited anymore is not logged as lost
+        task.exception()
+
+async def _call_async(key, name, fn, args, kwargs):
+    task = _async_inflight.get(key)
+    _record(name, task is not None)
+    if task is None:
+        # A task of its own: a leader whose client disconnects does not cancel it for the followers
+        task = _async_inflight[key] = asyncio.ensure_future(fn(*args, **kwargs))
+        task.add_done_callback(functools.partial(_forget, key))
+    return await asyncio.shield(task)
+
+def coalesced(fn):
+    """Single-flight wrapper for a read function whose first argument is conn_info."""
+    name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+    signature = inspect.signature(fn)
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = _key(name, signature, args, kwargs)
+            if key is None:
+                return await fn(*args, **kwargs)
+            return await _call_async(key, name, fn, args, kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = _key(name, signature, args, kwargs)
+            if key is None:
+                return fn(*args, **kwargs)
+            return _call(key, name, fn, args, kwargs)
+    return wrapper
+
+register_gauge("rockdb_single_flight_in_flight", "Coalesced read calls running now",
+               lambda: len(_inflight) + len(_async_inflight))
+
+def get_coalescing_stats():
+    """Calls, executions and coalesced calls per function, and the calls running now."""
+    functions = {name: dict(entry) for name, entry in sorted(_stats.items())}
+    calls = sum(e["calls"] for e in functions.values())
+    shared = sum(e["coalesced"] for e in functions.values())
+    return {
+        "calls": calls,
+        "coalesced": shared,
+        "coalesced_pct": round(shared / calls * 100, 2) if calls else 0,
+        "in_flight": len(_inflight) + len(_async_inflight),
+        "functions": functions
+    }
@@ -1,6 +1,12 @@
 import os
+import time
+import asyncio
 import sqlite3
-from .utils import get_db_connection, get_oracle_connection, SCRIPTS_DIR, safe_value
+import threading
+from .utils import get_db_connection, get_oracle_connection, query_cursor, SCRIPTS_DIR, shape_rows, GRID_ARRAYSIZE
+from .sql_search_mod import search_scripts, refresh_search_index, update_search_index, scan_sql_files
+from .sql_template_mod import compile_sql_template, render_sql_template, statement_binds, compile_sql_script
+from .tracing_mod import span, note_sql_file
 
 BASE_SQL_DIR = SCRIPTS_DIR
 
@@ -18,6 +24,18 @@ def get_sql_registry():
     finally:
         conn.close()
 
+def get_version_prefix(version=None):
+    """Script folder for an Oracle version string: v11g below 12.1, v12c otherwise."""
+    version_prefix = "v12c"
+    if version:
+        try:
+            v_num = float('.'.join(version.split('.')[:2]))
+            if v_num < 12.1:
+                version_prefix = "v11g"
+        except:
+            pass
+    return version_prefix
+
 def get_versioned_sql_path(rel_path, version=None):
     """
     Resolves the script path based on the Oracle version and organization.
@@ -38,14 +56,7 @@ def get_versioned_sql_path(rel_path, version=None):
             return os.path.join(BASE_SQL_DIR, rel_path)
 
     # Resolve based on version
-    version_prefix = "v12c"
-    if version:
-        try:
-            v_num = float('.'.join(version.split('.')[:2]))
-            if v_num < 12.1:
-                version_prefix = "v11g"
-        except:
-            pass
+    version_prefix = get_version_prefix(version)
 
     # Search candidates in order of priority
     prefixes = ["oracle_internal", "oracle"]
@@ -80,42 +91,99 @@ def parse_sql_variables(content, variables):
     """
     Substitutes variables in the SQL content.
     variables: dict of {key: value}
-    Replaces $key or :key with value (case-insensitive key match).
+    Replaces $key, :key or &key with value (case-insensitive key match).
     """
     if not variables:
         return content
-    
-    import re
-    # Normalize variables to a case-insensitive lookup
-    norm_vars = {k.lower(): v for k, v in variables.items()}
-    
-    def replace_match(match):
-        var_name = match.group(2).lower()
-        if var_name in norm_vars:
-            return str(norm_vars[var_name])
-        return match.group(0) # No match, return original text ($VAR or :VAR)
+    return render_sql_template(compile_sql_template(content), variables)
 
-    # Regex: $, : or & followed by word characters (A-Z, 0-9, _)
-    # We use a negative lookbehind (?<!\w) to ensure we don't match $ in internal views like gv$sql
-    return re.sub(r'(?<!\w)([$:&])(\w+)', replace_match, content)
+# --- Template registry ---
+# Each (rel_path, version prefix) is resolved and read once. Cached entries are
+# re-validated against the file's mtime/size at most every SQL_TEMPLATE_RECHECK_SECONDS.
+# When SQL Central saves, creates or deletes a script, or a sync finds files added,
+# changed or removed, the entries those files can resolve to are dropped (a new
+# file can change how other paths resolve).
+TEMPLATE_RECHECK_SECONDS = float(os.getenv("SQL_TEMPLATE_RECHECK_SECONDS", "5"))
 
-def get_sql_content(rel_path, version=None, variables=None, is_internal=False):
-    # Security check: Prevent SQL Central from reading oracle_internal scripts
-    if not is_internal and ("oracle_internal/" in rel_path or "oracle_internal" in rel_path.split(os.sep)):
-        raise PermissionError(f"Access denied to internal script: {rel_path}")
+_templates = {}
+_templates_lock = threading.Lock()
+_template_stats = {"hits": 0, "misses": 0, "reloads": 0, "invalidations": 0}
+
+def _count(stat):
+    with _templates_lock:
+        _template_stats[stat] += 1
+
+def load_sql_template(rel_path, version=None):
+    """Registry entry {path, mtime_ns, size, content[, template]} for a script, loading it on first use or after a change."""
+    key = (rel_path, get_version_prefix(version))
+    now = time.monotonic()
+    entry = _templates.get(key)
+    if entry:
+        if now - entry["checked_at"] < TEMPLATE_RECHECK_SECONDS:
+            _count("hits")
+            return entry
+        try:
+            st = os.stat(entry["path"])
+        except OSError:
+            st = None
+        if st and st.st_mtime_ns == entry["mtime_ns"] and st.st_size == entry["size"]:
+            entry["checked_at"] = now
+            _count("hits")
+            return entry
+        _count("reloads")
+    else:
+        _count("misses")
 
     full_path = get_versioned_sql_path(rel_path, version)
-    print(f"DEBUG: SQL Central loading script from: {full_path}")
-    if not os.path.exists(full_path):
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        _templates.pop(key, None)
         raise FileNotFoundError(f"Script not found: {rel_path}")
-    
     with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
         content = f.read()
-    
-    if variables:
-        content = parse_sql_variables(content, variables)
-        
-    return content
+
+    entry = {"path": full_path, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "content": content, "checked_at": now}
+    _templates[key] = entry
+    return entry
+
+def invalidate_sql_templates(rel_paths=None):
+    """
+    Drops cached scripts; the next get_sql_content resolves and reads from disk again.
+    With rel_paths (files under sql/) only entries with the same file name are dropped:
+    every path a script resolves to (version folder, common, rman) keeps its name.
+    """
+    with _templates_lock:
+        if rel_paths is None:
+            _templates.clear()
+        else:
+            names = {os.path.basename(p) for p in rel_paths}
+            for key in [k for k in _templates if os.path.basename(k[0]) in names]:
+                del _templates[key]
+        _template_stats["invalidations"] += 1
+
+def get_sql_template_stats():
+    with _templates_lock:
+        return {**_template_stats, "cached": len(_templates)}
+
+def get_sql_content(rel_path, version=None, variables=None, is_internal=False):
+    # Security check: Prevent SQL Central from reading oracle_internal scripts
+    if not is_internal and ("oracle_internal/" in rel_path or "oracle_internal" in rel_path.split(os.sep)):
+        raise PermissionError(f"Access denied to internal script: {rel_path}")
+
+    with span("sql.template", {"rockdb.sql_file": rel_path, "rockdb.version": version}) as template_span:
+        entry = load_sql_template(rel_path, version)
+        if not variables:
+            sql_text = entry["content"]
+        else:
+            # Compiled once per loaded file; a reload replaces the entry and its template
+            template = entry.get("template")
+            if template is None:
+                template = entry["template"] = compile_sql_template(entry["content"])
+            sql_text = render_sql_template(template, variables)
+        template_span.set_attribute("rockdb.sql_bytes", len(sql_text))
+    # Lets the execute span of this text name its file
+    return note_sql_file(sql_text, rel_path)
 
 def save_sql_content(rel_path, content, is_internal=False):
     if ".." in rel_path or rel_path.startswith("/"):
@@ -132,6 +200,15 @@ def save_sql_content(rel_path, content, is_internal=False):
     
     with open(full_path, 'w', encoding='utf-8') as f:
         f.write(content)
+    invalidate_sql_templates([rel_path])
+    if update_search_index(rel_path):
+        # Saved as a new file: registered like the sync registers new files
+        conn = get_db_connection()
+        try:
+            _register_scripts(conn.cursor(), [rel_path])
+            conn.commit()
+        finally:
+            conn.close()
     return True
 
 def create_sql_script(folder, name, label, codmenutype, content=None, is_internal=False):
@@ -174,6 +251,8 @@ def create_sql_script(folder, name, label, codmenutype, content=None, is_interna
             f.write(content)
         else:
             f.write("-- New Script\nSELECT 'Hello' FROM dual;")
+    invalidate_sql_templates([rel_path])
+    update_search_index(rel_path)
 
     # Register in SQLite
     conn = get_db_connection()
@@ -202,6 +281,9 @@ def delete_sql_script(rel_path, is_internal=False):
     # 1. Remove from Disk
     if os.path.exists(full_path):
         os.remove(full_path)
+    invalidate_sql_templates([rel_path])
+    # Also drops its sql_manifest entry
+    update_search_index(rel_path)
     
     # 2. Remove from SQLite
     conn = get_db_connection()
@@ -256,62 +338,41 @@ def execute_external_tool(conn_info, tool_name, rel_path):
     except Exception as e:
         return {"error": str(e)}
 
-def execute_generic_sql(conn_info, sql_text, auto_commit=False, bind_vars=None):
+def _prepare_statement(template, bind_vars):
+    """Statement text with $VAR substituted, and the bind dict of its real :name binds."""
+    stmt = template["text"]
+    if bind_vars:
+        # Support $VAR string substitution for legacy scripts/compatibility
+        stmt = render_sql_template(template, bind_vars, sigils="$")
+    return stmt, statement_binds(template, bind_vars)
+
+# Ad-hoc SQL runs on a connection of its own by default: ALTER SESSION, package
+# state or an open transaction must not be handed on with a pooled session to the
+# next request. Callers running scripts of the application itself pass pooled=True.
+def execute_generic_sql(conn_info, sql_text, auto_commit=False, bind_vars=None, fmt=None, pooled=False):
     connection = None
     try:
-        connection = get_oracle_connection(conn_info)
-        cursor = connection.cursor()
-        
-        # 1. Clean up SQL*Plus artifacts (SET, COL, COLUMN, etc)
-        # 2. Support / as terminator alongside ;
-        lines = sql_text.splitlines()
-        clean_lines = []
-        for line in lines:
-            trimmed = line.strip()
-            # Skip SQL*Plus commands
-            if trimmed.upper().startswith(('SET ', 'COL ', 'COLUMN ', 'PROMPT ', 'SHOW ')):
-                continue
-            if trimmed == '/':
-                clean_lines.append(';') # Replace lone / with ; for splitting
-            else:
-                clean_lines.append(line)
-        
-        cleaned_sql = "\n".join(clean_lines)
-        
-        # Split script into separate statements
-        statements = [s.strip() for s in cleaned_sql.split(';') if s.strip()]
+        connection = get_oracle_connection(conn_info, pooled=pooled)
+        cursor = query_cursor(connection, arraysize=GRID_ARRAYSIZE)
         
         results = []
-        for stmt in statements:
-            # Final cleanup: remove trailing / if present within a statement
-            if stmt.endswith('/'):
-                stmt = stmt[:-1].strip()
-            
+        # Parsed once per distinct script text: statements with their slots and true :bind names
+        for template in compile_sql_script(sql_text):
+            stmt = template["text"]
             try:
+                stmt, stmt_binds = _prepare_statement(template, bind_vars)
                 print(f"DEBUG: Executing statement: {stmt}")
-                if bind_vars:
-                    # Support $VAR string substitution for legacy scripts/compatibility
-                    for k, v in bind_vars.items():
-                        # Handle cases where value might be string that needs quotes if not already there
-                        # but parse_sql_variables usually handles this or the SQL does
-                        stmt = stmt.replace(f"${k}", str(v))
-                    
-                    # Filter bind vars that actually exist in the statement
-                    # Oracle oracledb uses :name syntax
-                    stmt_binds = {k: v for k, v in bind_vars.items() if f":{k}" in stmt}
-                    if stmt_binds:
-                        print(f"DEBUG: Using binds: {stmt_binds}")
-                        cursor.execute(stmt, stmt_binds)
-                    else:
-                        cursor.execute(stmt)
+                if stmt_binds:
+                    print(f"DEBUG: Using binds: {stmt_binds}")
+                    cursor.execute(stmt, stmt_binds)
                 else:
                     cursor.execute(stmt)
-                    
+
                 if cursor.description:
                     columns = [col[0].lower() for col in cursor.description]
-                    rows = [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
-                    print(f"DEBUG: Statement returned {len(rows)} rows.")
-                    results.append({"type": "grid", "data": rows, "sql": stmt})
+                    fetched = cursor.fetchall()
+                    print(f"DEBUG: Statement returned {len(fetched)} rows.")
+                    results.append({"type": "grid", "data": shape_rows(columns, fetched, fmt), "sql": stmt})
                 else:
                     print("DEBUG: Statement executed successfully (no result set).")
                     results.append({"type": "message", "text": "Statement executed successfully", "sql": stmt})
@@ -330,97 +391,210 @@ def execute_generic_sql(conn_info, sql_text, auto_commit=False, bind_vars=None):
         if connection:
             connection.close()
 
+# --- Streaming execution ---
+# Rows are fetched STREAM_ARRAYSIZE at a time and handed out as they arrive, so
+# memory stays bounded whatever the result size; each statement stops after
+# max_rows (capped by SQL_STREAM_MAX_ROWS).
+STREAM_ARRAYSIZE = int(os.getenv("SQL_STREAM_ARRAYSIZE", "1000"))
+STREAM_MAX_ROWS = int(os.getenv("SQL_STREAM_MAX_ROWS", "100000"))
+STREAM_FORMATS = ("ndjson", "columnar")
+
+def stream_generic_sql(conn_info, sql_text, auto_commit=False, bind_vars=None, fmt="ndjson", max_rows=None,
+                       cancel_event=None, state=None, pooled=False):
+    """
+    Generator of frame lists for a script, one list per fetched batch.
+    Frames: columns, then rows (ndjson: one {"type": "row", "data": {...}} per row;
+    columnar: one {"type": "rows", "rows": [[...]]} per batch), end (with the row count
+    and a truncated flag), message for statements without a result set, error, done.
+    cancel_event stops the stream between batches; state["connection"] exposes the
+    Oracle connection so a caller can cancel an in-flight round-trip.
+    Closing the generator closes the cursor and the connection (see execute_generic_sql for pooled).
+    """
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported stream format: {fmt}")
+    limit = min(max_rows or STREAM_MAX_ROWS, STREAM_MAX_ROWS)
+    cancelled = lambda: cancel_event is not None and cancel_event.is_set()
+
+    connection = None
+    cursor = None
+    try:
+        connection = get_oracle_connection(conn_info, pooled=pooled)
+        if state is not None:
+            state["connection"] = connection
+        cursor = query_cursor(connection, arraysize=STREAM_ARRAYSIZE)
+
+        for index, template in enumerate(compile_sql_script(sql_text)):
+            if cancelled():
+                return
+            stmt, stmt_binds = _prepare_statement(template, bind_vars)
+            try:
+                if stmt_binds:
+                    cursor.execute(stmt, stmt_binds)
+                else:
+                    cursor.execute(stmt)
+
+                if not cursor.description:
+                    yield [{"type": "message", "statement": index, "sql": stmt,
+                            "text": "Statement executed successfully", "rowcount": cursor.rowcount}]
+                    continue
+
+                columns = [col[0].lower() for col in cursor.description]
+                yield [{"type": "columns", "statement": index, "sql": stmt, "columns": columns}]
+                sent = 0
+                truncated = False
+                while True:
+                    if cancelled():
+                        return
+                    rows = cursor.fetchmany(min(STREAM_ARRAYSIZE, limit - sent))
+                    if not rows:
+                        break
+                    sent += len(rows)
+                    if fmt == "columnar":
+                        yield [{"type": "rows", "statement": index, "rows": rows}]
+                    else:
+                        yield [{"type": "row", "statement": index, "data": dict(zip(columns, row))} for row in rows]
+                    if sent >= limit:
+                        truncated = cursor.fetchone() is not None
+                        break
+                yield [{"type": "end", "statement": index, "rows": sent, "truncated": truncated}]
+            except Exception as stmt_err:
+                if cancelled():
+                    return
+                yield [{"type": "error", "statement": index, "sql": stmt, "message": str(stmt_err)}]
+
+        if auto_commit:
+            connection.commit()
+        yield [{"type": "done"}]
+    finally:
+        try:
+            if state is not None:
+                state.pop("connection", None)
+            if cursor:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+        finally:
+            if connection:
+                connection.close()
+
+# Mapping folder names to codmenutype IDs
+SCRIPT_TYPE_MAPPING = {
+    'table': 1,
+    'pie': 2,
+    'line': 3,
+    'gauge': 4,
+    'plsql': 5,
+    'textplain': 7,
+    'tools': 8
+}
+
+_seed_lock = threading.Lock()
+_seed_status = {"running": False, "last_run": None, "duration_ms": None, "scanned": 0,
+                "added": 0, "changed": 0, "removed": 0, "error": None}
+
+def _menu_entry(rel_path):
+    """cfgmenu row for a script file: type from its folders, label from its name."""
+    parts = rel_path.split(os.sep)
+    # Expected: oracle/<type>/... or <type>/...
+    ctype = 1 # Default to Table
+    for part in parts:
+        if part in SCRIPT_TYPE_MAPPING:
+            ctype = SCRIPT_TYPE_MAPPING[part]
+            break
+
+    name = parts[-1].replace('.sql', '')
+    label = name.replace('_', ' ').title()
+    return (
+        name,
+        label,
+        rel_path,
+        'file', # Generic icon
+        ctype,
+        'file-text', # codmenutype_icon_url
+        'Y' # active
+    )
+
+def _register_scripts(cursor, rel_paths):
+    cursor.executemany("""
+        INSERT OR IGNORE INTO cfgmenu (name, link_label, link_url, icon_url, codmenutype, codmenutype_icon_url, active)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [_menu_entry(rel_path) for rel_path in rel_paths])
+
 def seed_sql_scripts():
-    """Scans the sql/ directory and populates cfgmenu with new scripts."""
+    """
+    Scans the sql/ directory and populates cfgmenu with new scripts.
+    The sql_manifest table records (path, mtime, size) of every seen file, so only
+    new files are registered, and only changed files are re-indexed for search and
+    dropped from the template registry.
+    """
+    with _seed_lock:
+        _seed_status["running"] = True
+        start = time.perf_counter()
+        try:
+            _sync_sql_scripts()
+            _seed_status["error"] = None
+        except Exception as e:
+            _seed_status["error"] = str(e)
+            raise
+        finally:
+            _seed_status["running"] = False
+            _seed_status["last_run"] = time.time()
+            _seed_status["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+def _sync_sql_scripts():
+    print(f"Seeding/Syncing SQL scripts from directory: {BASE_SQL_DIR}", flush=True)
+    if not os.path.exists(BASE_SQL_DIR):
+        print(f"WARNING: Scripts directory not found: {BASE_SQL_DIR}", flush=True)
+        return
+
+    files = list(scan_sql_files())
+    # One pass over sql_manifest finds the changes and brings the full-text index up to date
+    added, changed, removed = refresh_search_index(files)
+
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        
-        # Mapping folder names to codmenutype IDs
-        type_mapping = {
-            'table': 1,
-            'pie': 2,
-            'line': 3,
-            'gauge': 4,
-            'plsql': 5,
-            'textplain': 7,
-            'tools': 8
-        }
-        
-        print(f"Seeding/Syncing SQL scripts from directory: {BASE_SQL_DIR}", flush=True)
-        if not os.path.exists(BASE_SQL_DIR):
-            print(f"WARNING: Scripts directory not found: {BASE_SQL_DIR}", flush=True)
-            return
-
-        scripts_to_insert = []
-        
-        for root, dirs, files in os.walk(BASE_SQL_DIR):
-            # Skip internal scripts and hidden directories
-            if "oracle_internal" in root or "__pycache__" in root:
-                continue
-            
-            for file in files:
-                if file.endswith('.sql'):
-                    rel_path = os.path.relpath(os.path.join(root, file), BASE_SQL_DIR)
-                    
-                    # Determine type from path
-                    parts = rel_path.split(os.sep)
-                    # Expected: oracle/<type>/... or <type>/...
-                    ctype = 1 # Default to Table
-                    for part in parts:
-                        if part in type_mapping:
-                            ctype = type_mapping[part]
-                            break
-                    
-                    name = file.replace('.sql', '')
-                    label = name.replace('_', ' ').title()
-                    
-                    scripts_to_insert.append((
-                        name,
-                        label,
-                        rel_path,
-                        'file', # Generic icon
-                        ctype,
-                        'file-text', # codmenutype_icon_url
-                        'Y' # active
-                    ))
-        
         # Cleanup and Sync
         cursor.execute("DELETE FROM cfgmenu WHERE link_url LIKE 'oracle_internal/%'")
-        
-        if scripts_to_insert:
-            print(f"Syncing {len(scripts_to_insert)} scripts to cfgmenu...", flush=True)
-            cursor.executemany("""
-                INSERT OR IGNORE INTO cfgmenu (name, link_label, link_url, icon_url, codmenutype, codmenutype_icon_url, active)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, scripts_to_insert)
-        
-        # Always ensure example tools are registered (including non-.sql extensions)
+        if added:
+            print(f"Syncing {len(added)} new scripts to cfgmenu...", flush=True)
+            _register_scripts(cursor, added)
         conn.commit()
     finally:
         conn.close()
-def search_sql_content(query):
-    """Scans all .sql files in BASE_SQL_DIR for the given query string."""
-    matches = []
-    if not query:
-        return matches
-        
-    query_lower = query.lower()
-    
-    for root, dirs, files in os.walk(BASE_SQL_DIR):
-        if "oracle_internal" in root:
-            continue
-            
-        for file in files:
-            if file.endswith('.sql'):
-                rel_path = os.path.relpath(os.path.join(root, file), BASE_SQL_DIR)
-                try:
-                    full_path = os.path.join(BASE_SQL_DIR, rel_path)
-                    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        if query_lower in content.lower():
-                            matches.append(rel_path)
-                except Exception as e:
-                    print(f"Error searching in {rel_path}: {e}")
-                    
-    return matches
+
+    if added or changed or removed:
+        # Files were added, edited or deleted outside SQL Central
+        invalidate_sql_templates(added + changed + removed)
+
+    _seed_status.update({
+        "scanned": len(files),
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed)
+    })
+
+def get_seed_status():
+    return dict(_seed_status)
+
+# --- Script watcher ---
+# Optional (SQL_WATCH=1): re-runs the incremental sync every SQL_WATCH_INTERVAL
+# seconds so scripts dropped into sql/ show up without a restart.
+WATCH_ENABLED = os.getenv("SQL_WATCH", "0").lower() in ("1", "true", "yes")
+WATCH_INTERVAL = float(os.getenv("SQL_WATCH_INTERVAL", "30"))
+
+async def sql_scripts_watcher():
+    print(f"SQL script watcher started (every {WATCH_INTERVAL}s)", flush=True)
+    while True:
+        try:
+            await asyncio.sleep(WATCH_INTERVAL)
+            await asyncio.get_running_loop().run_in_executor(None, seed_sql_scripts)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            print(f"SQL script watcher error: {e}", flush=True)
+
+def search_sql_content(query, regex=False, limit=None, detailed=False):
+    """Searches the script library through the full-text index (see sql_search_mod)."""
+    return search_scripts(query, regex=regex, limit=limit, detailed=detailed)
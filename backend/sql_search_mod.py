@@ -0,0 +1,264 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+import contextlib
+from .utils import get_db_connection, SCRIPTS_DIR
+
+# Full-text index of the SQL script library in rockdb.sqlite.
+# sql_search_fts is an FTS5 table with the trigram tokenizer, so any substring of
+# three characters or more is an indexed, case-insensitive match ranked by bm25.
+# sql_manifest (created by init_db) is the one manifest of the library: path,
+# mtime, size and the FTS rowid of every file. A refresh walks the tree once and
+# tells SQL Central which files were added, changed or removed while re-indexing
+# only those. Without FTS5 support in the SQLite library, the manifest is still
+# kept and search falls back to scanning the files.
+BASE_SQL_DIR = SCRIPTS_DIR
+# A search finding the index older than this refreshes it in the background
+REFRESH_SECONDS = float(os.getenv("SQL_SEARCH_REFRESH_SECONDS", "60"))
+# Rows read at a time by regular expression searches
+REGEX_BATCH_ROWS = 200
+# Trigram tokens are characters: the snippet window is ~48 characters around the match
+SNIPPET_TOKENS = 48
+MARK_START, MARK_END = "<mark>", "</mark>"
+
+_index_lock = threading.Lock()
+_index_state = {"available": None, "refreshed_at": None, "refreshing": False}
+
+def _ensure_schema(conn):
+    if _index_state["available"] is None:
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS sql_search_fts "
+                "USING fts5(rel_path UNINDEXED, content, tokenize='trigram')"
+            )
+            conn.commit()
+            _index_state["available"] = True
+        except sqlite3.OperationalError as e:
+            print(f"SQL search index unavailable (no FTS5 trigram support), searching files directly: {e}", flush=True)
+            _index_state["available"] = False
+    return _index_state["available"]
+
+def scan_sql_files():
+    """(rel_path, full_path, stat) of every library .sql file (internal scripts excluded)."""
+    for root, dirs, files in os.walk(BASE_SQL_DIR):
+        if "oracle_internal" in root or "__pycache__" in root:
+            continue
+        for file in files:
+            if file.endswith('.sql'):
+                full_path = os.path.join(root, file)
+                try:
+                    st = os.stat(full_path)
+                except OSError:
+                    continue
+                yield os.path.relpath(full_path, BASE_SQL_DIR), full_path, st
+
+def _index_file(conn, rel_path, full_path, st, old_rowid):
+    """Records a file in the manifest, (re)indexing its content when the index is available."""
+    rowid = None
+    if _index_state["available"]:
+        with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        if old_rowid is not None:
+            conn.execute("DELETE FROM sql_search_fts WHERE rowid = ?", (old_rowid,))
+        rowid = conn.execute(
+            "INSERT INTO sql_search_fts (rel_path, content) VALUES (?, ?)", (rel_path, content)
+        ).lastrowid
+    conn.execute(
+        "INSERT OR REPLACE INTO sql_manifest (rel_path, mtime_ns, size, fts_rowid) VALUES (?, ?, ?, ?)",
+        (rel_path, st.st_mtime_ns, st.st_size, rowid)
+    )
+
+def _remove_file(conn, rel_path, rowid):
+    if rowid is not None and _index_state["available"]:
+        conn.execute("DELETE FROM sql_search_fts WHERE rowid = ?", (rowid,))
+    conn.execute("DELETE FROM sql_manifest WHERE rel_path = ?", (rel_path,))
+
+def refresh_search_index(files=None):
+    """
+    Brings sql_manifest and the index up to date: new and modified scripts (by
+    mtime/size) are recorded and re-indexed, deleted ones dropped. files is an
+    already scanned scan_sql_files() list, to avoid walking the tree twice.
+    Returns (added, changed, removed) lists of rel_paths.
+    """
+    with _index_lock:
+        conn = get_db_connection()
+        try:
+            indexing = _ensure_schema(conn)
+            known = {
+                row['rel_path']: (row['mtime_ns'], row['size'], row['fts_rowid'])
+                for row in conn.execute("SELECT rel_path, mtime_ns, size, fts_rowid FROM sql_manifest")
+            }
+            seen = set()
+            added, changed = [], []
+            for rel_path, full_path, st in (files if files is not None else scan_sql_files()):
+                seen.add(rel_path)
+                entry = known.get(rel_path)
+                modified = entry is None or entry[:2] != (st.st_mtime_ns, st.st_size)
+                # Unchanged files are re-read only when they were never indexed
+                if not modified and not (indexing and entry[2] is None):
+                    continue
+                try:
+                    _index_file(conn, rel_path, full_path, st, entry[2] if entry else None)
+                except OSError as e:
+                    print(f"Error indexing {rel_path}: {e}")
+                    continue
+                if entry is None:
+                    added.append(rel_path)
+                elif modified:
+                    changed.append(rel_path)
+            removed = [rel_path for rel_path in known if rel_path not in seen]
+            for rel_path in removed:
+                _remove_file(conn, rel_path, known[rel_path][2])
+            conn.commit()
+            _index_state["refreshed_at"] = time.monotonic()
+            if added or changed or removed:
+                print(f"SQL script manifest: {len(added)} added, {len(changed)} changed, {len(removed)} removed",
+                      flush=True)
+            return added, changed, removed
+        finally:
+            conn.close()
+
+def update_search_index(rel_path):
+    """
+    Records (or removes) a single script after SQL Central saved, created or deleted it.
+    Returns True when the script was not in the manifest before.
+    """
+    with _index_lock:
+        conn = get_db_connection()
+        try:
+            _ensure_schema(conn)
+            row = conn.execute("SELECT fts_rowid FROM sql_manifest WHERE rel_path = ?", (rel_path,)).fetchone()
+            old_rowid = row['fts_rowid'] if row else None
+            full_path = os.path.join(BASE_SQL_DIR, rel_path)
+            if os.path.isfile(full_path) and "oracle_internal" not in rel_path:
+                _index_file(conn, rel_path, full_path, os.stat(full_path), old_rowid)
+            elif row:
+                _remove_file(conn, rel_path, old_rowid)
+            conn.commit()
+            return row is None
+        finally:
+            conn.close()
+
+def _refresh_in_background():
+    if _index_state["refreshing"]:
+        return
+    _index_state["refreshing"] = True
+
+    def run():
+        try:
+            refresh_search_index()
+        except Exception as e:
+            print(f"SQL search index refresh failed: {e}", flush=True)
+        finally:
+            _index_state["refreshing"] = False
+    threading.Thread(target=run, name="sql-search-refresh", daemon=True).start()
+
+def _phrase(query):
+    # One FTS5 phrase: with the trigram tokenizer this is a substring match
+    return '"' + query.replace('"', '""') + '"'
+
+def _results(rows, detailed):
+    if detailed:
+        return [{"rel_path": r[0], "score": r[1], "snippet": r[2]} for r in rows]
+    return [r[0] for r in rows]
+
+def _regex_snippet(content, match):
+    start = max(match.start() - 60, 0)
+    end = min(match.end() + 60, len(content))
+    return (("…" if start else "") + content[start:match.start()] + MARK_START + match.group(0) + MARK_END
+            + content[match.end():end] + ("…" if end < len(content) else ""))
+
+def _scan_search(query, limit=None, detailed=False):
+    """Searches the files themselves (no FTS5 available)."""
+    query_lower = query.lower()
+    rows = []
+    for rel_path, full_path, _ in scan_sql_files():
+        try:
+            with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+                if query_lower in f.read().lower():
+                    rows.append((rel_path, 0.0, None))
+        except Exception as e:
+            print(f"Error searching in {rel_path}: {e}")
+        if limit and len(rows) >= limit:
+            break
+    return _results(rows, detailed)
+
+def _regex_search(pattern, limit=None, detailed=False):
+    try:
+        regex = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression: {e}")
+
+    rows = []
+    with contextlib.closing(_documents()) as documents:
+        for rel_path, content in documents:
+            match = regex.search(content)
+            if match:
+                rows.append((rel_path, 0.0, _regex_snippet(content, match)))
+                if limit and len(rows) >= limit:
+                    break
+    rows.sort(key=lambda r: r[0])
+    return _results(rows, detailed)
+
+def _documents():
+    """(rel_path, content) of every script, read REGEX_BATCH_ROWS at a time (never the whole library at once)."""
+    if _index_state["available"] and _index_state["refreshed_at"] is not None:
+        conn = get_db_connection()
+        try:
+            cursor = conn.execute("SELECT rel_path, content FROM sql_search_fts")
+            while True:
+                batch = cursor.fetchmany(REGEX_BATCH_ROWS)
+                if not batch:
+                    return
+                for d in batch:
+                    yield d['rel_path'], d['content']
+        finally:
+            conn.close()
+    for rel_path, full_path, _ in scan_sql_files():
+        try:
+            with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+                yield rel_path, f.read()
+        except OSError as e:
+            print(f"Error searching in {rel_path}: {e}")
+
+def search_scripts(query, regex=False, limit=None, detailed=False):
+    """
+    Scripts whose content matches query (case-insensitive substring), best matches first.
+    regex=True treats query as a regular expression. detailed=True returns
+    [{rel_path, score, snippet}] with the match highlighted by <mark> tags.
+    """
+    if not query:
+        return []
+    # The sync (startup, SQL_WATCH) keeps the index current; between syncs a stale
+    # index is refreshed in the background while this search uses it as it is
+    refreshed_at = _index_state["refreshed_at"]
+    if refreshed_at is None or time.monotonic() - refreshed_at >= REFRESH_SECONDS:
+        _refresh_in_background()
+    if regex:
+        return _regex_search(query, limit, detailed)
+    if not _index_state["available"] or refreshed_at is None:
+        # Not built yet in this process: the files themselves are current
+        return _scan_search(query, limit, detailed)
+
+    if len(query) >= 3:
+        sql = (
+            "SELECT rel_path, bm25(sql_search_fts) AS score, "
+            f"snippet(sql_search_fts, 1, '{MARK_START}', '{MARK_END}', '…', {SNIPPET_TOKENS}) AS snippet "
+            "FROM sql_search_fts WHERE sql_search_fts MATCH ? ORDER BY rank"
+        )
+        params = [_phrase(query)]
+    else:
+        # Trigrams need three characters: plain substring test on the stored content
+        sql = "SELECT rel_path, 0.0 AS score, NULL AS snippet FROM sql_search_fts WHERE instr(lower(content), ?) > 0 ORDER BY rel_path"
+        params = [query.lower()]
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+
+    conn = get_db_connection()
+    try:
+        rows = [tuple(r) for r in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+    return _results(rows, detailed)
@@ -0,0 +1,127 @@
+import re
+import threading
+from collections import OrderedDict
+
+# Precompiled SQL templates.
+# A script is scanned once into literal segments and placeholder slots ($name,
+# :name, &name); rendering is a join over the parts. Slots are found anywhere in
+# the text, like the original substitution, but only ':name' slots outside string
+# literals, quoted identifiers and comments count as real Oracle bind variables.
+
+# $, : or & followed by word characters; the negative lookbehind keeps $ in
+# internal views like gv$sql from being treated as a variable
+SLOT_RE = re.compile(r'(?<!\w)([$:&])(\w+)')
+
+# Text where a ':name' is not a bind: comments, q-quoted and plain string
+# literals, double-quoted identifiers
+PROTECTED_RE = re.compile(
+    r"--[^\n]*"
+    r"|/\*.*?\*/"
+    r"|(?<!\w)[nN]?[qQ]'(?:\[.*?\]|\{.*?\}|\(.*?\)|<.*?>|([^\s\[{(<]).*?\1)'"
+    r"|'(?:[^']|'')*'"
+    r'|"[^"]*"',
+    re.S
+)
+
+# SQL*Plus commands dropped before executing a script
+SQLPLUS_PREFIXES = ('SET ', 'COL ', 'COLUMN ', 'PROMPT ', 'SHOW ')
+
+SCRIPT_CACHE_SIZE = 128
+
+_scripts = OrderedDict()
+_scripts_lock = threading.Lock()
+
+def compile_sql_template(content):
+    """
+    Splits content into parts: literal strings and (sigil, name) slots.
+    Returns {"text", "parts", "slots", "binds"}; slots and binds hold lower-case names,
+    binds only the ':name' slots that Oracle will see as bind variables.
+    """
+    protected = [m.span() for m in PROTECTED_RE.finditer(content)]
+    parts = []
+    slots = set()
+    binds = set()
+    position = 0
+    region = 0
+    for match in SLOT_RE.finditer(content):
+        start = match.start()
+        if start > position:
+            parts.append(content[position:start])
+        sigil, name = match.group(1), match.group(2)
+        parts.append((sigil, name))
+        slots.add(name.lower())
+        if sigil == ':':
+            while region < len(protected) and protected[region][1] <= start:
+                region += 1
+            if region == len(protected) or protected[region][0] > start:
+                binds.add(name.lower())
+        position = match.end()
+    if position < len(content):
+        parts.append(content[position:])
+    return {"text": content, "parts": parts, "slots": slots, "binds": binds}
+
+def render_sql_template(template, variables, sigils="$:&"):
+    """Substitutes the slots whose sigil is in sigils and whose name (case-insensitive) is in variables."""
+    if not variables:
+        return template["text"]
+    values = {k.lower(): v for k, v in variables.items()}
+    if not template["slots"].intersection(values):
+        return template["text"]
+    out = []
+    for part in template["parts"]:
+        if isinstance(part, str):
+            out.append(part)
+            continue
+        sigil, name = part
+        key = name.lower()
+        if sigil in sigils and key in values:
+            out.append(str(values[key]))
+        else:
+            out.append(sigil + name)
+    return "".join(out)
+
+def statement_binds(template, bind_vars):
+    """Entries of bind_vars that are real bind variables of the statement."""
+    if not bind_vars:
+        return {}
+    return {k: v for k, v in bind_vars.items() if k.lower() in template["binds"]}
+
+def _split_statements(sql_text):
+    # 1. Clean up SQL*Plus artifacts (SET, COL, COLUMN, etc)
+    # 2. Support / as terminator alongside ;
+    clean_lines = []
+    for line in sql_text.splitlines():
+        trimmed = line.strip()
+        if trimmed.upper().startswith(SQLPLUS_PREFIXES):
+            continue
+        if trimmed == '/':
+            clean_lines.append(';')  # Replace lone / with ; for splitting
+        else:
+            clean_lines.append(line)
+
+    statements = []
+    for stmt in "\n".join(clean_lines).split(';'):
+        stmt = stmt.strip()
+        if not stmt:
+            continue
+        # Remove trailing / if present within a statement
+        if stmt.endswith('/'):
+            stmt = stmt[:-1].strip()
+        statements.append(stmt)
+    return statements
+
+def compile_sql_script(sql_text):
+    """Statement templates of a script, compiled once per distinct text (LRU of SCRIPT_CACHE_SIZE)."""
+    with _scripts_lock:
+        compiled = _scripts.get(sql_text)
+        if compiled is not None:
+            _scripts.move_to_end(sql_text)
+            return compiled
+
+    compiled = [compile_sql_template(stmt) for stmt in _split_statements(sql_text)]
+
+    with _scripts_lock:
+        _scripts[sql_text] = compiled
+        while len(_scripts) > SCRIPT_CACHE_SIZE:
+            _scripts.popitem(last=False)
+    return compiled
@@ -1,5 +1,7 @@
 import oracledb
-from .utils import get_oracle_connection, safe_value, ORACLE_SYSTEM_SCHEMAS, get_excluded_schemas
+from .utils import get_oracle_connection, fetch_rows, ORACLE_SYSTEM_SCHEMAS, get_excluded_schemas
+from .single_flight_mod import coalesced
+from .catalog_cache_mod import invalidates_catalog
 
 def has_column(cursor, table_name, column_name):
     try:
@@ -8,6 +10,7 @@ def has_column(cursor, table_name, column_name):
     except:
         return False
 
+@coalesced
 def get_stale_stats(conn_info, owner=None, table_name=None, exclude_system=False):
     connection = None
     try:
@@ -50,8 +53,7 @@ def get_stale_stats(conn_info, owner=None, table_name=None, exclude_system=False
         sql += " ORDER BY LAST_ANALYZED ASC NULLS FIRST"
         
         cursor.execute(sql, **params)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor)
     except Exception as e:
         print(f"Error fetching stale statistics: {e}")
         raise e
@@ -59,6 +61,7 @@ def get_stale_stats(conn_info, owner=None, table_name=None, exclude_system=False
         if connection:
             connection.close()
 
+@coalesced
 def get_dml_changes(conn_info, owner=None, table_name=None, exclude_system=False):
     connection = None
     try:
@@ -103,8 +106,7 @@ def get_dml_changes(conn_info, owner=None, table_name=None, exclude_system=False
         sql += " ORDER BY INSERTS + UPDATES + DELETES DESC"
         
         cursor.execute(sql, **params)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor)
     except Exception as e:
         print(f"Error fetching DML changes: {e}")
         raise e
@@ -112,6 +114,7 @@ def get_dml_changes(conn_info, owner=None, table_name=None, exclude_system=False
         if connection:
             connection.close()
 
+@invalidates_catalog
 def gather_stats(conn_info, level='TABLE', owner=None, table_name=None, 
                  estimate_percent=None, method_opt=None, degree=None, 
                  granularity=None, cascade=None, no_invalidate=None):
@@ -192,6 +195,7 @@ def gather_stats(conn_info, level='TABLE', owner=None, table_name=None,
         if connection:
             connection.close()
 
+@invalidates_catalog
 def lock_stats(conn_info, owner, table_name, action='LOCK'):
     connection = None
     try:
@@ -209,6 +213,7 @@ def lock_stats(conn_info, owner, table_name, action='LOCK'):
         if connection:
             connection.close()
 
+@coalesced
 def get_user_schemas(conn_info, exclude_system=True):
     connection = None
     try:
@@ -234,6 +239,7 @@ def get_user_schemas(conn_info, exclude_system=True):
         if connection:
             connection.close()
 
+@coalesced
 def get_schema_tables(conn_info, owner):
     connection = None
     try:
@@ -18,7 +18,11 @@
 """
 import oracledb
 from .utils import get_oracle_connection
+from .single_flight_mod import coalesced
+from .catalog_cache_mod import catalog_cached
 
+@catalog_cached
+@coalesced
 def get_storage_charts_data(conn_info):
     connection = None
     try:
@@ -1,8 +1,11 @@
 import oracledb
-from .utils import get_oracle_connection, safe_value
+from .utils import get_oracle_connection, query_cursor, fetch_rows, shape_rows, GRID_ARRAYSIZE
 import traceback
+from .single_flight_mod import coalesced
+from .catalog_cache_mod import catalog_cached, invalidates_catalog
 
-def get_tablespaces_detailed(conn_info, inst_id=None):
+@coalesced
+def get_tablespaces_detailed(conn_info, inst_id=None, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -13,8 +16,7 @@ def get_tablespaces_detailed(conn_info, inst_id=None):
         sql_text = get_sql_content("oracle_internal/storage/tablespaces.sql", version, is_internal=True)
         
         cursor.execute(sql_text, inst_id=inst_id)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching detailed tablespaces: {e}")
         raise e
@@ -22,7 +24,8 @@ def get_tablespaces_detailed(conn_info, inst_id=None):
         if connection:
             connection.close()
 
-def get_data_files(conn_info, inst_id=None):
+@coalesced
+def get_data_files(conn_info, inst_id=None, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -33,8 +36,7 @@ def get_data_files(conn_info, inst_id=None):
         sql_text = get_sql_content("oracle_internal/storage/datafiles.sql", version, is_internal=True)
         
         cursor.execute(sql_text, inst_id=inst_id)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching data files: {e}")
         raise e
@@ -42,19 +44,20 @@ def get_data_files(conn_info, inst_id=None):
         if connection:
             connection.close()
 
-def get_segments(conn_info, tablespace_name=None, search_query=None):
+@catalog_cached
+@coalesced
+def get_segments(conn_info, tablespace_name=None, search_query=None, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
-        cursor = connection.cursor()
+        cursor = query_cursor(connection, arraysize=GRID_ARRAYSIZE)
         from .sql_central_mod import get_sql_content
         version = conn_info.get('version')
         sql_text = get_sql_content("oracle_internal/storage/segments.sql", version, is_internal=True)
         
         print(f"DEBUG: Fetching segments for TS: {tablespace_name}, search: {search_query}")
         cursor.execute(sql_text, ts_name=tablespace_name, search_query=search_query)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching segments: {e}")
         traceback.print_exc()
@@ -63,11 +66,13 @@ def get_segments(conn_info, tablespace_name=None, search_query=None):
         if connection:
             connection.close()
 
-def get_extents(conn_info, owner, segment_name):
+@catalog_cached
+@coalesced
+def get_extents(conn_info, owner, segment_name, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
-        cursor = connection.cursor()
+        cursor = query_cursor(connection, arraysize=GRID_ARRAYSIZE)
         from .sql_central_mod import get_sql_content
         version = conn_info.get('version')
         sql_text = get_sql_content("oracle_internal/storage/extents.sql", version, is_internal=True)
@@ -79,10 +84,9 @@ def get_extents(conn_info, owner, segment_name):
         cursor.execute(sql_text, owner=owner, segment_name=segment_name)
         
         if cursor.description is None:
-             return []
+             return shape_rows([], [], fmt)
              
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching extents for {owner}.{segment_name}: {e}")
         traceback.print_exc()
@@ -91,11 +95,13 @@ def get_extents(conn_info, owner, segment_name):
         if connection:
             connection.close()
 
-def get_tablespace_map(conn_info, tablespace_name, file_id=None):
+@catalog_cached
+@coalesced
+def get_tablespace_map(conn_info, tablespace_name, file_id=None, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
-        cursor = connection.cursor()
+        cursor = query_cursor(connection, arraysize=GRID_ARRAYSIZE)
         from .sql_central_mod import get_sql_content
         version = conn_info.get('version')
         
@@ -109,10 +115,9 @@ def get_tablespace_map(conn_info, tablespace_name, file_id=None):
         
         cursor.execute(sql_text, ts_name=tablespace_name, file_id=file_id)
         if cursor.description is None:
-            return []
+            return shape_rows([], [], fmt)
             
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching tablespace map: {e}")
         traceback.print_exc()
@@ -121,6 +126,7 @@ def get_tablespace_map(conn_info, tablespace_name, file_id=None):
         if connection:
             connection.close()
 
+@coalesced
 def get_sysaux_occupants(conn_info):
     connection = None
     try:
@@ -137,12 +143,11 @@ def get_sysaux_occupants(conn_info):
             WHERE space_usage_kbytes > 0
             ORDER BY space_usage_kbytes DESC
         """)
-        cols_occ = [col[0].lower() for col in cursor.description]
-        occupants = [{k: safe_value(v) for k, v in zip(cols_occ, row)} for row in cursor.fetchall()]
+        occupants = fetch_rows(cursor)
 
         # 2. Stats History Availability
         cursor.execute("SELECT dbms_stats.get_stats_history_availability FROM dual")
-        avail = safe_value(cursor.fetchone()[0])
+        avail = cursor.fetchone()[0]
         
         # 3. Top WRI$_OPTSTAT Objects (Space Hogs)
         cursor.execute("""
@@ -154,8 +159,7 @@ def get_sysaux_occupants(conn_info):
                 ORDER BY bytes DESC
             ) WHERE rownum <= 10
         """)
-        cols_obj = [col[0].lower() for col in cursor.description]
-        top_objects = [{k: safe_value(v) for k, v in zip(cols_obj, row)} for row in cursor.fetchall()]
+        top_objects = fetch_rows(cursor)
         
         return {
             "occupants": occupants,
@@ -169,6 +173,7 @@ def get_sysaux_occupants(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_undo_stats(conn_info):
     connection = None
     try:
@@ -182,9 +187,7 @@ def get_undo_stats(conn_info):
         sql_text = get_sql_content("undo_stats.sql", version, is_internal=True)
         
         cursor.execute(sql_text)
-        columns = [col[0].lower() for col in cursor.description]
-        stats_rows = cursor.fetchall()
-        stats = [{k: safe_value(v) for k, v in zip(columns, row)} for row in stats_rows]
+        stats = fetch_rows(cursor)
 
         # 2. Retention Parameters
         cursor.execute("SELECT value FROM v$parameter WHERE name = 'undo_retention'")
@@ -197,7 +200,7 @@ def get_undo_stats(conn_info):
         return {
             "stats": stats,
             "retention": retention,
-            "max_query_len": safe_value(max_q)
+            "max_query_len": max_q
         }
     except Exception as e:
         print(f"Error fetching undo stats: {e}")
@@ -206,7 +209,8 @@ def get_undo_stats(conn_info):
         if connection:
             connection.close()
 
-def get_temp_usage(conn_info):
+@coalesced
+def get_temp_usage(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
@@ -219,8 +223,7 @@ def get_temp_usage(conn_info):
             JOIN gv$session s ON t.session_addr = s.saddr AND t.inst_id = s.inst_id
             ORDER BY t.blocks DESC
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching temp usage: {e}")
         raise e
@@ -228,14 +231,14 @@ def get_temp_usage(conn_info):
         if connection:
             connection.close()
 
-def get_control_files(conn_info):
+@coalesced
+def get_control_files(conn_info, fmt=None):
     connection = None
     try:
         connection = get_oracle_connection(conn_info)
         cursor = connection.cursor()
         cursor.execute("SELECT inst_id, name, status, block_size, file_size_blks FROM gv$controlfile")
-        columns = [col[0].lower() for col in cursor.description]
-        return [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        return fetch_rows(cursor, fmt)
     except Exception as e:
         print(f"Error fetching control files: {e}")
         raise e
@@ -243,6 +246,7 @@ def get_control_files(conn_info):
         if connection:
             connection.close()
 
+@coalesced
 def get_checkpoint_progress(conn_info):
     connection = None
     try:
@@ -260,8 +264,7 @@ def get_checkpoint_progress(conn_info):
             FROM v$datafile
             ORDER BY file#
         """)
-        columns = [col[0].lower() for col in cursor.description]
-        datafiles = [{k: safe_value(v) for k, v in zip(columns, row)} for row in cursor.fetchall()]
+        datafiles = fetch_rows(cursor)
         
         return {
             "db_checkpoint": db_checkpoint,
@@ -288,6 +291,7 @@ def force_checkpoint(conn_info):
         if connection:
             connection.close()
 
+@invalidates_catalog
 def resize_datafile(conn_info, file_id, new_size_mb):
     connection = None
     try:
@@ -302,6 +306,7 @@ def resize_datafile(conn_info, file_id, new_size_mb):
         if connection:
             connection.close()
 
+@invalidates_catalog
 def add_datafile(conn_info, tablespace_name, file_name, size_mb):
     connection = None
     try:
@@ -316,6 +321,7 @@ def add_datafile(conn_info, tablespace_name, file_name, size_mb):
         if connection:
             connection.close()
 
+@coalesced
 def get_stats_history_retention(conn_info):
     connection = None
     try:
@@ -354,6 +360,7 @@ def get_stats_history_retention(conn_info):
         if connection:
             connection.close()
 
+@invalidates_catalog
 def set_stats_history_retention(conn_info, days):
     connection = None
     try:
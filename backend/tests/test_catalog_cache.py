@@ -0,0 +1,16 @@
+from backend.catalog_cache_mod import changes_catalog
+
+
+def test_ddl_is_detected():
+    assert changes_catalog("ALTER DATABASE DATAFILE '/u01/users01.dbf' RESIZE 10G;")
+    assert changes_catalog("begin dbms_stats.gather_table_stats('HR', 'EMP'); end;")
+
+
+def test_ddl_after_leading_comments_is_detected():
+    assert changes_catalog("-- resize\nALTER DATABASE DATAFILE '/u01/users01.dbf' RESIZE 10G;")
+    assert changes_catalog("/* Header\n   drop the old group */\n  -- group 4\nALTER DATABASE DROP LOGFILE GROUP 4;")
+
+
+def test_queries_are_not_ddl():
+    assert not changes_catalog("-- ALTER is only mentioned here\nSELECT * FROM dba_segments;")
+    assert not changes_catalog("/* CREATE */ SELECT 'DROP' FROM dual;")
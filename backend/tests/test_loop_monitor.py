@@ -0,0 +1,39 @@
+import time
+import asyncio
+
+from backend import loop_monitor_mod
+
+
+def _run_watchdog(monkeypatch, body, interval=0.1, warn_ms=100):
+    monkeypatch.setattr(loop_monitor_mod, "HEARTBEAT_INTERVAL", interval)
+    monkeypatch.setattr(loop_monitor_mod, "LAG_WARN_MS", warn_ms)
+    loop_monitor_mod._stalls.clear()
+    loop_monitor_mod._lag_samples.clear()
+
+    async def main():
+        watchdog = asyncio.create_task(loop_monitor_mod.loop_watchdog())
+        await body()
+        watchdog.cancel()
+        await asyncio.gather(watchdog, return_exceptions=True)
+
+    asyncio.run(main())
+    return list(loop_monitor_mod._stalls)
+
+
+def test_idle_loop_records_no_stalls(monkeypatch):
+    async def idle():
+        await asyncio.sleep(1.5)
+
+    assert _run_watchdog(monkeypatch, idle) == []
+
+
+def test_blocked_loop_records_the_time_past_the_expected_beat(monkeypatch):
+    async def blocked():
+        await asyncio.sleep(0.3)
+        time.sleep(0.6)
+        await asyncio.sleep(0.5)
+
+    stalls = _run_watchdog(monkeypatch, blocked)
+    assert len(stalls) == 1
+    # 600 ms blocked: the record excludes the heartbeat interval itself
+    assert 100 <= stalls[0]["blocked_ms"] < 700
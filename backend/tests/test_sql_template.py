@@ -0,0 +1,36 @@
+from backend.sql_template_mod import compile_sql_template, render_sql_template, statement_binds
+
+
+def test_binds_outside_literals_and_comments():
+    template = compile_sql_template("SELECT * FROM gv$session WHERE sid = :sid AND inst_id = :Inst_Id")
+
+    assert template["binds"] == {"sid", "inst_id"}
+    assert statement_binds(template, {"sid": 10, "INST_ID": 1, "owner": "HR"}) == {"sid": 10, "INST_ID": 1}
+
+
+def test_colons_in_strings_comments_and_q_quotes_are_not_binds():
+    template = compile_sql_template(
+        "SELECT TO_CHAR(sysdate, 'HH24:MI:SS'), q'[at :noon]', q'{ :brace }', \"A:B\"\n"
+        "-- filter on :owner\n"
+        "/* :sid\n   :serial */\n"
+        "FROM dual WHERE name = 'it''s :quoted' AND owner = :owner"
+    )
+
+    assert template["binds"] == {"owner"}
+    assert statement_binds(template, {"owner": "HR", "noon": 1, "sid": 2, "quoted": 3, "mi": 4}) == {"owner": "HR"}
+
+
+def test_no_binds_without_bind_vars():
+    template = compile_sql_template("SELECT :x FROM dual")
+
+    assert statement_binds(template, None) == {}
+    assert statement_binds(template, {}) == {}
+
+
+def test_render_substitutes_every_sigil_but_keeps_dictionary_views():
+    template = compile_sql_template("SELECT * FROM gv$sql WHERE sql_id = '&sql_id' AND rownum <= $limit")
+
+    assert render_sql_template(template, {"SQL_ID": "abc", "limit": 5}) == (
+        "SELECT * FROM gv$sql WHERE sql_id = 'abc' AND rownum <= 5"
+    )
+    assert render_sql_template(template, {"limit": 5}, sigils="&") == template["text"]
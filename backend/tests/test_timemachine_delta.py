@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+from backend import timemachine_mod
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+T1 = T0 + timedelta(seconds=10)
+
+
+def _session(sid, status="INACTIVE", last_call_et=0, event="SQL*Net message from client"):
+    return {"inst_id": 1, "sid": sid, "serial#": sid * 10, "username": "HR", "status": status,
+            "wait_class": "Idle" if status == "INACTIVE" else "User I/O", "event": event,
+            "last_call_et": last_call_et}
+
+
+def _iso(timestamp):
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _stored(timestamp, position, row):
+    """A session as read back from InfluxDB: tags are strings, numbers are floats."""
+    point = {"time": _iso(timestamp), "position": float(position)}
+    for key, value in row.items():
+        if key in timemachine_mod.SESSION_TAGS:
+            point[timemachine_mod.SESSION_TAGS[key]] = str(value)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            point[key] = float(value)
+        else:
+            point[key] = value
+    return point
+
+
+def _removed(timestamp, row):
+    return _stored(timestamp, -1, {"inst_id": row["inst_id"], "sid": row["sid"], "serial#": row["serial#"],
+                                   "removed": True})
+
+
+def test_first_snapshot_is_a_keyframe(monkeypatch):
+    monkeypatch.setattr(timemachine_mod, "_delta_state", {})
+    sessions = [_session(1, last_call_et=100), _session(2, "ACTIVE", 5)]
+
+    is_keyframe, rows, removed, state = timemachine_mod.plan_session_frame(7, sessions, T0)
+
+    assert is_keyframe
+    assert rows == sessions
+    assert removed == []
+    assert state["keyframe_at"] == T0
+
+
+def test_delta_writes_active_new_and_changed_sessions_and_removed_markers(monkeypatch):
+    monkeypatch.setattr(timemachine_mod, "_delta_state", {})
+    idle, active, gone, changed = (_session(1, last_call_et=100), _session(2, "ACTIVE", 5),
+                                   _session(3, last_call_et=50), _session(4, last_call_et=20))
+    *_, state = timemachine_mod.plan_session_frame(7, [idle, active, gone, changed], T0)
+    timemachine_mod._delta_state[7] = state
+
+    later = [
+        # Only the clock moved: not written
+        {**idle, "last_call_et": 110},
+        {**active, "last_call_et": 15},
+        {**changed, "last_call_et": 0, "event": "log file sync"},
+        _session(5, last_call_et=3),
+    ]
+    is_keyframe, rows, removed, _ = timemachine_mod.plan_session_frame(7, later, T1)
+
+    assert not is_keyframe
+    assert [r["sid"] for r in rows] == [2, 4, 5]
+    assert removed == [(1, 3, 30)]
+
+
+def test_keyframe_is_forced_after_keyframe_seconds(monkeypatch):
+    monkeypatch.setattr(timemachine_mod, "_delta_state", {})
+    sessions = [_session(1)]
+    *_, state = timemachine_mod.plan_session_frame(7, sessions, T0)
+    timemachine_mod._delta_state[7] = state
+
+    later = T0 + timedelta(seconds=timemachine_mod.KEYFRAME_SECONDS)
+    assert timemachine_mod.plan_session_frame(7, sessions, later)[0]
+
+
+def test_replay_applies_deltas_and_advances_idle_clocks():
+    idle, active, gone = _session(1, last_call_et=100), _session(2, "ACTIVE", 5), _session(3, last_call_et=50)
+    rows = [
+        _stored(T0, 0, idle), _stored(T0, 1, active), _stored(T0, 2, gone),
+        _stored(T1, 0, {**active, "last_call_et": 15}),
+        _stored(T1, 1, _session(4, last_call_et=2)),
+        _removed(T1, gone),
+    ]
+
+    sessions = timemachine_mod.replay_sessions(rows, _iso(T1))
+
+    assert {s["sid"]: s["last_call_et"] for s in sessions} == {1: 110, 2: 15, 4: 2}
+    assert [s["sid"] for s in sessions] == [1, 2, 4]
+    assert all("removed" not in s for s in sessions)
+    assert sessions[0]["serial#"] == 10 and sessions[0]["username"] == "HR"
+
+
+def test_replay_between_snapshots_advances_every_carried_session():
+    idle, active = _session(1, last_call_et=100), _session(2, "ACTIVE", 5)
+    rows = [_stored(T0, 0, idle), _stored(T0, 1, active), _stored(T1, 0, {**active, "last_call_et": 15})]
+
+    sessions = timemachine_mod.replay_sessions(rows, _iso(T1 + timedelta(seconds=5)))
+
+    assert {s["sid"]: s["last_call_et"] for s in sessions} == {1: 115, 2: 20}
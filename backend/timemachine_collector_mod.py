@@ -0,0 +1,291 @@
+import os
+import time
+import threading
+import asyncio
+import oracledb
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .utils import get_oracle_connection, query_cursor, fetch_rows
+from .sessions_mod import get_sessions_query, build_blocking_tree
+from .timemachine_mod import store_snapshot
+from .sample_cache_mod import publish_sample, sample_generation
+from .metrics_mod import register_gauge, TIMEMACHINE_CYCLE_SECONDS, TIMEMACHINE_PHASE_SECONDS
+from .tracing_mod import span
+
+# Default collection interval per database (seconds); connections can override
+# it with their timemachine_interval column
+COLLECT_INTERVAL = 10
+
+# Scheduler settings
+# TIMEMACHINE_SCOPE: "all" snapshots every connection with timemachine_enabled,
+# "active" keeps the previous behaviour of recording the active connection only.
+SCOPE = os.getenv("TIMEMACHINE_SCOPE", "all").lower()
+MAX_PARALLEL = int(os.getenv("TIMEMACHINE_MAX_PARALLEL", "4"))
+MAX_BACKOFF = int(os.getenv("TIMEMACHINE_MAX_BACKOFF", "300"))
+SCHEDULER_TICK = 1
+
+# All three snapshot queries are opened as REF CURSORs by one anonymous block,
+# so a cycle costs one execute round-trip plus the fetches, on one pooled session.
+SNAPSHOT_BLOCK = """
+BEGIN
+    OPEN :sessions_cur FOR
+{sessions_sql}
+    ;
+    OPEN :long_ops_cur FOR
+{long_ops_sql}
+    ;
+    OPEN :blocking_cur FOR
+{blocking_sql}
+    ;
+END;"""
+
+# Rows prefetched with the first fetch of each cursor
+SNAPSHOT_ARRAYSIZE = 500
+
+# Connections whose database rejected the block (e.g. missing direct grants on
+# gv$ views for static PL/SQL); they use sequential execution on the same session.
+_block_unsupported = set()
+# Errors meaning the block cannot compile or run for this user: table or view does
+# not exist, PL/SQL compilation error, insufficient privileges. Anything else
+# (network, timeouts, ...) fails the cycle as usual.
+BLOCK_UNSUPPORTED_ERRORS = {"ORA-00942", "ORA-06550", "ORA-01031"}
+
+# Recent cycle timings per connection id
+_cycle_stats = {}
+STATS_HISTORY = 60
+
+def _strip_statement(sql_text):
+    return sql_text.strip().rstrip(';').rstrip()
+
+def get_snapshot_queries(conn_info):
+    from .sql_central_mod import get_sql_content
+    version = conn_info.get('version')
+    sessions_sql, _ = get_sessions_query(conn_info)
+    long_ops_sql = get_sql_content("session_longops.sql", version, is_internal=True)
+    blocking_sql = get_sql_content("blocking_sessions.sql", version, is_internal=True)
+    return _strip_statement(sessions_sql), _strip_statement(long_ops_sql), _strip_statement(blocking_sql)
+
+# Binds of session_longops.sql: every SID on every instance
+LONG_OPS_BINDS = {"sid": "%", "inst_id": 0}
+
+def _collect_with_block(connection, queries):
+    sessions_sql, long_ops_sql, blocking_sql = queries
+    cursor = connection.cursor()
+    ref_cursors = {}
+    for name in ("sessions_cur", "long_ops_cur", "blocking_cur"):
+        ref_cursors[name] = query_cursor(connection, arraysize=SNAPSHOT_ARRAYSIZE)
+
+    block = SNAPSHOT_BLOCK.format(
+        sessions_sql=sessions_sql, long_ops_sql=long_ops_sql, blocking_sql=blocking_sql
+    )
+    cursor.execute(block, **ref_cursors, **LONG_OPS_BINDS)
+    return (
+        fetch_rows(ref_cursors["sessions_cur"]),
+        fetch_rows(ref_cursors["long_ops_cur"]),
+        fetch_rows(ref_cursors["blocking_cur"])
+    )
+
+def _collect_sequential(connection, queries):
+    sessions_sql, long_ops_sql, blocking_sql = queries
+    cursor = query_cursor(connection, arraysize=SNAPSHOT_ARRAYSIZE)
+    results = []
+    for sql_text, binds in ((sessions_sql, {}), (long_ops_sql, LONG_OPS_BINDS), (blocking_sql, {})):
+        cursor.execute(sql_text, binds)
+        results.append(fetch_rows(cursor))
+    return tuple(results)
+
+def _block_rejected(err):
+    error = err.args[0] if err.args else None
+    return getattr(error, "full_code", None) in BLOCK_UNSUPPORTED_ERRORS
+
+def collect_snapshot(conn_info):
+    """
+    Fetches sessions, long operations and the blocking tree on a single pooled session.
+    Returns (sessions, long_ops, blocking, timing) where timing holds milliseconds per phase.
+    """
+    conn_id = conn_info.get('id')
+    generation = sample_generation(conn_id)
+    timing = {}
+    start = time.perf_counter()
+    queries = get_snapshot_queries(conn_info)
+    timing["prepare_ms"] = (time.perf_counter() - start) * 1000
+
+    connection = None
+    try:
+        t0 = time.perf_counter()
+        connection = get_oracle_connection(conn_info, action="timemachine_collector")
+        timing["acquire_ms"] = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        if conn_id not in _block_unsupported:
+            try:
+                sessions, long_ops, blocking_rows = _collect_with_block(connection, queries)
+                timing["mode"] = "block"
+            except oracledb.DatabaseError as block_err:
+                if not _block_rejected(block_err):
+                    raise
+                print(f"Time Machine: snapshot block not usable for connection {conn_id}, "
+                      f"falling back to sequential queries: {block_err}")
+                _block_unsupported.add(conn_id)
+        if conn_id in _block_unsupported:
+            sessions, long_ops, blocking_rows = _collect_sequential(connection, queries)
+            timing["mode"] = "sequential"
+        timing["query_ms"] = (time.perf_counter() - t0) * 1000
+    finally:
+        if connection:
+            connection.close()
+
+    # Interactive endpoints serve these while fresh instead of querying again
+    publish_sample(conn_id, "sessions", sessions, generation)
+    publish_sample(conn_id, "long_ops", long_ops, generation)
+    publish_sample(conn_id, "blocking", blocking_rows, generation)
+
+    blocking = build_blocking_tree(blocking_rows)
+    timing["total_ms"] = (time.perf_counter() - start) * 1000
+    return sessions, long_ops, blocking, timing
+
+def run_collection_cycle(conn_info):
+    """Collects one snapshot, stores it in the time machine and records the cycle timing."""
+    with span("timemachine.cycle", {"rockdb.connection": conn_info.get('name')}) as cycle_span:
+        sessions, long_ops, blocking, timing = collect_snapshot(conn_info)
+
+        t0 = time.perf_counter()
+        stored = store_snapshot(sessions, long_ops, blocking, conn_info.get('id'), conn_info.get('name'))
+        timing["store_ms"] = (time.perf_counter() - t0) * 1000
+        cycle_span.set_attribute("db.rows", len(sessions))
+
+    timing["cycle_ms"] = timing["total_ms"] + timing["store_ms"]
+    timing["budget_pct"] = round(timing["cycle_ms"] / (get_interval(conn_info) * 1000) * 100, 2)
+    timing["stored"] = stored
+    timing["sessions"] = len(sessions)
+    timing["time"] = time.time()
+    name = conn_info.get('name') or str(conn_info.get('id'))
+    TIMEMACHINE_CYCLE_SECONDS.labels(name).observe(timing["cycle_ms"] / 1000)
+    for phase in ("acquire", "query", "store"):
+        TIMEMACHINE_PHASE_SECONDS.labels(name, phase).observe(timing[f"{phase}_ms"] / 1000)
+    for key, value in timing.items():
+        if key.endswith("_ms"):
+            timing[key] = round(value, 2)
+
+    history = _cycle_stats.setdefault(conn_info.get('id'), deque(maxlen=STATS_HISTORY))
+    history.append(timing)
+    return timing
+
+def get_interval(conn_info):
+    return conn_info.get('timemachine_interval') or COLLECT_INTERVAL
+
+def get_collector_stats():
+    """Last cycle plus averages over the recent history, and scheduling state, per connection id."""
+    stats = {}
+    now = time.monotonic()
+    for conn_id, state in list(_schedule.items()):
+        stats[conn_id] = {
+            "name": state["name"],
+            "interval_s": state["interval"],
+            "failures": state["failures"],
+            "last_error": state["last_error"],
+            "in_flight": state["in_flight"],
+            "next_run_in_s": round(max(state["next_run"] - now, 0), 1)
+        }
+    for conn_id, history in list(_cycle_stats.items()):
+        if not history:
+            continue
+        cycles = list(history)
+        stats.setdefault(conn_id, {}).update({
+            "last": cycles[-1],
+            "cycles": len(cycles),
+            "avg_cycle_ms": round(sum(c["cycle_ms"] for c in cycles) / len(cycles), 2),
+            "max_cycle_ms": max(c["cycle_ms"] for c in cycles),
+            "avg_budget_pct": round(sum(c["budget_pct"] for c in cycles) / len(cycles), 2)
+        })
+    return stats
+
+# --- Scheduler ---
+# Every registered database is collected on its own interval. Cycles run in a
+# dedicated thread pool whose size bounds how many databases are queried at once;
+# a failing database backs off exponentially (up to MAX_BACKOFF seconds).
+_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL, thread_name_prefix="timemachine")
+_schedule = {}
+# Running snapshot cycles: the event loop only keeps weak references to tasks
+_cycle_tasks = set()
+# Cycles handed to the executor and not finished yet (running ones included)
+_pending_cycles = {"count": 0}
+_pending_lock = threading.Lock()
+
+register_gauge("rockdb_timemachine_cycles_in_flight", "Collection cycles running",
+               lambda: sum(1 for state in list(_schedule.values()) if state["in_flight"]))
+register_gauge("rockdb_timemachine_executor_queue_depth", "Collection cycles waiting for a collector thread",
+               lambda: max(_pending_cycles["count"] - MAX_PARALLEL, 0))
+
+def _cycle_done(future):
+    with _pending_lock:
+        _pending_cycles["count"] -= 1
+
+async def _run_scheduled(conn_info):
+    conn_id = conn_info['id']
+    state = _schedule[conn_id]
+    interval = get_interval(conn_info)
+    started = time.monotonic()
+    with _pending_lock:
+        _pending_cycles["count"] += 1
+    # Counted down by the executor future, which only completes when the thread is done
+    cycle = _executor.submit(run_collection_cycle, conn_info)
+    cycle.add_done_callback(_cycle_done)
+    try:
+        await asyncio.wrap_future(cycle)
+        state["failures"] = 0
+        state["last_error"] = None
+        state["next_run"] = started + interval
+    except Exception as e:
+        state["failures"] += 1
+        state["last_error"] = str(e)
+        backoff = min(interval * (2 ** state["failures"]), MAX_BACKOFF)
+        state["next_run"] = time.monotonic() + backoff
+        print(f"Time Machine: snapshot failed for {conn_info.get('name')} "
+              f"({state['failures']} in a row), retrying in {backoff}s: {e}")
+    finally:
+        state["in_flight"] = False
+
+async def timemachine_scheduler():
+    """Background loop launching snapshot cycles for every due database."""
+    from .db_connections import get_timemachine_connections
+    print(f"Time Machine scheduler starting (scope={SCOPE}, max parallel={MAX_PARALLEL})...")
+    while True:
+        try:
+            # SQLite read in the default executor, so ticks never stall the event loop
+            connections = await asyncio.get_running_loop().run_in_executor(
+                None, get_timemachine_connections, SCOPE == "active"
+            )
+            now = time.monotonic()
+            current_ids = set()
+            for conn_info in connections:
+                conn_id = conn_info['id']
+                current_ids.add(conn_id)
+                state = _schedule.setdefault(conn_id, {
+                    "next_run": now, "failures": 0, "last_error": None, "in_flight": False
+                })
+                state["name"] = conn_info.get('name')
+                state["interval"] = get_interval(conn_info)
+                if state["in_flight"] or state["next_run"] > now:
+                    continue
+                state["in_flight"] = True
+                task = asyncio.create_task(_run_scheduled(conn_info))
+                _cycle_tasks.add(task)
+                task.add_done_callback(_cycle_tasks.discard)
+
+            # Forget databases that were deleted or opted out
+            for conn_id in list(_schedule):
+                if conn_id not in current_ids and not _schedule[conn_id]["in_flight"]:
+                    del _schedule[conn_id]
+                    _cycle_stats.pop(conn_id, None)
+
+            await asyncio.sleep(SCHEDULER_TICK)
+        except asyncio.CancelledError:
+            print("Time Machine scheduler stopping...")
+            for task in list(_cycle_tasks):
+                task.cancel()
+            await asyncio.gather(*_cycle_tasks, return_exceptions=True)
+            break
+        except Exception as e:
+            print(f"Time Machine Scheduler Error: {e}")
+            await asyncio.sleep(SCHEDULER_TICK)
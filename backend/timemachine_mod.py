@@ -1,9 +1,16 @@
 import requests
 import os
 import json
+import time
+import queue
+import threading
+from collections import Counter, defaultdict
 from datetime import datetime, timezone
 from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
+from .utils import DB_PATH, to_columnar
+from .metrics_mod import register_gauge
+from .tracing_mod import span
 
 # Configuration
 INFLUX_URL = os.getenv("INFLUX_URL", "http://localhost:8086")
@@ -14,100 +21,646 @@ INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "timemachine")
 client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
 write_api = client.write_api(write_options=SYNCHRONOUS)
 
-def store_snapshot(sessions, long_ops, blocking):
-    """Stores a snapshot of database sessions and performance metrics into InfluxDB."""
-    try:
-        points = []
-        timestamp = datetime.now(timezone.utc)
-        
-        # 1. Sessions Point
-        # We store the main metrics as fields and the session list as a JSON string field for 10s snapshots
-        session_data = json.dumps(sessions)
-        p = Point("oracle_performance") \
-            .tag("type", "workload_snapshot") \
-            .field("session_count", len(sessions)) \
-            .field("active_sessions", len([s for s in sessions if s.get('status') == 'ACTIVE'])) \
-            .field("sessions_json", session_data) \
-            .field("long_ops_json", json.dumps(long_ops)) \
-            .field("blocking_json", json.dumps(blocking)) \
+# Storage backend: "influx" (InfluxDB/VictoriaMetrics, container deployments) or
+# "sqlite" (embedded store on local disk, used by the bundled desktop app where
+# no InfluxDB is running). See timemachine_sqlite_mod.
+STORAGE = os.getenv("TIMEMACHINE_STORAGE", "influx").lower()
+
+def get_storage_backend():
+    """The embedded storage module when selected, None for InfluxDB."""
+    if STORAGE == "sqlite":
+        from . import timemachine_sqlite_mod
+        return timemachine_sqlite_mod
+    return None
+
+# --- Schema ---
+# oracle_performance  one summary point per snapshot (counts only)
+# oracle_session      one point per session, tagged by inst_id/sid/serial, username
+#                     and wait class; status, event and sql_id change from one
+#                     snapshot to the next and are fields, so they do not add series
+# oracle_longop       one point per long operation row
+# oracle_blocking     one point per entry of the blocking tree
+# oracle_sql_activity per-sql_id aggregates of the snapshot
+# oracle_wait_class   per-wait-class session counters of the snapshot
+# Every point carries the connection_id tag and the snapshot timestamp. Sessions
+# are delta-encoded (see below); the other measurements are complete per snapshot.
+# The query order is kept in the "position" field.
+SESSION_TAGS = {
+    "inst_id": "inst_id", "sid": "sid", "serial#": "serial", "username": "username",
+    "wait_class": "wait_class"
+}
+LONGOP_TAGS = {"inst_id": "inst_id", "sid": "sid", "sql_id": "sql_id"}
+BLOCKING_TAGS = {"inst_id": "inst_id", "sid": "sid", "username": "username", "type": "type"}
+
+# Tag values in InfluxDB are strings; these are converted back on read
+NUMERIC_TAGS = {"inst_id", "sid", "serial#"}
+
+# --- Delta encoding of sessions ---
+# A keyframe with every session is written every TIMEMACHINE_KEYFRAME_SECONDS;
+# in between, only sessions that are ACTIVE, new or changed are written, plus a
+# "removed" marker for sessions that disappeared. Idle sessions are compared
+# without their clock columns, which are advanced by the elapsed time on read.
+KEYFRAME_SECONDS = int(os.getenv("TIMEMACHINE_KEYFRAME_SECONDS", "300"))
+CLOCK_FIELDS = ("last_call_et", "elapsed", "seconds_in_wait")
+
+# connection_id -> {"keyframe_at": datetime, "sessions": {session_key: comparable row}}
+_delta_state = {}
+# Resets (lost or unstored data) come from the writer thread and the spool while a
+# snapshot is being stored: a state planned before a reset is not saved after it
+_delta_lock = threading.Lock()
+_delta_resets = {"count": 0}
+
+def reset_delta_state(connection_ids=None):
+    """Makes the next snapshot of these connections (None: all) a keyframe."""
+    with _delta_lock:
+        _delta_resets["count"] += 1
+        if connection_ids is None:
+            _delta_state.clear()
+        else:
+            for connection_id in connection_ids:
+                _delta_state.pop(connection_id, None)
+
+def _save_delta_state(connection_id, new_state, resets):
+    with _delta_lock:
+        if _delta_resets["count"] == resets:
+            _delta_state[connection_id] = new_state
+        else:
+            _delta_state.pop(connection_id, None)
+
+def session_key(row):
+    return (row.get('inst_id'), row.get('sid'), row.get('serial#'))
+
+def _comparable(row):
+    return {k: v for k, v in row.items() if k not in CLOCK_FIELDS}
+
+def plan_session_frame(connection_id, sessions, timestamp):
+    """
+    Decides what to write for this snapshot's sessions.
+    Returns (is_keyframe, rows_to_write, removed_keys, new_state).
+    """
+    current = {session_key(s): _comparable(s) for s in sessions}
+    state = _delta_state.get(connection_id)
+    if not state or (timestamp - state["keyframe_at"]).total_seconds() >= KEYFRAME_SECONDS:
+        return True, sessions, [], {"keyframe_at": timestamp, "sessions": current}
+
+    previous = state["sessions"]
+    changed = [
+        s for s in sessions
+        if s.get('status') == 'ACTIVE' or previous.get(session_key(s)) != current[session_key(s)]
+    ]
+    removed = [key for key in previous if key not in current]
+    return False, changed, removed, {"keyframe_at": state["keyframe_at"], "sessions": current}
+
+def _field_value(v):
+    # Oracle NUMBERs come back as int or float depending on the value; storing all
+    # of them as float keeps each field's type stable across points.
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (int, float)):
+        return float(v)
+    return str(v)
+
+def _row_point(measurement, row, tag_map, timestamp, connection_id, position, seq=0):
+    p = Point(measurement).time(timestamp, WritePrecision.NS)
+    if connection_id is not None:
+        p = p.tag("connection_id", str(connection_id))
+    for key, tag in tag_map.items():
+        value = row.get(key)
+        if value is not None and value != "":
+            p = p.tag(tag, str(value))
+    if seq:
+        # Only rows repeating the tags of an earlier row of the snapshot (e.g. two long
+        # ops of one session) need this to stay separate points
+        p = p.tag("seq", str(seq))
+    p = p.field("position", position)
+    for key, value in row.items():
+        if key in tag_map or value is None:
+            continue
+        p = p.field(key, _field_value(value))
+    return p
+
+def _row_points(measurement, rows, tag_map, timestamp, connection_id):
+    seen = Counter()
+    points = []
+    for position, row in enumerate(rows):
+        tags = tuple(row.get(key) for key in tag_map)
+        points.append(_row_point(measurement, row, tag_map, timestamp, connection_id, position, seen[tags]))
+        seen[tags] += 1
+    return points
+
+def sql_activity_stats(sessions):
+    """Per-sql_id aggregates of one snapshot's sessions."""
+    sql_stats = defaultdict(lambda: {"sessions": 0, "active": 0, "cpu": 0.0, "last_call_et_max": 0.0})
+    for s in sessions:
+        sql_id = s.get('sql_id')
+        if not sql_id:
+            continue
+        agg = sql_stats[sql_id]
+        agg["sessions"] += 1
+        if s.get('status') == 'ACTIVE':
+            agg["active"] += 1
+        agg["cpu"] += float(s.get('cpu') or 0)
+        agg["last_call_et_max"] = max(agg["last_call_et_max"], float(s.get('last_call_et') or 0))
+    return sql_stats
+
+def wait_class_counts(sessions):
+    """Active sessions per wait class ('CPU' when not waiting)."""
+    return Counter(
+        (s.get('wait_class') if s.get('wait_class') and s.get('wait_class') != 'Idle' else 'CPU')
+        for s in sessions if s.get('status') == 'ACTIVE'
+    )
+
+def build_snapshot_points(sessions, long_ops, blocking, timestamp, connection_id=None, connection_name=None,
+                          frame=None):
+    """
+    Converts one collected snapshot into the normalized set of points.
+    frame is (is_keyframe, session_rows, removed_keys) from plan_session_frame;
+    without it every session is written as a keyframe.
+    """
+    points = []
+    is_keyframe, session_rows, removed_keys = frame if frame else (True, sessions, [])
+
+    summary = Point("oracle_performance").tag("type", "workload_snapshot")
+    if connection_id is not None:
+        summary = summary.tag("connection_id", str(connection_id))
+    if connection_name:
+        summary = summary.tag("connection_name", connection_name)
+    summary = summary \
+        .field("session_count", len(sessions)) \
+        .field("active_sessions", len([s for s in sessions if s.get('status') == 'ACTIVE'])) \
+        .field("long_ops_count", len(long_ops)) \
+        .field("blocking_count", len(blocking)) \
+        .field("keyframe", is_keyframe) \
+        .time(timestamp, WritePrecision.NS)
+    points.append(summary)
+
+    points.extend(_row_points("oracle_session", session_rows, SESSION_TAGS, timestamp, connection_id))
+    for inst_id, sid, serial in removed_keys:
+        removed = {"inst_id": inst_id, "sid": sid, "serial#": serial, "removed": True}
+        points.append(_row_point("oracle_session", removed, SESSION_TAGS, timestamp, connection_id, -1))
+    points.extend(_row_points("oracle_longop", long_ops, LONGOP_TAGS, timestamp, connection_id))
+    points.extend(_row_points("oracle_blocking", blocking, BLOCKING_TAGS, timestamp, connection_id))
+
+    for sql_id, agg in sql_activity_stats(sessions).items():
+        p = Point("oracle_sql_activity").tag("sql_id", sql_id).time(timestamp, WritePrecision.NS)
+        if connection_id is not None:
+            p = p.tag("connection_id", str(connection_id))
+        for key, value in agg.items():
+            p = p.field(key, value)
+        points.append(p)
+
+    for wait_class, count in wait_class_counts(sessions).items():
+        p = Point("oracle_wait_class").tag("wait_class", wait_class).field("sessions", count) \
             .time(timestamp, WritePrecision.NS)
-        
+        if connection_id is not None:
+            p = p.tag("connection_id", str(connection_id))
         points.append(p)
-        
-        # 2. Individual SQL IDs (optional, for easier querying later if needed)
-        # For now, keeping it simple with one high-density point per 10s
-        
-        write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=points)
+
+    return points
+
+# --- Batched writes ---
+# Snapshots are handed to a writer thread through a bounded queue and sent as
+# line protocol in batches (on size or every FLUSH_SECONDS), so collection never
+# waits on InfluxDB. Failed batches are retried with exponential backoff, then
+# spooled to disk and replayed once InfluxDB accepts writes again. A full queue
+# also spools, so an outage does not lose snapshots.
+WRITE_BATCH_LINES = int(os.getenv("TIMEMACHINE_WRITE_BATCH", "5000"))
+FLUSH_SECONDS = float(os.getenv("TIMEMACHINE_FLUSH_SECONDS", "5"))
+QUEUE_MAX = int(os.getenv("TIMEMACHINE_QUEUE_MAX", "200"))
+WRITE_RETRIES = int(os.getenv("TIMEMACHINE_WRITE_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("TIMEMACHINE_RETRY_BACKOFF", "1"))
+SPOOL_DIR = os.getenv("TIMEMACHINE_SPOOL_DIR") or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "timemachine_spool")
+SPOOL_MAX_BYTES = int(os.getenv("TIMEMACHINE_SPOOL_MAX_MB", "512")) * 1024 * 1024
+
+_write_queue = queue.Queue(maxsize=QUEUE_MAX)
+_writer_thread = None
+_writer_lock = threading.Lock()
+_spool_lock = threading.Lock()
+_writer_stats = {
+    "batches": 0, "lines": 0, "retries": 0, "spooled_lines": 0, "replayed_lines": 0,
+    "dropped_lines": 0, "tsdb_down": False, "last_error": None, "last_flush": None
+}
+
+def _ensure_writer():
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="timemachine-writer", daemon=True)
+            _writer_thread.start()
+
+def enqueue_points(connection_id, points):
+    """Queues one snapshot's points for the writer; spools them when the queue is full."""
+    lines = [line for line in (p.to_line_protocol() for p in points) if line]
+    _ensure_writer()
+    try:
+        _write_queue.put_nowait((connection_id, lines))
+    except queue.Full:
+        _spool(lines)
+
+def _writer_loop():
+    while True:
+        batch, connection_ids, stop = [], set(), False
+        deadline = time.monotonic() + FLUSH_SECONDS
+        while len(batch) < WRITE_BATCH_LINES:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = _write_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            connection_ids.add(item[0])
+            batch.extend(item[1])
+
+        if batch:
+            _flush(batch, connection_ids)
+        elif _writer_stats["tsdb_down"] and not stop:
+            # Nothing new to write: probe InfluxDB with the spooled data
+            _replay_spool()
+        if stop:
+            return
+
+def _write_lines(lines):
+    with span("influxdb.write", {"db.system": "influxdb", "db.name": INFLUX_BUCKET, "rockdb.lines": len(lines),
+                                 "rockdb.bytes": sum(len(line) for line in lines)}):
+        write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=lines)
+
+def _flush(batch, connection_ids):
+    # While InfluxDB is known to be down, fail fast to the spool instead of retrying
+    retries = 0 if _writer_stats["tsdb_down"] else WRITE_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            _write_lines(batch)
+            _writer_stats["batches"] += 1
+            _writer_stats["lines"] += len(batch)
+            _writer_stats["last_flush"] = time.time()
+            if _writer_stats["tsdb_down"]:
+                print("Time Machine: InfluxDB is accepting writes again, replaying spooled snapshots")
+            _writer_stats["tsdb_down"] = False
+            _replay_spool()
+            return
+        except Exception as e:
+            _writer_stats["last_error"] = str(e)
+            if attempt < retries:
+                _writer_stats["retries"] += 1
+                time.sleep(RETRY_BACKOFF * (2 ** attempt))
+
+    if not _writer_stats["tsdb_down"]:
+        print(f"Time Machine: InfluxDB write failed, spooling to {SPOOL_DIR}: {_writer_stats['last_error']}")
+    _writer_stats["tsdb_down"] = True
+    try:
+        _spool(batch)
+    except Exception as e:
+        _writer_stats["dropped_lines"] += len(batch)
+        print(f"Time Machine: could not spool {len(batch)} lines, snapshots lost: {e}")
+        # Deltas must chain onto stored data: start over with a keyframe
+        reset_delta_state(connection_ids)
+
+def _spool_files():
+    if not os.path.isdir(SPOOL_DIR):
+        return []
+    return sorted(os.path.join(SPOOL_DIR, f) for f in os.listdir(SPOOL_DIR) if f.endswith(".lp"))
+
+def _spool(lines):
+    """Appends a batch to the disk spool as one line-protocol file, dropping the oldest files above SPOOL_MAX_BYTES."""
+    with _spool_lock:
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        path = os.path.join(SPOOL_DIR, f"spool_{time.time_ns()}.lp")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        os.replace(path + ".tmp", path)
+        _writer_stats["spooled_lines"] += len(lines)
+
+        files = _spool_files()
+        total = sum(os.path.getsize(f) for f in files)
+        dropped = False
+        while total > SPOOL_MAX_BYTES and len(files) > 1:
+            oldest = files.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+            dropped = True
+            print(f"Time Machine: spool above {SPOOL_MAX_BYTES // (1024 * 1024)} MB, dropped {os.path.basename(oldest)}")
+        if dropped:
+            # The dropped file may hold the keyframe later deltas chain onto (of any
+            # connection): start every connection over with a keyframe
+            reset_delta_state()
+
+def _replay_spool():
+    """Writes spooled batches back to InfluxDB, oldest first; stops at the first failure."""
+    for path in _spool_files():
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = [line for line in f.read().split("\n") if line]
+            for i in range(0, len(lines), WRITE_BATCH_LINES):
+                _write_lines(lines[i:i + WRITE_BATCH_LINES])
+            with _spool_lock:
+                os.remove(path)
+            _writer_stats["replayed_lines"] += len(lines)
+            _writer_stats["tsdb_down"] = False
+        except Exception as e:
+            _writer_stats["last_error"] = str(e)
+            _writer_stats["tsdb_down"] = True
+            return
+
+def get_writer_stats():
+    """Queue depth, spool size and counters of the batching writer."""
+    files = _spool_files()
+    return {
+        **_writer_stats,
+        "storage": STORAGE,
+        "queued_snapshots": _write_queue.qsize(),
+        "queue_max": QUEUE_MAX,
+        "spool_files": len(files),
+        "spool_bytes": sum(os.path.getsize(f) for f in files)
+    }
+
+register_gauge("rockdb_timemachine_write_queue_depth", "Snapshots waiting for the InfluxDB writer",
+               _write_queue.qsize)
+register_gauge("rockdb_timemachine_spool_files", "Line-protocol batches spooled while InfluxDB was down",
+               lambda: len(_spool_files()))
+
+def shutdown_writer(timeout=10):
+    """Flushes queued snapshots on shutdown; whatever cannot be sent in time is spooled."""
+    if _writer_thread is None or not _writer_thread.is_alive():
+        return
+    try:
+        _write_queue.put(None, timeout=timeout)
+    except queue.Full:
+        pass
+    _writer_thread.join(timeout)
+    leftover = []
+    while True:
+        try:
+            item = _write_queue.get_nowait()
+        except queue.Empty:
+            break
+        if item:
+            leftover.extend(item[1])
+    if leftover:
+        _spool(leftover)
+
+def store_snapshot(sessions, long_ops, blocking, connection_id=None, connection_name=None):
+    """
+    Stores a snapshot of database sessions and performance metrics in the configured store, tagged by connection.
+    With InfluxDB the points are queued for the batch writer; returns False when the snapshot was not kept.
+    """
+    try:
+        timestamp = datetime.now(timezone.utc)
+        with _delta_lock:
+            resets = _delta_resets["count"]
+            is_keyframe, rows, removed, new_state = plan_session_frame(connection_id, sessions, timestamp)
+        frame = (is_keyframe, rows, removed)
+        backend = get_storage_backend()
+        if backend:
+            backend.write_snapshot(sessions, long_ops, blocking, timestamp, connection_id, connection_name, frame)
+            _save_delta_state(connection_id, new_state, resets)
+        else:
+            points = build_snapshot_points(sessions, long_ops, blocking, timestamp, connection_id, connection_name,
+                                           frame=frame)
+            # Saved before queueing: spooling a full queue may drop old files and reset the state
+            _save_delta_state(connection_id, new_state, resets)
+            enqueue_points(connection_id, points)
         return True
     except Exception as e:
-        print(f"Error storing snapshot in InfluxDB: {e}")
+        # Deltas must chain onto stored data: start over with a keyframe
+        reset_delta_state([connection_id])
+        print(f"Error storing time machine snapshot ({STORAGE}): {e}")
         return False
 
-def get_history_range(start_time_iso, end_time_iso):
+# --- Queries ---
+
+def quote(value):
+    """InfluxQL string literal."""
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def connection_filter(connection_id):
+    """InfluxQL condition restricting a query to one connection's points (empty when not given)."""
+    if connection_id is None:
+        return ""
+    return f" AND connection_id = '{int(connection_id)}'"
+
+def run_influxql(query):
+    """Runs an InfluxQL query and returns its series as lists of {column: value} dicts."""
+    # Use v1 query API for InfluxQL compatibility (VictoriaMetrics supports this at /query)
+    params = {
+        'db': INFLUX_BUCKET,
+        'q': query
+    }
+    with span("influxdb.query", {"db.system": "influxdb", "db.name": INFLUX_BUCKET, "db.statement": query}) as influx_span:
+        response = requests.get(f"{INFLUX_URL}/query", params=params, timeout=10)
+        data = response.json()
+        rows = []
+        if 'results' in data and data['results'][0].get('series'):
+            for series in data['results'][0]['series']:
+                columns = series['columns']
+                tags = series.get('tags', {})
+                for values in series['values']:
+                    row = dict(tags)
+                    row.update(zip(columns, values))
+                    rows.append(row)
+        influx_span.set_attributes({"db.rows": len(rows), "rockdb.bytes": len(response.content)})
+    return rows
+
+def _restore_row(row, tag_map):
+    """Maps a stored point back to the row shape produced by the *_mod query."""
+    out = {}
+    reverse_tags = {tag: key for key, tag in tag_map.items()}
+    for key, value in row.items():
+        if key in ("time", "connection_id", "position", "seq"):
+            continue
+        key = reverse_tags.get(key, key)
+        if value is None:
+            continue
+        if key in NUMERIC_TAGS and isinstance(value, str):
+            value = int(value) if value.lstrip('-').isdigit() else value
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        out[key] = value
+    return out
+
+def _position(row):
+    return int(row.get('position') or 0)
+
+def _ordered_rows(rows, tag_map):
+    rows.sort(key=_position)
+    return [_restore_row(r, tag_map) for r in rows]
+
+def parse_time(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def replay_sessions(rows, snapshot_time):
+    """
+    Rebuilds the session list at snapshot_time from a keyframe and the deltas after it.
+    rows are the stored session points from the keyframe up to snapshot_time.
+    """
+    target = parse_time(snapshot_time)
+    rows.sort(key=lambda r: (r['time'], _position(r)))
+    sessions = {}
+    for r in rows:
+        row = _restore_row(r, SESSION_TAGS)
+        key = session_key(row)
+        if row.pop('removed', None):
+            sessions.pop(key, None)
+        else:
+            sessions[key] = (row, r['time'])
+
+    result = []
+    for row, written_at in sessions.values():
+        if written_at != snapshot_time:
+            # Carried-over idle session: its clocks kept running since it was written
+            elapsed = int((target - parse_time(written_at)).total_seconds())
+            for field in CLOCK_FIELDS:
+                if isinstance(row.get(field), (int, float)):
+                    row[field] += elapsed
+        result.append(row)
+    # Same order as sessions.sql
+    result.sort(key=lambda r: r.get('last_call_et') or 0, reverse=True)
+    return result
+
+def get_history_range(start_time_iso, end_time_iso, connection_id=None):
     """Retrieves high-level metrics for a time range to populate a timeline using InfluxQL (VictoriaMetrics compatible)."""
+    backend = get_storage_backend()
+    if backend:
+        return backend.get_history_range(start_time_iso, end_time_iso, connection_id)
+
     # VictoriaMetrics/InfluxQL query
-    query = f'SELECT session_count, active_sessions FROM "oracle_performance" WHERE time >= \'{start_time_iso}\' AND time <= \'{end_time_iso}\' AND type = \'workload_snapshot\''
-    
+    query = f'SELECT session_count, active_sessions FROM "oracle_performance" WHERE time >= \'{start_time_iso}\' AND time <= \'{end_time_iso}\' AND type = \'workload_snapshot\'{connection_filter(connection_id)}'
+
     try:
-        # Use v1 query API for InfluxQL compatibility (VictoriaMetrics supports this at /query)
-        params = {
-            'db': INFLUX_BUCKET,
-            'q': query
-        }
-        response = requests.get(f"{INFLUX_URL}/query", params=params, timeout=10)
-        data = response.json()
-        
         output = []
-        if 'results' in data and data['results'][0].get('series'):
-            series = data['results'][0]['series'][0]
-            columns = series['columns']
-            values = series['values']
-            
-            time_idx = columns.index('time')
-            sc_idx = columns.index('session_count')
-            as_idx = columns.index('active_sessions')
-            
-            for row in values:
-                output.append({
-                    "time": row[time_idx],
-                    "session_count": int(row[sc_idx] or 0),
-                    "active_sessions": int(row[as_idx] or 0)
-                })
+        for row in run_influxql(query):
+            output.append({
+                "time": row['time'],
+                "session_count": int(row.get('session_count') or 0),
+                "active_sessions": int(row.get('active_sessions') or 0)
+            })
         return output
     except Exception as e:
         print(f"Error querying history from VictoriaMetrics/InfluxDB: {e}")
         return []
 
-def get_snapshot_at_time(target_time_iso):
-    """Retrieves the full JSON snapshot closest to a specific timestamp using InfluxQL."""
+def to_compact(rows):
+    """Compact encoding of a row list: column names once, then one value array per row."""
+    return to_columnar(rows)
+
+def get_snapshot_at_time(target_time_iso, connection_id=None, compact=False):
+    """Retrieves the snapshot closest to (at or before) a specific timestamp using InfluxQL."""
+    backend = get_storage_backend()
+    if backend:
+        return backend.get_snapshot_at_time(target_time_iso, connection_id, compact)
+
     # VictoriaMetrics/InfluxQL query to get the closest record before or at the target time
-    query = f'SELECT sessions_json, long_ops_json, blocking_json FROM "oracle_performance" WHERE time <= \'{target_time_iso}\' AND type = \'workload_snapshot\' ORDER BY time DESC LIMIT 1'
-    
+    query = f'SELECT * FROM "oracle_performance" WHERE time <= \'{target_time_iso}\' AND type = \'workload_snapshot\'{connection_filter(connection_id)} ORDER BY time DESC LIMIT 1'
+
     try:
-        params = {
-            'db': INFLUX_BUCKET,
-            'q': query
-        }
-        response = requests.get(f"{INFLUX_URL}/query", params=params, timeout=10)
-        data = response.json()
-        
-        if 'results' in data and data['results'][0].get('series'):
-            series = data['results'][0]['series'][0]
-            columns = series['columns']
-            row = series['values'][0]
-            
-            time_idx = columns.index('time')
-            s_idx = columns.index('sessions_json')
-            l_idx = columns.index('long_ops_json')
-            b_idx = columns.index('blocking_json')
-            
-            return {
-                "time": row[time_idx],
-                "sessions": json.loads(row[s_idx]) if row[s_idx] else [],
-                "long_ops": json.loads(row[l_idx]) if row[l_idx] else [],
-                "blocking": json.loads(row[b_idx]) if row[b_idx] else []
+        summary = run_influxql(query)
+        if not summary:
+            return None
+        row = summary[0]
+        snapshot_time = row['time']
+
+        if row.get('sessions_json') is not None:
+            # Snapshots written before the normalized schema carry JSON blobs
+            snapshot = {
+                "time": snapshot_time,
+                "sessions": json.loads(row['sessions_json']) if row['sessions_json'] else [],
+                "long_ops": json.loads(row['long_ops_json']) if row.get('long_ops_json') else [],
+                "blocking": json.loads(row['blocking_json']) if row.get('blocking_json') else []
             }
-        return None
+        else:
+            at_time = f"time = '{snapshot_time}'{connection_filter(connection_id)}"
+            if row.get('keyframe') is None:
+                # Normalized snapshots from before delta encoding hold every session
+                sessions = _ordered_rows(run_influxql(f'SELECT * FROM "oracle_session" WHERE {at_time}'), SESSION_TAGS)
+            else:
+                keyframe_time = snapshot_time
+                if not row['keyframe']:
+                    keyframes = run_influxql(
+                        f'SELECT session_count FROM "oracle_performance" WHERE time <= \'{snapshot_time}\' '
+                        f'AND type = \'workload_snapshot\' AND keyframe = true{connection_filter(connection_id)} '
+                        f'ORDER BY time DESC LIMIT 1'
+                    )
+                    if keyframes:
+                        keyframe_time = keyframes[0]['time']
+                session_points = run_influxql(
+                    f'SELECT * FROM "oracle_session" WHERE time >= \'{keyframe_time}\' '
+                    f'AND time <= \'{snapshot_time}\'{connection_filter(connection_id)}'
+                )
+                sessions = replay_sessions(session_points, snapshot_time)
+            snapshot = {
+                "time": snapshot_time,
+                "sessions": sessions,
+                "long_ops": _ordered_rows(run_influxql(f'SELECT * FROM "oracle_longop" WHERE {at_time}'), LONGOP_TAGS),
+                "blocking": _ordered_rows(run_influxql(f'SELECT * FROM "oracle_blocking" WHERE {at_time}'), BLOCKING_TAGS)
+            }
+
+        if compact:
+            for key in ("sessions", "long_ops", "blocking"):
+                snapshot[key] = to_compact(snapshot[key])
+        return snapshot
     except Exception as e:
         print(f"Error querying snapshot from VictoriaMetrics/InfluxDB: {e}")
         return None
+
+def get_session_history(start_time_iso, end_time_iso, connection_id=None, username=None, event=None,
+                        wait_class=None, sql_id=None, status=None, limit=5000):
+    """
+    Session points in a time range, filtered server-side on username and wait class
+    (tags) and on event, sql_id and status (fields). Delta "removed" markers are left out.
+    """
+    backend = get_storage_backend()
+    if backend:
+        return backend.get_session_history(start_time_iso, end_time_iso, connection_id, username=username,
+                                           event=event, wait_class=wait_class, sql_id=sql_id,
+                                           status=status, limit=limit)
+
+    conditions = [f"time >= {quote(start_time_iso)}", f"time <= {quote(end_time_iso)}"]
+    for tag, value in (("username", username), ("event", event), ("wait_class", wait_class),
+                       ("sql_id", sql_id), ("status", status)):
+        if value:
+            conditions.append(f"{tag} = {quote(value)}")
+    query = f'SELECT * FROM "oracle_session" WHERE {" AND ".join(conditions)}{connection_filter(connection_id)} ORDER BY time ASC LIMIT {int(limit)}'
+    try:
+        history = []
+        for r in run_influxql(query):
+            row = _restore_row(r, SESSION_TAGS)
+            if row.get('removed'):
+                continue
+            history.append({"time": r['time'], **row})
+        return history
+    except Exception as e:
+        print(f"Error querying session history from InfluxDB: {e}")
+        return []
+
+def get_sql_activity(start_time_iso, end_time_iso, connection_id=None, sql_id=None):
+    """Per-sql_id aggregates over a time range."""
+    backend = get_storage_backend()
+    if backend:
+        return backend.get_sql_activity(start_time_iso, end_time_iso, connection_id, sql_id)
+
+    conditions = [f"time >= {quote(start_time_iso)}", f"time <= {quote(end_time_iso)}"]
+    if sql_id:
+        conditions.append(f"sql_id = {quote(sql_id)}")
+    query = f'SELECT * FROM "oracle_sql_activity" WHERE {" AND ".join(conditions)}{connection_filter(connection_id)} ORDER BY time ASC'
+    try:
+        return [{k: v for k, v in r.items() if k != 'connection_id'} for r in run_influxql(query)]
+    except Exception as e:
+        print(f"Error querying SQL activity from InfluxDB: {e}")
+        return []
+
+def get_wait_class_history(start_time_iso, end_time_iso, connection_id=None):
+    """Active sessions per wait class over a time range."""
+    backend = get_storage_backend()
+    if backend:
+        return backend.get_wait_class_history(start_time_iso, end_time_iso, connection_id)
+
+    query = f'SELECT sessions, wait_class FROM "oracle_wait_class" WHERE time >= {quote(start_time_iso)} AND time <= {quote(end_time_iso)}{connection_filter(connection_id)} ORDER BY time ASC'
+    try:
+        return [{"time": r['time'], "wait_class": r.get('wait_class'), "sessions": int(r.get('sessions') or 0)}
+                for r in run_influxql(query)]
+    except Exception as e:
+        print(f"Error querying wait class history from InfluxDB: {e}")
+        return []
@@ -0,0 +1,365 @@
+import os
+import json
+import glob
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+from .utils import DB_PATH
+from .timemachine_mod import (
+    sql_activity_stats, wait_class_counts, replay_sessions, parse_time, to_compact
+)
+
+# Embedded time machine store (TIMEMACHINE_STORAGE=sqlite).
+# Snapshots go to one SQLite file per UTC day under TIMEMACHINE_DATA_DIR, in WAL
+# mode, with the same normalized layout as the InfluxDB measurements. Every table
+# is indexed on (connection_id, ts), ts being epoch seconds, so range and
+# "latest at or before" lookups only touch the partitions that cover the period.
+# Retention drops whole partition files; closed partitions are compacted once.
+DATA_DIR = os.getenv("TIMEMACHINE_DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "timemachine")
+RETENTION_DAYS = int(os.getenv("TIMEMACHINE_RETENTION_DAYS", "7"))
+MAINTENANCE_INTERVAL = int(os.getenv("TIMEMACHINE_MAINTENANCE_INTERVAL", "3600"))
+
+PARTITION_PREFIX = "tm_"
+PARTITION_SUFFIX = ".sqlite"
+
+# user_version of a partition once it has been compacted
+COMPACTED = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    ts REAL NOT NULL,
+    connection_id INTEGER,
+    connection_name TEXT,
+    session_count INTEGER,
+    active_sessions INTEGER,
+    long_ops_count INTEGER,
+    blocking_count INTEGER,
+    keyframe INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_conn_ts ON snapshots (connection_id, ts);
+CREATE INDEX IF NOT EXISTS idx_snapshots_ts ON snapshots (ts);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    ts REAL NOT NULL,
+    connection_id INTEGER,
+    pos INTEGER,
+    inst_id INTEGER,
+    sid INTEGER,
+    serial INTEGER,
+    username TEXT,
+    status TEXT,
+    wait_class TEXT,
+    event TEXT,
+    sql_id TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_conn_ts ON sessions (connection_id, ts);
+CREATE INDEX IF NOT EXISTS idx_sessions_ts ON sessions (ts);
+
+CREATE TABLE IF NOT EXISTS long_ops (ts REAL NOT NULL, connection_id INTEGER, pos INTEGER, data TEXT);
+CREATE INDEX IF NOT EXISTS idx_long_ops_conn_ts ON long_ops (connection_id, ts);
+
+CREATE TABLE IF NOT EXISTS blocking (ts REAL NOT NULL, connection_id INTEGER, pos INTEGER, data TEXT);
+CREATE INDEX IF NOT EXISTS idx_blocking_conn_ts ON blocking (connection_id, ts);
+
+CREATE TABLE IF NOT EXISTS sql_activity (
+    ts REAL NOT NULL,
+    connection_id INTEGER,
+    sql_id TEXT,
+    sessions INTEGER,
+    active INTEGER,
+    cpu REAL,
+    last_call_et_max REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sql_activity_conn_ts ON sql_activity (connection_id, ts);
+
+CREATE TABLE IF NOT EXISTS wait_class (ts REAL NOT NULL, connection_id INTEGER, wait_class TEXT, sessions INTEGER);
+CREATE INDEX IF NOT EXISTS idx_wait_class_conn_ts ON wait_class (connection_id, ts);
+"""
+
+_write_lock = threading.Lock()
+_ready_partitions = set()
+_last_maintenance = None
+
+# --- Partitions ---
+
+def _day(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%d")
+
+def _partition_path(day):
+    return os.path.join(DATA_DIR, f"{PARTITION_PREFIX}{day}{PARTITION_SUFFIX}")
+
+def _list_partitions():
+    """(day, path) of every partition file, oldest first."""
+    partitions = []
+    for path in glob.glob(os.path.join(DATA_DIR, f"{PARTITION_PREFIX}*{PARTITION_SUFFIX}")):
+        day = os.path.basename(path)[len(PARTITION_PREFIX):-len(PARTITION_SUFFIX)]
+        if day.isdigit() and len(day) == 8:
+            partitions.append((day, path))
+    partitions.sort()
+    return partitions
+
+def _partitions_between(start_ts, end_ts):
+    first, last = _day(start_ts), _day(end_ts)
+    return [path for day, path in _list_partitions() if first <= day <= last]
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _open_partition(ts):
+    """Connection to the partition holding ts, creating it on first use."""
+    path = _partition_path(_day(ts))
+    if path not in _ready_partitions:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        conn = _connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        _ready_partitions.add(path)
+        return conn
+    return _connect(path)
+
+# --- Time conversion ---
+
+def to_epoch(time_iso):
+    dt = parse_time(time_iso)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def to_iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+# --- Writes ---
+
+def _dumps(row):
+    return json.dumps(row, default=str)
+
+def write_snapshot(sessions, long_ops, blocking, timestamp, connection_id, connection_name, frame):
+    """Writes one snapshot (already planned by timemachine_mod.plan_session_frame) in a single transaction."""
+    is_keyframe, session_rows, removed_keys = frame
+    ts = timestamp.timestamp()
+    conn_id = int(connection_id) if connection_id is not None else None
+
+    session_values = [
+        (ts, conn_id, pos, s.get('inst_id'), s.get('sid'), s.get('serial#'), s.get('username'), s.get('status'),
+         s.get('wait_class'), s.get('event'), s.get('sql_id'), _dumps(s))
+        for pos, s in enumerate(session_rows)
+    ]
+    for inst_id, sid, serial in removed_keys:
+        marker = {"inst_id": inst_id, "sid": sid, "serial#": serial, "removed": True}
+        session_values.append((ts, conn_id, -1, inst_id, sid, serial, None, None, None, None, None, _dumps(marker)))
+
+    with _write_lock:
+        conn = _open_partition(ts)
+        try:
+            conn.execute(
+                "INSERT INTO snapshots (ts, connection_id, connection_name, session_count, active_sessions, "
+                "long_ops_count, blocking_count, keyframe) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (ts, conn_id, connection_name, len(sessions),
+                 len([s for s in sessions if s.get('status') == 'ACTIVE']),
+                 len(long_ops), len(blocking), 1 if is_keyframe else 0)
+            )
+            conn.executemany(
+                "INSERT INTO sessions (ts, connection_id, pos, inst_id, sid, serial, username, status, "
+                "wait_class, event, sql_id, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                session_values
+            )
+            conn.executemany(
+                "INSERT INTO long_ops (ts, connection_id, pos, data) VALUES (?, ?, ?, ?)",
+                [(ts, conn_id, pos, _dumps(row)) for pos, row in enumerate(long_ops)]
+            )
+            conn.executemany(
+                "INSERT INTO blocking (ts, connection_id, pos, data) VALUES (?, ?, ?, ?)",
+                [(ts, conn_id, pos, _dumps(row)) for pos, row in enumerate(blocking)]
+            )
+            conn.executemany(
+                "INSERT INTO sql_activity (ts, connection_id, sql_id, sessions, active, cpu, last_call_et_max) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(ts, conn_id, sql_id, agg["sessions"], agg["active"], agg["cpu"], agg["last_call_et_max"])
+                 for sql_id, agg in sql_activity_stats(sessions).items()]
+            )
+            conn.executemany(
+                "INSERT INTO wait_class (ts, connection_id, wait_class, sessions) VALUES (?, ?, ?, ?)",
+                [(ts, conn_id, wait_class, count) for wait_class, count in wait_class_counts(sessions).items()]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    if _last_maintenance is None or time.monotonic() - _last_maintenance >= MAINTENANCE_INTERVAL:
+        run_maintenance()
+
+# --- Retention and compaction ---
+
+def run_maintenance():
+    """Drops partitions past the retention period and compacts closed (previous days') partitions once."""
+    global _last_maintenance
+    with _write_lock:
+        _last_maintenance = time.monotonic()
+        today = _day(time.time())
+        oldest_kept = (datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)).strftime("%Y%m%d")
+        for day, path in _list_partitions():
+            try:
+                if day < oldest_kept:
+                    for suffix in ("", "-wal", "-shm"):
+                        if os.path.exists(path + suffix):
+                            os.remove(path + suffix)
+                    _ready_partitions.discard(path)
+                    print(f"Time Machine: dropped partition {os.path.basename(path)} (retention {RETENTION_DAYS} days)")
+                elif day < today:
+                    _compact_partition(path)
+            except Exception as e:
+                print(f"Time Machine: maintenance failed for {os.path.basename(path)}: {e}")
+
+def _compact_partition(path):
+    conn = _connect(path)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= COMPACTED:
+            return
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+        conn.execute(f"PRAGMA user_version = {COMPACTED}")
+        conn.commit()
+        print(f"Time Machine: compacted partition {os.path.basename(path)}")
+    finally:
+        conn.close()
+
+def get_storage_info():
+    """Partition files with their size on disk."""
+    partitions = []
+    for day, path in _list_partitions():
+        size = sum(os.path.getsize(path + s) for s in ("", "-wal", "-shm") if os.path.exists(path + s))
+        partitions.append({"day": day, "bytes": size})
+    return {"data_dir": DATA_DIR, "retention_days": RETENTION_DAYS, "partitions": partitions}
+
+# --- Queries ---
+
+def _select(table, columns, start_ts, end_ts, connection_id=None, filters=None, limit=None, descending=False):
+    """Rows of table between start_ts and end_ts across the partitions covering the range."""
+    conditions = ["ts >= ?", "ts <= ?"]
+    params = [start_ts, end_ts]
+    if connection_id is not None:
+        conditions.append("connection_id = ?")
+        params.append(int(connection_id))
+    for column, value in (filters or {}).items():
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    order = "ts DESC, rowid DESC" if descending else "ts, rowid"
+    sql = f"SELECT {columns} FROM {table} WHERE {' AND '.join(conditions)} ORDER BY {order}"
+
+    partitions = _partitions_between(start_ts, end_ts)
+    if descending:
+        partitions.reverse()
+    rows = []
+    for path in partitions:
+        remaining = None if limit is None else limit - len(rows)
+        if remaining is not None and remaining <= 0:
+            break
+        conn = _connect(path)
+        try:
+            query = sql if remaining is None else f"{sql} LIMIT {int(remaining)}"
+            rows.extend(conn.execute(query, params).fetchall())
+        finally:
+            conn.close()
+    return rows
+
+def _latest_snapshot(before_ts, connection_id=None, keyframe_only=False):
+    """Most recent summary row at or before before_ts, looking back through older partitions."""
+    filters = {"keyframe": 1} if keyframe_only else None
+    rows = _select("snapshots", "*", 0, before_ts, connection_id, filters, limit=1, descending=True)
+    return rows[0] if rows else None
+
+def get_history_range(start_time_iso, end_time_iso, connection_id=None):
+    """Session counts per snapshot in a time range, for the timeline."""
+    try:
+        rows = _select("snapshots", "ts, session_count, active_sessions",
+                       to_epoch(start_time_iso), to_epoch(end_time_iso), connection_id)
+        return [{
+            "time": to_iso(r['ts']),
+            "session_count": int(r['session_count'] or 0),
+            "active_sessions": int(r['active_sessions'] or 0)
+        } for r in rows]
+    except Exception as e:
+        print(f"Error querying history from the local time machine store: {e}")
+        return []
+
+def _stored_rows(table, ts, connection_id):
+    return [json.loads(r['data']) for r in _select(table, "data", ts, ts, connection_id)]
+
+def get_snapshot_at_time(target_time_iso, connection_id=None, compact=False):
+    """Rebuilds the snapshot closest to (at or before) a timestamp from its keyframe and deltas."""
+    try:
+        summary = _latest_snapshot(to_epoch(target_time_iso), connection_id)
+        if summary is None:
+            return None
+        snapshot_ts = summary['ts']
+        keyframe_ts = snapshot_ts
+        if not summary['keyframe']:
+            keyframe = _latest_snapshot(snapshot_ts, connection_id, keyframe_only=True)
+            if keyframe is not None:
+                keyframe_ts = keyframe['ts']
+
+        snapshot_time = to_iso(snapshot_ts)
+        session_points = [
+            {"time": to_iso(r['ts']), "position": r['pos'], **json.loads(r['data'])}
+            for r in _select("sessions", "ts, pos, data", keyframe_ts, snapshot_ts, connection_id)
+        ]
+        snapshot = {
+            "time": snapshot_time,
+            "sessions": replay_sessions(session_points, snapshot_time),
+            "long_ops": _stored_rows("long_ops", snapshot_ts, connection_id),
+            "blocking": _stored_rows("blocking", snapshot_ts, connection_id)
+        }
+        if compact:
+            for key in ("sessions", "long_ops", "blocking"):
+                snapshot[key] = to_compact(snapshot[key])
+        return snapshot
+    except Exception as e:
+        print(f"Error querying snapshot from the local time machine store: {e}")
+        return None
+
+def get_session_history(start_time_iso, end_time_iso, connection_id=None, username=None, event=None,
+                        wait_class=None, sql_id=None, status=None, limit=5000):
+    """Stored session rows in a time range, filtered on the indexed session columns."""
+    filters = {"username": username, "event": event, "wait_class": wait_class, "sql_id": sql_id, "status": status}
+    try:
+        rows = _select("sessions", "ts, data", to_epoch(start_time_iso), to_epoch(end_time_iso),
+                       connection_id, filters, limit=int(limit))
+        history = []
+        for r in rows:
+            row = json.loads(r['data'])
+            if row.get('removed'):
+                continue
+            history.append({"time": to_iso(r['ts']), **{k: v for k, v in row.items() if v is not None}})
+        return history
+    except Exception as e:
+        print(f"Error querying session history from the local time machine store: {e}")
+        return []
+
+def get_sql_activity(start_time_iso, end_time_iso, connection_id=None, sql_id=None):
+    """Per-sql_id aggregates over a time range."""
+    try:
+        rows = _select("sql_activity", "ts, sql_id, sessions, active, cpu, last_call_et_max",
+                       to_epoch(start_time_iso), to_epoch(end_time_iso), connection_id, {"sql_id": sql_id})
+        return [{"time": to_iso(r['ts']), **{k: r[k] for k in r.keys() if k != 'ts'}} for r in rows]
+    except Exception as e:
+        print(f"Error querying SQL activity from the local time machine store: {e}")
+        return []
+
+def get_wait_class_history(start_time_iso, end_time_iso, connection_id=None):
+    """Active sessions per wait class over a time range."""
+    try:
+        rows = _select("wait_class", "ts, wait_class, sessions",
+                       to_epoch(start_time_iso), to_epoch(end_time_iso), connection_id)
+        return [{"time": to_iso(r['ts']), "wait_class": r['wait_class'], "sessions": int(r['sessions'] or 0)}
+                for r in rows]
+    except Exception as e:
+        print(f"Error querying wait class history from the local time machine store: {e}")
+        return []
@@ -0,0 +1,125 @@
+import os
+import functools
+import contextlib
+
+try:
+    from opentelemetry import trace, propagate
+    from opentelemetry.trace import SpanKind
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+except ImportError:
+    trace = None
+
+# OpenTelemetry tracing.
+# A span per HTTP request with child spans for the SQLite lookup of the active
+# connection, Oracle connect, execute and fetch, SQL template loading, JSON
+# serialization and InfluxDB writes and queries, so a slow endpoint can be broken
+# down into where its time went. Spans are exported over OTLP/HTTP to
+# OTEL_EXPORTER_OTLP_ENDPOINT (the collector in docker_rockdb/otel); without
+# that setting, or without the opentelemetry packages, every helper is a no-op.
+TRACING_ENABLED = (
+    trace is not None
+    and bool(os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"))
+    and os.getenv("OTEL_SDK_DISABLED", "false").lower() != "true"
+)
+# Characters of SQL text kept in db.statement (bind values are never recorded)
+STATEMENT_CHARS = int(os.getenv("ROCKDB_TRACE_STATEMENT_CHARS", "1000"))
+
+_tracer = None
+if TRACING_ENABLED:
+    _provider = TracerProvider(resource=Resource.create({
+        "service.name": os.getenv("OTEL_SERVICE_NAME", "rockdb-backend")
+    }))
+    _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("rockdb")
+    print(f"Tracing enabled, exporting to {os.getenv('OTEL_EXPORTER_OTLP_TRACES_ENDPOINT') or os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT')}")
+
+class _NoSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+_NO_SPAN = contextlib.nullcontext(_NoSpan())
+
+def span(name, attributes=None):
+    """Child span of the current span (attributes with a None value are left out)."""
+    if not TRACING_ENABLED:
+        return _NO_SPAN
+    return _tracer.start_as_current_span(name, attributes={
+        key: value for key, value in (attributes or {}).items() if value is not None
+    })
+
+def traced(name):
+    """Decorator running a function in a span of its own."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, {"code.function": fn.__name__}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- SQL files ---
+# Statements read from the script library are remembered with their file, so the
+# execute span of that text can name it (rockdb.sql_file)
+_sql_files = {}
+SQL_FILES_MAX = 1024
+
+def note_sql_file(sql_text, rel_path):
+    if TRACING_ENABLED:
+        if len(_sql_files) >= SQL_FILES_MAX:
+            _sql_files.clear()
+        _sql_files[sql_text] = rel_path
+    return sql_text
+
+def query_span(name, query, statement=None):
+    """Span of an Oracle call made for query (the calling *_mod function)."""
+    if not TRACING_ENABLED:
+        return _NO_SPAN
+    attributes = {"db.system": "oracle", "code.function": query}
+    if isinstance(statement, str):
+        attributes["db.statement"] = statement[:STATEMENT_CHARS]
+        sql_file = _sql_files.get(statement)
+        if sql_file:
+            attributes["rockdb.sql_file"] = sql_file
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+# --- Requests ---
+class TracingMiddleware:
+    """ASGI middleware opening the server span of each HTTP request (W3C traceparent is honoured)."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        method = scope["method"]
+        with _tracer.start_as_current_span(
+            f"{method} {scope['path']}", context=propagate.extract(headers), kind=SpanKind.SERVER,
+            attributes={"http.method": method, "http.target": scope["path"]}
+        ) as request_span:
+            sent = {"bytes": 0}
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    request_span.set_attribute("http.status_code", message["status"])
+                elif message["type"] == "http.response.body":
+                    sent["bytes"] += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if getattr(route, "path", None):
+                    # Named after the route template, like the latency metrics
+                    request_span.update_name(f"{method} {route.path}")
+                    request_span.set_attribute("http.route", route.path)
+                request_span.set_attribute("http.response.body.size", sent["bytes"])
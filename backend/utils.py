@@ -3,8 +3,16 @@ import sqlite3
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 import oracledb
-import traceback
 import sys
+import threading
+import logging
+import time
+import socket
+import contextvars
+from .metrics_mod import (
+    MeteredConnection, register_gauge, ORACLE_CONNECT_SECONDS, ORACLE_CONNECT_ERRORS
+)
+from .tracing_mod import span
 
 load_dotenv()
 
@@ -143,7 +151,9 @@ def init_db():
             connection_role TEXT DEFAULT 'NORMAL',
             connect_string TEXT,
             wallet_path TEXT,
-            tns_admin TEXT
+            tns_admin TEXT,
+            timemachine_enabled BOOLEAN DEFAULT 1,
+            timemachine_interval INTEGER
         )
     """)
     
@@ -199,6 +209,21 @@ def init_db():
         )
     """)
     
+    # Files already registered by seed_sql_scripts, so a sync only touches changed entries,
+    # with the rowid of their content in the search index (sql_search_mod)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sql_manifest (
+            rel_path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            fts_rowid INTEGER
+        )
+    """)
+    cursor.execute("PRAGMA table_info(sql_manifest)")
+    if "fts_rowid" not in [col[1] for col in cursor.fetchall()]:
+        print("Adding column fts_rowid to sql_manifest table...")
+        cursor.execute("ALTER TABLE sql_manifest ADD COLUMN fts_rowid INTEGER")
+
     # Migration: Ensure link_url is unique for existing databases
     try:
         cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_cfgmenu_link_url ON cfgmenu(link_url)")
@@ -231,7 +256,9 @@ def init_db():
         ("connection_role", "TEXT"),
         ("connect_string", "TEXT"),
         ("wallet_path", "TEXT"),
-        ("tns_admin", "TEXT")
+        ("tns_admin", "TEXT"),
+        ("timemachine_enabled", "BOOLEAN DEFAULT 1"),
+        ("timemachine_interval", "INTEGER")
     ]
     
     server_columns_to_add = [
@@ -263,112 +290,347 @@ def init_db():
     conn.close()
 
 # Oracle connectivity helper
-def get_oracle_connection(conn_info):
+# Connection diagnostics go through the "rockdb.oracle" logger. The level is
+# set with ROCKDB_CONNECT_LOG_LEVEL (DEBUG adds wallet directory contents).
+oracle_logger = logging.getLogger("rockdb.oracle")
+oracle_logger.setLevel(os.getenv("ROCKDB_CONNECT_LOG_LEVEL", "INFO").upper())
+if not oracle_logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stdout)
+    _log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    oracle_logger.addHandler(_log_handler)
+    oracle_logger.propagate = False
+
+ROLE_AUTH_MODES = {
+    'SYSDBA': 'AUTH_MODE_SYSDBA',
+    'SYSOPER': 'AUTH_MODE_SYSOPER',
+    'SYSBACKUP': 'AUTH_MODE_SYSBACKUP',
+    'SYSDG': 'AUTH_MODE_SYSDG',
+    'SYSKM': 'AUTH_MODE_SYSKM'
+}
+
+# Fields that change the identity of the underlying Oracle session
+POOL_SIGNATURE_FIELDS = (
+    "host", "port", "service", "username", "password", "connection_role",
+    "connect_string", "wallet_path", "tns_admin"
+)
+
+def pool_signature(conn_info):
+    return tuple(conn_info.get(f) for f in POOL_SIGNATURE_FIELDS)
+
+def normalize_dsn(conn_info):
+    # Connection String is the primary source
+    if conn_info.get('connect_string'):
+        dsn = conn_info['connect_string'].strip()
+        # If the string starts with "ALIAS = (DESCRIPTION...", strip the leading "ALIAS =" part
+        if '=' in dsn and dsn.upper().startswith(tuple(c for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")):
+            parts = dsn.split('=', 1)
+            if len(parts) > 1 and '(DESCRIPTION' in parts[1].upper():
+                dsn = parts[1].strip()
+        return dsn
+    # Fallback to Basic Attributes
+    return f"{conn_info['host']}:{conn_info['port']}/{conn_info['service']}"
+
+def _log_connect_diagnostics(conn_info, dsn, role):
+    """Logs the resolved connection environment once per connection profile."""
+    tns_admin = conn_info.get('tns_admin')
+    wallet_path = conn_info.get('wallet_path')
+    tns_admin_exists = os.path.exists(tns_admin) if tns_admin else None
+    wallet_exists = os.path.exists(wallet_path) if wallet_path else None
+
+    oracle_logger.info(
+        "Oracle connection profile resolved: id=%s name=%s dsn=%s user=%s role=%s "
+        "env_tns_admin=%s tns_admin=%s tns_admin_exists=%s wallet_path=%s wallet_exists=%s",
+        conn_info.get('id'), conn_info.get('name'), dsn, conn_info['username'], role,
+        os.environ.get('TNS_ADMIN', 'NOT SET'), tns_admin or 'NOT SET', tns_admin_exists,
+        wallet_path or 'NOT SET', wallet_exists
+    )
+    if wallet_path:
+        if not wallet_exists:
+            oracle_logger.warning(
+                "Wallet path %s not found for connection %s. Suggested persistent wallet folder is "
+                "/opt/rockdbweb/wallets (shared with host)", wallet_path, conn_info.get('name'))
+        elif oracle_logger.isEnabledFor(logging.DEBUG):
+            oracle_logger.debug("Wallet files for connection %s: %s", conn_info.get('name'), os.listdir(wallet_path))
+
+def build_connect_params(conn_info):
+    """Resolves DSN, role and wallet settings of a connection profile into oracledb connect kwargs."""
+    password = decrypt_password(conn_info['password'])
+    
+    # Set TNS_ADMIN if provided (directory containing tnsnames.ora, sqlnet.ora)
+    tns_admin = conn_info.get('tns_admin')
+    if tns_admin and os.path.exists(tns_admin):
+        os.environ['TNS_ADMIN'] = tns_admin
+    else:
+        tns_admin = None
+
+    dsn = normalize_dsn(conn_info)
+    
+    # Determine Role / Internal Logon
+    role = (conn_info.get('connection_role') or 'NORMAL').upper()
+    
+    _log_connect_diagnostics(conn_info, dsn, role)
+
+    internal_logon = None
+    if role != 'NORMAL':
+        # Map roles to oracledb constants safely using getattr
+        internal_logon = getattr(oracledb, ROLE_AUTH_MODES.get(role, ''), None)
+        if internal_logon is None:
+            oracle_logger.warning("Constant for role %s not found in this version of oracledb. Connection might fail if privs required.", role)
+
+    # Prepare connection parameters
+    wallet_path = conn_info.get('wallet_path') or None
+    connect_params = {
+        "user": conn_info['username'],
+        "password": password,
+        "dsn": dsn,
+        "tcp_connect_timeout": 5,
+        # The environment variable is process-wide, so pass the directory explicitly too
+        "config_dir": wallet_path or tns_admin,
+        "wallet_location": wallet_path,
+        "wallet_password": password if wallet_path else None
+    }
+    
+    # Add mode only if connecting as a special role (SYSDBA, etc)
+    if internal_logon:
+        connect_params["mode"] = internal_logon
+
+    return connect_params
+
+# Pre-resolved connect parameters keyed by connection id: after the first call
+# the connect path does no filesystem, crypto or string work.
+_connect_params_cache = {}
+_connect_params_lock = threading.Lock()
+
+def get_connect_params(conn_info):
+    """Returns cached connect kwargs for a saved connection (built on first use)."""
+    conn_id = conn_info.get('id')
+    if not conn_id:
+        return build_connect_params(conn_info)
+    signature = pool_signature(conn_info)
+    entry = _connect_params_cache.get(conn_id)
+    if entry and entry[0] == signature:
+        return entry[1]
+    with _connect_params_lock:
+        params = build_connect_params(conn_info)
+        _connect_params_cache[conn_id] = (signature, params)
+    return params
+
+def invalidate_connect_params(conn_id):
+    with _connect_params_lock:
+        _connect_params_cache.pop(conn_id, None)
+
+# Session pools (one per saved connection id)
+# Sizing can be tuned through the environment; sessions are pinged on acquire
+# when they have been idle longer than ORACLE_POOL_PING_INTERVAL seconds.
+POOL_MIN = int(os.getenv("ORACLE_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("ORACLE_POOL_MAX", "8"))
+POOL_INCREMENT = int(os.getenv("ORACLE_POOL_INCREMENT", "1"))
+POOL_PING_INTERVAL = int(os.getenv("ORACLE_POOL_PING_INTERVAL", "30"))
+POOL_WAIT_TIMEOUT_MS = int(os.getenv("ORACLE_POOL_WAIT_TIMEOUT_MS", "10000"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Callbacks run with the connection id whenever its pools must be drained
+# (e.g. the asyncio pools kept by oracle_async)
+_pool_close_hooks = []
+
+def register_pool_close_hook(hook):
+    _pool_close_hooks.append(hook)
+
+def get_oracle_pool(conn_info):
+    """
+    Returns the session pool for a saved connection, creating it on first use.
+    If the stored connection settings changed since the pool was built, the old
+    pool is drained and a new one is created.
+    """
+    conn_id = conn_info['id']
+    signature = pool_signature(conn_info)
+    stale_pool = None
+    with _pools_lock:
+        entry = _pools.get(conn_id)
+        if entry and entry[1] == signature:
+            return entry[0]
+        if entry:
+            stale_pool = entry[0]
+
+        oracle_logger.info("Creating Oracle session pool for connection %s (%s): min=%s max=%s increment=%s",
+                           conn_id, conn_info.get('name'), POOL_MIN, POOL_MAX, POOL_INCREMENT)
+        pool = oracledb.create_pool(
+            min=POOL_MIN,
+            max=POOL_MAX,
+            increment=POOL_INCREMENT,
+            ping_interval=POOL_PING_INTERVAL,
+            getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+            wait_timeout=POOL_WAIT_TIMEOUT_MS,
+            connectiontype=MeteredConnection,
+            **get_connect_params(conn_info)
+        )
+        _pools[conn_id] = (pool, signature)
+
+    if stale_pool:
+        _close_pool(conn_id, stale_pool)
+    return pool
+
+def _close_pool(conn_id, pool):
     try:
-        password = decrypt_password(conn_info['password'])
-        
-        # Set TNS_ADMIN if provided (directory containing tnsnames.ora, sqlnet.ora)
-        tns_admin = conn_info.get('tns_admin')
-        if tns_admin and os.path.exists(tns_admin):
-            os.environ['TNS_ADMIN'] = tns_admin
-
-        # Determine DSN - Connection String is the primary source
-        if conn_info.get('connect_string'):
-            dsn = conn_info['connect_string'].strip()
-            # If the string starts with "ALIAS = (DESCRIPTION...", strip the leading "ALIAS =" part
-            if '=' in dsn and dsn.upper().startswith(tuple(c for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")):
-                parts = dsn.split('=', 1)
-                if len(parts) > 1 and '(DESCRIPTION' in parts[1].upper():
-                    dsn = parts[1].strip()
-        else:
-            # Fallback to Basic Attributes
-            dsn = f"{conn_info['host']}:{conn_info['port']}/{conn_info['service']}"
-        
-        # Determine Role / Internal Logon
-        role = (conn_info.get('connection_role') or 'NORMAL').upper()
-        
-        # LOGGING FOR DEBUGGING
-        print("--- Oracle Connection Environment ---", flush=True)
-        print(f"Connection Name : {conn_info.get('name')}", flush=True)
-        print(f"DSN / String    : {dsn}", flush=True)
-        print(f"Current User    : {conn_info['username']}", flush=True)
-        print(f"Requested Role  : {role}", flush=True)
-        
-        # TNS_ADMIN Details
-        env_tns_admin = os.environ.get('TNS_ADMIN', 'NOT SET')
-        tns_admin_field = conn_info.get('tns_admin')
-        print(f"ENV TNS_ADMIN   : {env_tns_admin}", flush=True)
-        if tns_admin_field:
-             exists = os.path.exists(tns_admin_field)
-             print(f"Field TNS_ADMIN : {tns_admin_field} (Exists: {exists})", flush=True)
-        
-        # Wallet Details
-        wallet_path = conn_info.get('wallet_path', 'NOT SET')
-        print(f"Wallet Path     : {wallet_path}", flush=True)
-        if conn_info.get('wallet_path'):
-             exists = os.path.exists(conn_info['wallet_path'])
-             print(f"Wallet Valid    : {exists}", flush=True)
-             if exists:
-                  print(f"Wallet Files    : {os.listdir(conn_info['wallet_path'])}", flush=True)
-             else:
-                  print("Tip: Suggested persistent wallet folder is /opt/rockdbweb/wallets (shared with host)", flush=True)
-        print("-------------------------------------", flush=True)
-
-        internal_logon = None
-        if role != 'NORMAL':
-            # Map roles to oracledb constants safely using getattr
-            role_map = {
-                'SYSDBA': getattr(oracledb, 'AUTH_MODE_SYSDBA', None),
-                'SYSOPER': getattr(oracledb, 'AUTH_MODE_SYSOPER', None),
-                'SYSBACKUP': getattr(oracledb, 'AUTH_MODE_SYSBACKUP', None),
-                'SYSDG': getattr(oracledb, 'AUTH_MODE_SYSDG', None),
-                'SYSKM': getattr(oracledb, 'AUTH_MODE_SYSKM', None)
-            }
-            internal_logon = role_map.get(role)
-            if internal_logon is None:
-                print(f"Warning: Constant for role {role} not found in this version of oracledb. Connection might fail if privs required.", flush=True)
-
-        # Prepare connection parameters
-        connect_params = {
-            "user": conn_info['username'],
-            "password": password,
-            "dsn": dsn,
-            "tcp_connect_timeout": 5,
-            "config_dir": conn_info.get('wallet_path') if conn_info.get('wallet_path') else None,
-            "wallet_location": conn_info.get('wallet_path') if conn_info.get('wallet_path') else None,
-            "wallet_password": password if conn_info.get('wallet_path') else None
-        }
-        
-        # Add mode only if connecting as a special role (SYSDBA, etc)
-        if internal_logon:
-            connect_params["mode"] = internal_logon
-
-        connection = oracledb.connect(**connect_params)
+        pool.close(force=True)
+        oracle_logger.info("Drained Oracle session pool for connection %s", conn_id)
+    except Exception as e:
+        oracle_logger.error("Error draining Oracle session pool for connection %s: %s", conn_id, e)
+
+def close_oracle_pool(conn_id):
+    """Drains and discards the session pool of a connection (called on update/delete)."""
+    with _pools_lock:
+        entry = _pools.pop(conn_id, None)
+    if entry:
+        _close_pool(conn_id, entry[0])
+    for hook in _pool_close_hooks:
+        try:
+            hook(conn_id)
+        except Exception as e:
+            oracle_logger.error("Error in pool close hook for connection %s: %s", conn_id, e)
+
+def close_all_oracle_pools():
+    with _pools_lock:
+        entries = list(_pools.items())
+        _pools.clear()
+    for conn_id, (pool, _) in entries:
+        _close_pool(conn_id, pool)
+
+def _pool_sessions():
+    for conn_id, (pool, _) in list(_pools.items()):
+        yield (conn_id, "busy"), pool.busy
+        yield (conn_id, "opened"), pool.opened
+
+register_gauge("rockdb_oracle_pool_sessions", "Sessions of the connection pools, busy and opened",
+               _pool_sessions, labels=("connection_id", "state"))
+
+# --- Session attribution ---
+# Every session handed out is tagged so RockDB's own load can be told apart from
+# the application's in gv$session, gv$sql and ASH: MODULE is ORACLE_MODULE,
+# ACTION the endpoint serving the request (set per request by FastJSONRoute) or
+# the background task, CLIENT_IDENTIFIER this RockDB instance. The driver sends
+# them along with the next round-trip.
+ORACLE_MODULE = os.getenv("ROCKDB_ORACLE_MODULE", "RockDB")
+ORACLE_CLIENT_IDENTIFIER = os.getenv("ROCKDB_ORACLE_CLIENT_IDENTIFIER") or f"rockdb@{socket.gethostname()}"
+oracle_action = contextvars.ContextVar("oracle_action", default="background")
+
+def tag_connection(connection, action=None):
+    # DBMS_APPLICATION_INFO limits: module 48 bytes, action 32, client identifier 64
+    connection.module = ORACLE_MODULE[:48]
+    connection.action = (action or oracle_action.get())[:32]
+    connection.client_identifier = ORACLE_CLIENT_IDENTIFIER[:64]
+
+def get_oracle_connection(conn_info, pooled=True, action=None):
+    """
+    Returns an Oracle connection for the given connection profile.
+    Saved connections (with an id) borrow a session from their pool; calling
+    close() on it returns the session to the pool. Unsaved profiles, or
+    pooled=False (connection tests with edited settings, ad-hoc SQL), open a
+    standalone connection. action overrides the ACTION tag (see tag_connection).
+    """
+    mode = "pool" if pooled and conn_info.get('id') else "direct"
+    start = time.perf_counter()
+    try:
+        with span("oracle.connect", {"db.system": "oracle", "rockdb.connect_mode": mode,
+                                     "rockdb.connection": conn_info.get('name')}):
+            if mode == "pool":
+                connection = get_oracle_pool(conn_info).acquire()
+            else:
+                params = get_connect_params(conn_info) if pooled else build_connect_params(conn_info)
+                connection = oracledb.connect(conn_class=MeteredConnection, **params)
+        ORACLE_CONNECT_SECONDS.labels(mode).observe(time.perf_counter() - start)
+        connection.outputtypehandler = output_type_handler
+        tag_connection(connection, action)
         return connection
     except Exception as e:
-        print(f"!!! Error connecting to Oracle: {str(e)}", flush=True)
-        print("Full Traceback:", flush=True)
-        traceback.print_exc(file=sys.stdout)
+        ORACLE_CONNECT_ERRORS.labels(mode).inc()
+        oracle_logger.exception("Error connecting to Oracle (connection %s): %s", conn_info.get('name'), e)
         raise e
 
-def safe_value(v):
+# --- Typed fetch ---
+# Connections handed out by get_oracle_connection (and the async pools) fetch
+# values that are ready for the JSON encoder: CLOB/NCLOB as str and BLOB as bytes
+# inline with the row instead of a LOB locator read one round-trip per cell, and
+# RAW (addresses, hashes) as an upper-case hex string.
+# Large result sets can raise the rows fetched per round-trip with query_cursor().
+GRID_ARRAYSIZE = int(os.getenv("ORACLE_GRID_ARRAYSIZE", "500"))
+
+def _raw_to_hex(value):
+    return value.hex().upper()
+
+def output_type_handler(cursor, metadata):
+    type_code = metadata.type_code
+    if type_code is oracledb.DB_TYPE_CLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    if type_code is oracledb.DB_TYPE_NCLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_NVARCHAR, arraysize=cursor.arraysize)
+    if type_code is oracledb.DB_TYPE_BLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    if type_code is oracledb.DB_TYPE_RAW:
+        return cursor.var(oracledb.DB_TYPE_RAW, metadata.internal_size, arraysize=cursor.arraysize,
+                          outconverter=_raw_to_hex)
+
+def query_cursor(connection, arraysize=None, prefetchrows=None):
     """
-    Safely converts Oracle-specific data types (LOBs, RAWs/bytes) 
-    to JSON-serializable formats for FastAPI.
+    Cursor tuned for one query: arraysize is the number of rows per fetch
+    round-trip, prefetchrows the rows returned together with the execute.
     """
-    if v is None:
-        return v
-    # Handle Oracle LOB objects (CLOB/BLOB)
-    if hasattr(v, 'read'):
-        try:
-            return v.read()
-        except Exception as e:
-            return f"-- Error reading LOB: {str(e)} --"
-    # Handle RAW/Bytes - FastAPI jsonable_encoder fails on non-UTF8 bytes
-    if isinstance(v, bytes):
-        try:
-            return v.decode('utf-8')
-        except UnicodeDecodeError:
-            # For memory addresses and other binary data, use Hex
-            return v.hex().upper()
-    return v
+    cursor = connection.cursor()
+    if arraysize:
+        cursor.arraysize = arraysize
+        cursor.prefetchrows = arraysize if prefetchrows is None else prefetchrows
+    elif prefetchrows is not None:
+        cursor.prefetchrows = prefetchrows
+    return cursor
+
+# --- Result shaping ---
+# Grid endpoints return [{column: value}] by default. With ?format=columnar the
+# column names are sent once: {"columns": [...], "rows": [[...], ...]}; with
+# ?format=columns the values are grouped per column: {"columns": [...], "data": [[...], ...]}.
+COLUMNAR_FORMATS = ("columnar", "columns")
+
+def shape_rows(columns, rows, fmt=None, convert=None):
+    """Encodes fetched row tuples in the requested format; convert is applied per value (None keeps them as is)."""
+    if fmt == "columnar":
+        if convert is None:
+            return {"columns": columns, "rows": [list(row) for row in rows]}
+        return {"columns": columns, "rows": [[convert(v) for v in row] for row in rows]}
+    if fmt == "columns":
+        data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+        if convert is not None:
+            data = [[convert(v) for v in values] for values in data]
+        return {"columns": columns, "data": data}
+    if convert is None:
+        return [dict(zip(columns, row)) for row in rows]
+    return [{k: convert(v) for k, v in zip(columns, row)} for row in rows]
+
+def fetch_rows(cursor, fmt=None, convert=None):
+    """Fetches every row of an executed cursor, shaped by shape_rows with lower-case column names."""
+    columns = [col[0].lower() for col in cursor.description]
+    if convert is None and fmt not in COLUMNAR_FORMATS:
+        # The row factory builds the dicts inside the driver's fetch loop
+        cursor.rowfactory = lambda *values: dict(zip(columns, values))
+        return cursor.fetchall()
+    return shape_rows(columns, cursor.fetchall(), fmt, convert)
+
+def fetch_dict(cursor):
+    """Next row of an executed cursor as {column: value} (lower-case names), or None."""
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([col[0].lower() for col in cursor.description], row))
+
+def to_columnar(records, fmt="columnar"):
+    """Same encodings for rows already built as dicts; columns are the union of their keys, in first-seen order."""
+    if fmt not in COLUMNAR_FORMATS:
+        return records
+    columns = []
+    seen = set()
+    for record in records:
+        for key in record:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return shape_rows(columns, [[record.get(c) for c in columns] for record in records], fmt, convert=None)
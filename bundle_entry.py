@@ -2,6 +2,10 @@ import uvicorn
 import os
 import sys
 
+# The desktop bundle has no InfluxDB next to it: keep time machine snapshots in
+# the embedded store unless told otherwise
+os.environ.setdefault("TIMEMACHINE_STORAGE", "sqlite")
+
 # Since this script is now at the root, the 'backend' package is directly accessible
 from backend.main import app
 
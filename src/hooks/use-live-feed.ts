@@ -0,0 +1,64 @@
+import { useEffect, useState } from 'react'
+import { API_URL } from '@/context/app-context'
+
+type FeedKey = unknown[]
+
+/**
+ * Subscribes to a server-sent live feed (/api/live/<feed>) and keeps its current value.
+ * The server sends a full snapshot first and only diffs afterwards; they are applied here.
+ * `live` is false until the first snapshot arrives and whenever the stream is down,
+ * so callers can keep their polling as a fallback.
+ */
+export function useLiveFeed<T = any>(feed: string, connectionId?: number | string): { data: T | null, live: boolean } {
+    const [data, setData] = useState<T | null>(null)
+    const [live, setLive] = useState(false)
+
+    useEffect(() => {
+        if (!connectionId || typeof EventSource === 'undefined') return
+
+        let keyFields: string[] | null = null
+        const keyOf = (row: any) => JSON.stringify(keyFields!.map(f => row[f]))
+        const source = new EventSource(`${API_URL}/live/${feed}`)
+
+        source.addEventListener('snapshot', (event) => {
+            const frame = JSON.parse((event as MessageEvent).data)
+            keyFields = frame.key
+            setData(frame.data)
+            setLive(true)
+        })
+
+        source.addEventListener('diff', (event) => {
+            const frame = JSON.parse((event as MessageEvent).data)
+            setData(current => {
+                if (current === null) return current
+                if (!keyFields) {
+                    const next: any = { ...current, ...frame.changed }
+                    for (const key of frame.removed) delete next[key]
+                    return next
+                }
+                const removed = new Set((frame.removed as FeedKey[]).map(k => JSON.stringify(k)))
+                const updated = new Map((frame.updated as any[]).map(row => [keyOf(row), row]))
+                const next = (current as any[])
+                    .filter(row => !removed.has(keyOf(row)))
+                    .map(row => updated.get(keyOf(row)) ?? row)
+                    .concat(frame.added)
+                if (frame.order) {
+                    const position = new Map((frame.order as FeedKey[]).map((k, i) => [JSON.stringify(k), i]))
+                    next.sort((a, b) => (position.get(keyOf(a)) ?? 0) - (position.get(keyOf(b)) ?? 0))
+                }
+                return next as T
+            })
+        })
+
+        // EventSource reconnects by itself; the next snapshot restores the data
+        source.onerror = () => setLive(false)
+
+        return () => {
+            source.close()
+            setLive(false)
+            setData(null)
+        }
+    }, [feed, connectionId])
+
+    return { data, live }
+}
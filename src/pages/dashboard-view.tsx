@@ -9,6 +9,7 @@ import { Button } from '@/components/ui/button'
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select"
 import { SystemHealthCharts } from '@/components/dashboard/system-health-charts'
 import { useApp, API_URL } from '@/context/app-context'
+import { useLiveFeed } from '@/hooks/use-live-feed'
 
 export function DashboardView() {
     const { connection } = useApp()
@@ -20,15 +21,23 @@ export function DashboardView() {
     const [metrics, setMetrics] = useState<any>(null)
     const [tablespaces, setTablespaces] = useState<any[]>([])
 
+    // Metrics are pushed by the server while the live feed is up; polling is the fallback
+    const metricsFeed = useLiveFeed<any>('dashboard', connection.id)
+
+    const fetchMetrics = async () => {
+        const res = await fetch(`${API_URL}/dashboard/metrics`)
+        if (res.ok) setMetrics(await res.json())
+    }
+
+    const fetchTablespaces = async () => {
+        const res = await fetch(`${API_URL}/dashboard/tablespaces`)
+        if (res.ok) setTablespaces(await res.json())
+    }
+
     const fetchData = async () => {
         setIsRefreshing(true)
         try {
-            const [mRes, tsRes] = await Promise.all([
-                fetch(`${API_URL}/dashboard/metrics`),
-                fetch(`${API_URL}/dashboard/tablespaces`)
-            ])
-            if (mRes.ok) setMetrics(await mRes.json())
-            if (tsRes.ok) setTablespaces(await tsRes.json())
+            await Promise.all([fetchMetrics(), fetchTablespaces()])
         } catch (error) {
             console.error('Error fetching dashboard data:', error)
         } finally {
@@ -37,10 +46,22 @@ export function DashboardView() {
     }
 
     useEffect(() => {
-        fetchData()
-        const interval = setInterval(fetchData, 30000) // Refresh every 30s
+        if (metricsFeed.live) return
+        fetchMetrics().catch(error => console.error('Error fetching dashboard metrics:', error))
+        const interval = setInterval(() => fetchMetrics().catch(() => {}), 30000) // Refresh every 30s
+        return () => clearInterval(interval)
+    }, [connection.id, metricsFeed.live])
+
+    useEffect(() => {
+        if (metricsFeed.live && metricsFeed.data) setMetrics(metricsFeed.data)
+    }, [metricsFeed.live, metricsFeed.data])
+
+    // Tablespaces have no live feed and are still polled
+    useEffect(() => {
+        fetchTablespaces().catch(error => console.error('Error fetching tablespaces:', error))
+        const interval = setInterval(() => fetchTablespaces().catch(() => {}), 30000)
         return () => clearInterval(interval)
-    }, [])
+    }, [connection.id])
 
     const handleRefresh = () => {
         fetchData()
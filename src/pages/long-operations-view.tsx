@@ -21,10 +21,12 @@ import { Button } from '@/components/ui/button'
 import { Tabs, TabsList, TabsTrigger, TabsContent } from '@/components/ui/tabs'
 import { cn } from '@/lib/utils'
 import { useState, useEffect, useCallback } from 'react'
-import { API_URL } from '@/context/app-context'
+import { useApp, API_URL } from '@/context/app-context'
+import { useLiveFeed } from '@/hooks/use-live-feed'
 import { toast } from 'sonner'
 
 export function LongOperationsView() {
+    const { connection } = useApp()
     const [operations, setOperations] = useState<any[]>([])
     const [rmanProgress, setRmanProgress] = useState<any[]>([])
     const [isLoading, setIsLoading] = useState(true)
@@ -32,16 +34,20 @@ export function LongOperationsView() {
     const [searchTerm, setSearchTerm] = useState('')
     const [activeTab, setActiveTab] = useState('longops')
 
-    const fetchData = useCallback(async (isManual = false) => {
+    // The live feed carries the unfiltered list; a SID search is still polled with the filter applied server-side
+    const opsFeed = useLiveFeed<any[]>('longops', connection.id)
+    const isLive = opsFeed.live && !searchTerm
+
+    const fetchData = useCallback(async (isManual = false, includeOps = true) => {
         if (isManual) setIsRefreshing(true)
         try {
             const sidParam = searchTerm ? encodeURIComponent(searchTerm) : '%';
             const [opsRes, rmanRes] = await Promise.all([
-                fetch(`${API_URL}/sessions/longops?sid=${sidParam}`),
+                includeOps ? fetch(`${API_URL}/sessions/longops?sid=${sidParam}`) : null,
                 fetch(`${API_URL}/sessions/longops/rman`)
             ])
 
-            if (opsRes.ok) setOperations(await opsRes.json())
+            if (opsRes?.ok) setOperations(await opsRes.json())
             if (rmanRes.ok) setRmanProgress(await rmanRes.json())
 
             if (isManual) toast.success('Data refreshed')
@@ -55,10 +61,17 @@ export function LongOperationsView() {
     }, [searchTerm])
 
     useEffect(() => {
-        fetchData()
-        const interval = setInterval(() => fetchData(false), 3000)
+        // RMAN progress has no live feed and keeps being polled
+        fetchData(false, !isLive)
+        const interval = setInterval(() => fetchData(false, !isLive), 3000)
         return () => clearInterval(interval)
-    }, [fetchData])
+    }, [fetchData, isLive])
+
+    useEffect(() => {
+        if (!isLive || !opsFeed.data) return
+        setOperations(opsFeed.data)
+        setIsLoading(false)
+    }, [isLive, opsFeed.data])
 
     return (
         <MainLayout>
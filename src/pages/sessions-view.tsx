@@ -33,6 +33,7 @@ import {
     SelectValue,
 } from "@/components/ui/select"
 import { usePersistentState } from '@/hooks/use-persistent-state'
+import { useLiveFeed } from '@/hooks/use-live-feed'
 import { useApp, API_URL } from '@/context/app-context'
 import { Badge } from '@/components/ui/badge'
 
@@ -92,11 +93,24 @@ export function SessionsView() {
         }
     }, [connection.id, connection.is_rac])
 
+    // Pushed by the server while the live feeds are up; polling is the fallback
+    const sessionsFeed = useLiveFeed<any[]>('sessions', connection.id)
+    const blockingFeed = useLiveFeed<any[]>('blocking', connection.id)
+    const isLive = sessionsFeed.live && blockingFeed.live
+
     useEffect(() => {
+        if (isLive) return
         fetchSessions()
         const interval = setInterval(fetchSessions, 15000)
         return () => clearInterval(interval)
-    }, [selectedInstId, connection.id])
+    }, [selectedInstId, connection.id, isLive])
+
+    useEffect(() => {
+        if (!isLive) return
+        const instId = selectedInstId !== 'all' ? Number(selectedInstId) : null
+        setSessions((sessionsFeed.data ?? []).filter(s => instId === null || s.inst_id === instId))
+        setBlocking((blockingFeed.data ?? []).filter(b => instId === null || b.inst_id === instId || b.blocking_instance === instId))
+    }, [isLive, sessionsFeed.data, blockingFeed.data, selectedInstId])
 
     const handleSqlSelect = (sqlId: string, sid: number) => {
         setSelectedSqlId(sqlId)